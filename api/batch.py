@@ -0,0 +1,201 @@
+"""
+批量血缘分析：一次请求提交多个互不相关的脚本（如 CI 中一次合并请求改动的全部 SQL 文件），
+每个脚本可以有自己的 filter_ctes/lineage_level/dialect 等选项，结果逐脚本返回。
+
+所有脚本中未命中缓存的语句先统一提交到共享解析进程池（parallel_parse.get_executor）并发解析，
+结果写入语句缓存；随后逐个脚本调用 analyze_sql_lineage 汇总，此时语句都命中缓存，
+相比逐文件请求省去了每次的请求分发和串行解析。
+"""
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from lineage import LINEAGE_LEVELS, MAX_STATEMENTS, analyze_sql_lineage, check_sql_limits, get_parse_options
+from lineage_cache import CACHE_MAX_ENTRIES, extract_statement_lineage, split_statements, statement_cache, statement_cache_keys
+from parallel_parse import MIN_PARALLEL_STATEMENTS, clamp_max_workers, discard_executor, get_executor
+from fast_table_lineage import scan_table_lineage
+from metrics import count, get_logger, stage
+
+logger = get_logger(__name__)
+
+# --- 批量请求限制 (可通过环境变量覆盖，0 表示不限制) ---
+BATCH_MAX_SCRIPTS = int(os.environ.get('LINEAGE_BATCH_MAX_SCRIPTS', 200))  # 单个批量请求的脚本数上限
+BATCH_MAX_SQL_CHARS = int(os.environ.get('LINEAGE_BATCH_MAX_SQL_CHARS', 8 * 1024 * 1024))  # 所有脚本的字符数合计上限
+# 所有脚本的语句数合计上限；默认不超过语句缓存容量，预解析的结果在逐脚本汇总前不会被淘汰
+BATCH_MAX_STATEMENTS = int(os.environ.get('LINEAGE_BATCH_MAX_STATEMENTS', min(MAX_STATEMENTS, CACHE_MAX_ENTRIES // 2)))
+
+
+def _prefetch_statements(scripts: List[Dict], max_workers: int) -> int:
+    """
+    把各脚本中未命中缓存的语句去重后一次性提交到共享进程池解析，结果写入语句缓存。
+    解析失败的语句不写入缓存，由随后的 analyze_sql_lineage 重新解析并按脚本报告错误。
+
+    Args:
+        scripts: 已通过校验的脚本，含 statements、parse_options、lineage_level 和 table_tier
+        max_workers: 已由 clamp_max_workers 校验的进程数，为 1 时在本进程解析
+
+    Returns:
+        int: 提交解析的语句数
+    """
+    pending: Dict[str, Tuple[str, Dict, bool]] = {}
+    for script in scripts:
+        options = script['parse_options']
+        with_columns = script['lineage_level'] != 'table'
+        for stmt in script['statements']:
+            # 表级分析中轻量扫描能处理的语句不需要完整解析
+            if not with_columns and script['table_tier'] == 'auto' and \
+                    scan_table_lineage(stmt, options['dialect']) is not None:
+                continue
+            key, full_key = statement_cache_keys(stmt, options['dialect'], with_columns, options['metadata_catalog'])
+            if key not in pending and statement_cache.get(key, full_key) is None:
+                pending[key] = (stmt, options, with_columns)
+    if not pending:
+        return 0
+
+    # 只有一个工作进程时进程池只会增加进程间通信开销，直接在本进程解析
+    if len(pending) < MIN_PARALLEL_STATEMENTS or max_workers <= 1:
+        for key, (stmt, options, with_columns) in pending.items():
+            try:
+                statement_cache.put(key, extract_statement_lineage(
+                    stmt, dialect=options['dialect'], with_columns=with_columns,
+                    metadata_catalog=options['metadata_catalog']
+                ))
+            except Exception as e:
+                logger.debug("Prefetch failed, statement is re-parsed by its script: %s", e)
+        return len(pending)
+
+    executor = get_executor()
+    futures = {
+        key: executor.submit(
+            extract_statement_lineage, stmt, dialect=options['dialect'], with_columns=with_columns,
+            metadata_catalog=options['metadata_catalog']
+        )
+        for key, (stmt, options, with_columns) in pending.items()
+    }
+    with stage('parse_pool'):
+        for key, future in futures.items():
+            try:
+                statement_cache.put(key, future.result())
+            except BrokenProcessPool:
+                # 工作进程异常退出后其余 future 都会失败；丢弃本次使用的进程池（其他请求已重建的不受影响），
+                # 未预解析的语句由各脚本的 analyze_sql_lineage 解析
+                logger.exception("Parse pool broken during batch prefetch")
+                discard_executor(executor)
+                break
+            except Exception as e:
+                logger.debug("Prefetch failed, statement is re-parsed by its script: %s", e)
+    return len(pending)
+
+
+def analyze_sql_lineage_batch(data):
+    """
+    批量SQL血缘分析API接口
+
+    请求体JSON格式:
+    {
+        "scripts": [  # 必填，各脚本互相独立
+            {
+                "name": "etl/daily.sql",  # 可选，默认 "script_<序号>"；提供时同时作为持久化存储中的脚本名，否则存储按内容哈希命名
+                "sql_query": "SQL查询语句",
+                "filter_ctes": true, "lineage_level": "column", "dialect": "hive"  # 可选，覆盖批量级的默认值
+            }
+        ],
+        "filter_ctes": true/false,  # 可选，以下批量级参数作为每个脚本的默认值，可用的参数同 /api/lineage
+        "lineage_level": "table"/"column"/"both",
+        "dialect": "ansi",
+        "max_workers": 4  # 可选，不超过 LINEAGE_PARSE_WORKERS；为 1 时在本进程串行解析，否则使用共享解析进程池
+    }
+
+    返回:
+        {"results": [{"name", "status", "result" 或 "error"}], "summary": {...}}，
+        results 与 scripts 顺序一致；单个脚本出错不影响其他脚本，整体状态码仍为 200。
+        脚本数、字符数或语句数合计超过 LINEAGE_BATCH_* 上限时整批以 413 拒绝。
+    """
+    try:
+        if not data or not isinstance(data.get('scripts'), list) or not data['scripts']:
+            return {'error': 'Missing required parameter: scripts'}, 400
+        raw_scripts = data['scripts']
+        try:
+            max_workers = clamp_max_workers(data.get('max_workers'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if BATCH_MAX_SCRIPTS and len(raw_scripts) > BATCH_MAX_SCRIPTS:
+            return {'error': f'Batch has {len(raw_scripts)} scripts, limit is {BATCH_MAX_SCRIPTS}'}, 413
+        defaults = {k: v for k, v in data.items() if k not in ('scripts', 'name', 'sql_query', 'script_name')}
+
+        # 1. 逐脚本校验参数并拆分语句；校验失败的脚本直接记录错误，不参与解析
+        results: List[Optional[Dict]] = [None] * len(raw_scripts)
+        scripts: List[Dict] = []
+        total_chars = total_statements = 0
+        for i, raw in enumerate(raw_scripts):
+            if not isinstance(raw, dict) or 'sql_query' not in raw:
+                results[i] = {'name': f'script_{i}', 'status': 400, 'error': 'Missing required parameter: sql_query'}
+                continue
+            name = str(raw.get('name') or f'script_{i}')
+            script_data = {**defaults, **raw}
+            # 只有调用方给出的名称才作为存储中的脚本名，默认名 script_<序号> 在不同批次间会互相覆盖
+            if raw.get('name') and not raw.get('script_name'):
+                script_data['script_name'] = name
+            rejected = check_sql_limits(script_data['sql_query'])
+            lineage_level = script_data.get('lineage_level', 'column')
+            if rejected is None and lineage_level not in LINEAGE_LEVELS:
+                rejected = {'error': f'Unsupported lineage_level: {lineage_level}'}, 400
+            if rejected is None:
+                try:
+                    parse_options = get_parse_options(script_data)
+                except ValueError as e:
+                    rejected = {'error': str(e)}, 400
+            if rejected is not None:
+                results[i] = {'name': name, 'status': rejected[1], 'error': rejected[0]['error']}
+                continue
+            statements = split_statements(script_data['sql_query'])
+            total_chars += len(script_data['sql_query'])
+            total_statements += len(statements)
+            scripts.append({
+                'index': i,
+                'name': name,
+                'data': script_data,
+                'statements': statements,
+                'parse_options': parse_options,
+                'lineage_level': lineage_level,
+                'table_tier': script_data.get('table_tier', 'auto')
+            })
+        if BATCH_MAX_SQL_CHARS and total_chars > BATCH_MAX_SQL_CHARS:
+            return {'error': f'Batch has {total_chars} characters, limit is {BATCH_MAX_SQL_CHARS}'}, 413
+        if BATCH_MAX_STATEMENTS and total_statements > BATCH_MAX_STATEMENTS:
+            return {'error': f'Batch has {total_statements} statements, limit is {BATCH_MAX_STATEMENTS}'}, 413
+
+        logger.info("Analyzing batch: %d scripts, %d statements, %d chars", len(raw_scripts), total_statements, total_chars)
+        count('batch_scripts', len(raw_scripts))
+
+        # 2. 所有脚本的待解析语句统一交给共享进程池
+        with stage('batch_prefetch'):
+            parsed = _prefetch_statements(scripts, max_workers)
+
+        # 3. 逐脚本汇总，语句均已在缓存中，不再使用进程池
+        for script in scripts:
+            result, status_code = analyze_sql_lineage({**script['data'], 'parallel': False})
+            item = {'name': script['name'], 'status': status_code}
+            if status_code == 200:
+                item['result'] = result
+            else:
+                item['error'] = result.get('error')
+            results[script['index']] = item
+
+        failed = sum(1 for item in results if item['status'] != 200)
+        return {
+            'results': results,
+            'summary': {
+                'scripts': len(results),
+                'succeeded': len(results) - failed,
+                'failed': failed,
+                'statements': total_statements,
+                'parsed_statements': parsed
+            }
+        }, 200
+
+    except Exception as e:
+        logger.exception("Error in analyze_sql_lineage_batch")
+        return {
+            'error': str(e)
+        }, 500
@@ -0,0 +1,5 @@
+"""
+血缘分析性能基准。在 api 目录下运行，例如:
+
+    python -m benchmarks.bench_layering
+"""
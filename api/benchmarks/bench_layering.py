@@ -0,0 +1,110 @@
+"""
+表分层基准：对比旧的 while-changed 不动点分层与基于 Kahn 的最长路径分层。
+
+    python -m benchmarks.bench_layering --sizes 1000 10000 50000 --legacy-limit 2000
+"""
+import argparse
+import random
+import time
+from typing import Dict, List, Set, Tuple
+
+from layering import assign_table_layers
+
+
+def make_layered_graph(
+        table_count: int,
+        depth: int = 20,
+        fan_in: int = 3,
+        cycle_ratio: float = 0.01,
+        seed: int = 42
+) -> Tuple[Set[str], List[Tuple[str, str, str, str]], Set[str], Set[str]]:
+    """
+    生成确定性的合成分层图：第 0 层为源表，最后一层为目标表，
+    中间每张表从上游若干层随机取 fan_in 个上游；按 cycle_ratio 加入回写边构成环。
+    返回 (表集合, 列级边列表, 源表集合, 目标表集合)。
+    """
+    rng = random.Random(seed)
+    per_layer = max(1, table_count // depth)
+    layers: List[List[str]] = []
+    for d in range(depth):
+        layers.append([f'db{d}.t{i}' for i in range(per_layer)])
+
+    edges = []
+    for d in range(1, depth):
+        for t in layers[d]:
+            for _ in range(fan_in):
+                up_layer = layers[rng.randrange(max(0, d - 3), d)]
+                edges.append((rng.choice(up_layer), 'c', t, 'c'))
+    # 回写边：从较深的中间层指回较浅的中间层
+    for _ in range(int(table_count * cycle_ratio)):
+        lo = rng.randrange(1, depth - 2)
+        hi = rng.randrange(lo + 1, depth - 1)
+        edges.append((rng.choice(layers[hi]), 'c', rng.choice(layers[lo]), 'c'))
+
+    tables = {t for layer in layers for t in layer}
+    return tables, edges, set(layers[0]), set(layers[-1])
+
+
+def legacy_assign_layers(tables, edges, sources, targets) -> Dict[str, int]:
+    """原 main2.py 中的不动点分层实现，仅用于对比"""
+    layers = {t: (0 if t in sources else -1) for t in tables}
+    changed = True
+    while changed:
+        changed = False
+        for table_name in tables:
+            if layers[table_name] == -1 and table_name not in targets:
+                upstream_layers = []
+                for from_t, _, to_t, _ in edges:
+                    if to_t == table_name and layers.get(from_t, -1) != -1:
+                        upstream_layers.append(layers[from_t])
+                if upstream_layers:
+                    layers[table_name] = max(upstream_layers) + 1
+                    changed = True
+    max_middle = max([l for t, l in layers.items() if t not in sources and t not in targets and l != -1], default=0)
+    for t in tables:
+        if t in targets:
+            layers[t] = max_middle + 1
+    return layers
+
+
+def run(sizes: List[int], legacy_limit: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        tables, edges, sources, targets = make_layered_graph(size)
+        start = time.perf_counter()
+        _, cycles, _ = assign_table_layers(
+            tables, ((f, t) for f, _, t, _ in edges), sources, targets
+        )
+        kahn_seconds = time.perf_counter() - start
+
+        legacy_seconds = None
+        if size <= legacy_limit:
+            start = time.perf_counter()
+            legacy_assign_layers(tables, edges, sources, targets)
+            legacy_seconds = time.perf_counter() - start
+
+        results.append({
+            'tables': len(tables),
+            'edges': len(edges),
+            'cycles': len(cycles),
+            'kahn_seconds': round(kahn_seconds, 4),
+            'legacy_seconds': round(legacy_seconds, 4) if legacy_seconds is not None else None
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='表分层算法基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 1000, 2000, 10000, 50000])
+    parser.add_argument('--legacy-limit', type=int, default=2000,
+                        help='旧算法只在表数量不超过该值时运行（大图上耗时过长）')
+    args = parser.parse_args()
+
+    print(f"{'tables':>8} {'edges':>8} {'cycles':>7} {'kahn(s)':>10} {'legacy(s)':>10}")
+    for r in run(args.sizes, args.legacy_limit):
+        legacy = f"{r['legacy_seconds']:.4f}" if r['legacy_seconds'] is not None else '-'
+        print(f"{r['tables']:>8} {r['edges']:>8} {r['cycles']:>7} {r['kahn_seconds']:>10.4f} {legacy:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+布局基准：在合成分层图上对比交叉消减前后的边交叉数和耗时。
+
+    python -m benchmarks.bench_layout --sizes 500 2000 5000 --method median
+"""
+import argparse
+import time
+from typing import Dict, List
+
+from layering import assign_table_layers
+from layout import LAYOUT_METHODS, LAYOUT_WORK_BUDGET, compute_layered_layout
+from benchmarks.bench_layering import make_layered_graph
+
+
+def run(sizes: List[int], method: str, work_budget: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        tables, edges, sources, targets = make_layered_graph(size)
+        table_edges = {(f, t) for f, _, t, _ in edges}
+        layers, _, _ = assign_table_layers(tables, table_edges, sources, targets)
+        start = time.perf_counter()
+        _, stats = compute_layered_layout(
+            layers, table_edges, {t: 60 for t in tables}, sort_key=lambda t: t,
+            start_x=20, start_y=20, layer_spacing=850, node_spacing=20,
+            method=method, work_budget=work_budget, time_budget=0
+        )
+        results.append({
+            'tables': len(tables),
+            'edges': len(table_edges),
+            'seconds': round(time.perf_counter() - start, 4),
+            **stats
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分层布局交叉消减基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 5000])
+    parser.add_argument('--method', choices=LAYOUT_METHODS, default='barycenter')
+    parser.add_argument('--work-budget', type=int, default=LAYOUT_WORK_BUDGET)
+    args = parser.parse_args()
+
+    print(f"{'tables':>8} {'edges':>8} {'before':>10} {'after':>10} {'sweeps':>7} {'work':>10} {'seconds':>8}")
+    for r in run(args.sizes, args.method, args.work_budget):
+        print(f"{r['tables']:>8} {r['edges']:>8} {r['crossings_before']:>10} {r['crossings_after']:>10} "
+              f"{r['sweeps']:>7} {r['work']:>10} {r['seconds']:>8.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+血缘流水线分阶段基准：在合成工作负载上分别运行列级（get_lineage_json_from_parsed_output）和
+表级（get_table_lineage_json）分析，按 metrics.stage 记录的阶段（split/parse/column_lineage/merge/
+projection/layering/layout 等）取多轮中的最小耗时，可保存为基线并与基线比较。
+
+    python -m benchmarks.bench_pipeline --save-baseline
+    python -m benchmarks.bench_pipeline --threshold 0.25      # 与基线比较，退化时以非零状态退出
+    python -m pytest benchmarks                               # 同上，没有基线文件时失败
+
+基线与机器相关，不随仓库提交：在运行回归检查的机器（如 CI runner）上用 --save-baseline 录制并缓存，
+通过 LINEAGE_BENCH_BASELINE 指定路径；还没有基线的环境设置 LINEAGE_BENCH_ALLOW_MISSING=1 显式跳过。
+
+每轮运行前清空语句缓存，保证每次都真实解析。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from lineage_cache import statement_cache
+from main2 import get_lineage_json_from_parsed_output
+from metrics import finish_request, start_request
+from table_lineage import get_table_lineage_json
+from benchmarks.workload import WORKLOADS, make_workload
+
+# --- 基准配置 (可通过环境变量覆盖) ---
+BASELINE_PATH = os.environ.get(
+    'LINEAGE_BENCH_BASELINE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+)
+REGRESSION_THRESHOLD = float(os.environ.get('LINEAGE_BENCH_THRESHOLD', 0.25))  # 比基线慢超过该比例视为退化
+MIN_REGRESSION_SECONDS = float(os.environ.get('LINEAGE_BENCH_MIN_DELTA', 0.005))  # 绝对差值低于该值的波动忽略
+BENCH_REPEAT = int(os.environ.get('LINEAGE_BENCH_REPEAT', 3))  # 每个工作负载的运行轮数
+ALLOW_MISSING_BASELINE = os.environ.get('LINEAGE_BENCH_ALLOW_MISSING', '') == '1'  # 为 1 时没有基线文件跳过而不是失败
+
+LEVELS = {
+    'column': lambda script: get_lineage_json_from_parsed_output(script),
+    'table': lambda script: get_table_lineage_json(script),
+}
+
+
+def measure(script: str, level: str) -> Dict[str, float]:
+    """运行一次分析，返回各阶段耗时（秒）和总耗时"""
+    statement_cache.clear()
+    request_metrics = start_request()
+    start = time.perf_counter()
+    try:
+        LEVELS[level](script)
+    finally:
+        finish_request('benchmark', 200)
+    stages = dict(request_metrics.stages)
+    stages['total'] = time.perf_counter() - start
+    return stages
+
+
+def run(workloads: List[str], levels: List[str], repeat: int = BENCH_REPEAT) -> Dict[str, float]:
+    """
+    Returns:
+        dict: '工作负载/级别/阶段' -> 多轮中的最小耗时（秒）
+    """
+    results: Dict[str, float] = {}
+    for name in workloads:
+        script = make_workload(**WORKLOADS[name])
+        for level in levels:
+            for _ in range(repeat):
+                for stage_name, seconds in measure(script, level).items():
+                    key = f'{name}/{level}/{stage_name}'
+                    results[key] = min(results.get(key, seconds), seconds)
+    return {k: round(v, 6) for k, v in results.items()}
+
+
+def save_baseline(results: Dict[str, float], path: str = BASELINE_PATH) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results
+        }, f, indent=1, sort_keys=True)
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Optional[Dict[str, float]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)['results']
+
+
+def find_regressions(
+        results: Dict[str, float],
+        baseline: Dict[str, float],
+        threshold: float = REGRESSION_THRESHOLD,
+        min_delta: float = MIN_REGRESSION_SECONDS
+) -> List[Tuple[str, float, float]]:
+    """比基线慢超过 threshold 比例且绝对差值超过 min_delta 的阶段，返回 [(键, 基线耗时, 当前耗时)]"""
+    regressions = []
+    for key, seconds in sorted(results.items()):
+        base = baseline.get(key)
+        if base is not None and seconds > base * (1 + threshold) and seconds - base > min_delta:
+            regressions.append((key, base, seconds))
+    return regressions
+
+
+def test_pipeline_regression():
+    """pytest 入口：与基线比较；没有基线文件时失败，设置 LINEAGE_BENCH_ALLOW_MISSING=1 时跳过"""
+    import pytest
+
+    baseline = load_baseline()
+    if baseline is None:
+        message = f'No baseline at {BASELINE_PATH}, run: python -m benchmarks.bench_pipeline --save-baseline'
+        if ALLOW_MISSING_BASELINE:
+            pytest.skip(message)
+        pytest.fail(message + ' (or set LINEAGE_BENCH_ALLOW_MISSING=1 to skip)')
+    workloads = sorted({key.split('/')[0] for key in baseline if key.split('/')[0] in WORKLOADS})
+    regressions = find_regressions(run(workloads, list(LEVELS)), baseline)
+    assert not regressions, '\n'.join(
+        f'{key}: {base:.4f}s -> {now:.4f}s (+{(now / base - 1) * 100:.0f}%)' for key, base, now in regressions
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血缘流水线分阶段基准')
+    parser.add_argument('--workloads', nargs='+', choices=sorted(WORKLOADS), default=sorted(WORKLOADS))
+    parser.add_argument('--levels', nargs='+', choices=sorted(LEVELS), default=sorted(LEVELS))
+    parser.add_argument('--repeat', type=int, default=BENCH_REPEAT)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run(args.workloads, args.levels, args.repeat)
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    print(f"{'workload/level/stage':<36} {'seconds':>10} {'baseline':>10} {'change':>8}")
+    for key, seconds in results.items():
+        base = (baseline or {}).get(key)
+        change = f'{(seconds / base - 1) * 100:+.0f}%' if base else ''
+        print(f"{key:<36} {seconds:>10.4f} {base if base is not None else '':>10} {change:>8}")
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f'Baseline saved to {args.baseline}')
+        return
+    if baseline is None:
+        print(f'No baseline at {args.baseline}, run with --save-baseline first', file=sys.stderr)
+        if not ALLOW_MISSING_BASELINE:
+            sys.exit(1)
+        return
+    regressions = find_regressions(results, baseline, args.threshold)
+    for key, base, now in regressions:
+        print(f'REGRESSION {key}: {base:.4f}s -> {now:.4f}s', file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
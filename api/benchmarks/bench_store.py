@@ -0,0 +1,78 @@
+"""
+持久化血缘存储基准：合成分层图按脚本批量写入 SQLite，再测多跳影响分析（递归 CTE）的耗时。
+
+    python -m benchmarks.bench_store --sizes 1000 10000 --fields 5 --db /tmp/lineage_bench.db
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from lineage_store import LineageStore
+from benchmarks.bench_layering import make_layered_graph
+
+
+def make_scripts(table_count: int, fields: int, statements_per_script: int = 50) -> List:
+    """把合成图的每条表级边当作一条 INSERT ... SELECT 语句（每个字段一条列级路径），按脚本分组"""
+    _, edges, _, _ = make_layered_graph(table_count)
+    entries = [
+        {
+            'sources': (from_t,), 'targets': (to_t,), 'intermediates': (),
+            'column_paths': tuple(((from_t, f'c{i}'), (to_t, f'c{i}')) for i in range(fields))
+        }
+        for from_t, _, to_t, _ in edges
+    ]
+    return [
+        (f'script_{n}.sql', list(enumerate(entries[i:i + statements_per_script])), None)
+        for n, i in enumerate(range(0, len(entries), statements_per_script))
+    ]
+
+
+def run(sizes: List[int], fields: int, db_path: str, depth: int) -> List[Dict]:
+    results = []
+    for size in sizes:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        store = LineageStore(f'sqlite:///{db_path}')
+        scripts = make_scripts(size, fields)
+        start = time.perf_counter()
+        store.record_scripts(scripts)
+        write_seconds = time.perf_counter() - start
+        stats = store.stats()
+
+        start_table = 'db0.t0'
+        timings = {}
+        for label, direction, max_depth in (
+                ('down_all', 'downstream', None), (f'down_{depth}', 'downstream', depth), ('up_all', 'upstream', None)
+        ):
+            table = start_table if direction == 'downstream' else 'db19.t0'
+            start = time.perf_counter()
+            impact = store.impact(table, direction=direction, max_depth=max_depth, include_edges=False)
+            timings[label] = (round(time.perf_counter() - start, 4), len(impact['columns']) if impact else 0)
+        store.engine.dispose()
+        results.append({
+            'tables': stats['tables'],
+            'column_edges': stats['column_edges'],
+            'write_seconds': round(write_seconds, 3),
+            'edges_per_second': int(stats['column_edges'] / write_seconds) if write_seconds else 0,
+            'impact': timings
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='持久化血缘存储写入与影响分析基准')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--fields', type=int, default=5, help='每条表级边对应的列级边数')
+    parser.add_argument('--depth', type=int, default=3, help='限深度查询的跳数')
+    parser.add_argument('--db', default='lineage_store_bench.db')
+    args = parser.parse_args()
+
+    for r in run(args.sizes, args.fields, args.db, args.depth):
+        impact = ', '.join(f'{k}={s:.4f}s/{n} cols' for k, (s, n) in r['impact'].items())
+        print(f"{r['tables']:>8} tables {r['column_edges']:>9} column edges  write {r['write_seconds']:>8.3f}s "
+              f"({r['edges_per_second']}/s)  {impact}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+表级血缘基准：对比轻量扫描层（table_tier=auto）与完整 sqlfluff 解析（table_tier=full）的吞吐。
+每轮运行前清空语句缓存，保证两条路径都真实解析。
+
+    python -m benchmarks.bench_table_tier --statements 50 200 --dialect ansi
+"""
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from lineage_cache import statement_cache
+from table_lineage import get_table_lineage_json
+
+
+def make_table_script(statement_count: int, complex_ratio: float = 0.1, seed: int = 42) -> str:
+    """
+    生成确定性的合成脚本：大部分是 INSERT ... SELECT / CTAS / WITH 这类简单语句，
+    按 complex_ratio 混入轻量扫描无法判断、需要回退完整解析器的语句（自引用、带引号标识符）。
+    """
+    rng = random.Random(seed)
+    statements = []
+    for i in range(statement_count):
+        src = [f'ods.t{rng.randrange(statement_count)}' for _ in range(rng.randint(1, 3))]
+        tgt = f'dw.t{i}'
+        if rng.random() < complex_ratio:
+            statements.append(f'INSERT INTO {tgt} SELECT a.id FROM {tgt} a JOIN "{src[0]}" b ON a.id = b.id')
+            continue
+        kind = i % 3
+        joins = ' '.join(f'JOIN {s} j{k} ON j{k}.id = s0.id' for k, s in enumerate(src[1:]))
+        body = f'SELECT s0.id, s0.v FROM {src[0]} s0 {joins} WHERE s0.v > {i}'
+        if kind == 0:
+            statements.append(f'INSERT INTO {tgt} {body}')
+        elif kind == 1:
+            statements.append(f'CREATE TABLE {tgt} AS {body}')
+        else:
+            statements.append(f'WITH c AS ({body}) INSERT INTO {tgt} SELECT id, v FROM c')
+    return ';\n'.join(statements) + ';'
+
+
+def run(statement_counts: List[int], dialect: str) -> List[Dict]:
+    results = []
+    for count in statement_counts:
+        script = make_table_script(count)
+        row = {'statements': count}
+        for tier in ('auto', 'full'):
+            statement_cache.clear()
+            start = time.perf_counter()
+            result = get_table_lineage_json(script, dialect=dialect, table_tier=tier)
+            seconds = time.perf_counter() - start
+            row[f'{tier}_seconds'] = round(seconds, 4)
+            row[f'{tier}_stmts_per_second'] = round(count / seconds, 1)
+            if tier == 'auto':
+                row['fast_ratio'] = round(result['statement_tiers'].count('fast') / max(1, count), 3)
+        results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='表级血缘提取层级基准')
+    parser.add_argument('--statements', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--dialect', default='ansi')
+    args = parser.parse_args()
+
+    print(f"{'stmts':>6} {'fast%':>6} {'auto(s)':>9} {'auto/s':>9} {'full(s)':>9} {'full/s':>9} {'speedup':>8}")
+    for r in run(args.statements, args.dialect):
+        speedup = r['full_seconds'] / r['auto_seconds'] if r['auto_seconds'] else float('inf')
+        print(f"{r['statements']:>6} {r['fast_ratio'] * 100:>5.1f}% {r['auto_seconds']:>9.4f} "
+              f"{r['auto_stmts_per_second']:>9.1f} {r['full_seconds']:>9.4f} "
+              f"{r['full_stmts_per_second']:>9.1f} {speedup:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
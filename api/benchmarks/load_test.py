@@ -0,0 +1,464 @@
+"""
+HTTP 负载测试：在本机启动 serve.py（或连接已有服务），按配置的请求组合以固定并发或固定速率回放
+/api/lineage 请求，统计吞吐、p50/p95/p99 延迟、错误率，并定期采样服务进程（含工作进程）的 RSS。
+结果写入 JSON 文件，可用 --compare 与之前的结果对比。
+
+    python -m benchmarks.load_test --concurrency 50 --duration 60 --output load.json
+    python -m benchmarks.load_test --rate 20 --duration 60 --threads 16 --compare load.json
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --server-pid 1234 --concurrency 8
+
+- 固定并发（--concurrency）为闭环：每个客户端线程收到响应后立即发下一个请求
+- 固定速率（--rate）为开环：按计划时刻发出请求，延迟从计划时刻算起，服务端排队的时间不会被少算
+- 默认每个请求生成不同的脚本（不命中语句缓存）；--variants N 时每个场景只轮换 N 个脚本
+- RSS 从 /proc 读取（仅 Linux），为服务主进程及其全部子进程之和，写时复制共享的页面会被重复计算
+"""
+import argparse
+import bisect
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.workload import WORKLOADS, make_workload
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- 负载测试配置 (可通过环境变量覆盖) ---
+LOAD_CONCURRENCY = int(os.environ.get('LINEAGE_LOAD_CONCURRENCY', 8))  # 默认并发数
+LOAD_DURATION = float(os.environ.get('LINEAGE_LOAD_DURATION', 30))  # 默认持续时间（秒）
+LOAD_REQUEST_TIMEOUT = float(os.environ.get('LINEAGE_LOAD_REQUEST_TIMEOUT', 120))  # 单个请求的超时（秒）
+RSS_SAMPLE_INTERVAL = float(os.environ.get('LINEAGE_LOAD_RSS_INTERVAL', 1.0))  # RSS 采样间隔（秒）
+SERVER_START_TIMEOUT = 120  # 等待本地服务就绪的时间（秒）
+
+# 请求场景：工作负载形态、语句数和分析参数
+SCENARIOS: Dict[str, Dict] = {
+    'small_column': {'workload': 'small', 'statements': 10, 'lineage_level': 'column', 'filter_ctes': True},
+    'small_table': {'workload': 'small', 'statements': 10, 'lineage_level': 'table', 'filter_ctes': True},
+    'large_column': {'workload': 'wide', 'statements': 60, 'lineage_level': 'column', 'filter_ctes': True},
+    'large_column_raw': {'workload': 'deep', 'statements': 40, 'lineage_level': 'column', 'filter_ctes': False},
+    'large_table': {'workload': 'wide', 'statements': 60, 'lineage_level': 'table', 'filter_ctes': True},
+}
+DEFAULT_MIX = 'small_column=4,small_table=2,large_column=1,large_column_raw=1,large_table=1'
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """解析 'scenario=weight,...' 形式的请求组合"""
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario: {name}, expected one of {sorted(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class PayloadFactory:
+    """按场景生成请求体；variants 为 0 时每次生成不同的脚本，否则每个场景在 variants 个脚本间轮换"""
+
+    def __init__(self, variants: int = 0):
+        self.variants = variants
+        self._counter = 0
+        self._cache: Dict[Tuple[str, int], bytes] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, scenario: str) -> bytes:
+        with self._lock:
+            self._counter += 1
+            seed = self._counter % self.variants if self.variants else self._counter
+            body = self._cache.get((scenario, seed))
+        if body is not None:
+            return body
+        config = SCENARIOS[scenario]
+        workload = {**WORKLOADS[config['workload']], 'statements': config['statements']}
+        body = json.dumps({
+            'sql_query': make_workload(**workload, seed=seed),
+            'lineage_level': config['lineage_level'],
+            'filter_ctes': config['filter_ctes'],
+            'persist': False
+        }).encode('utf-8')
+        if self.variants:
+            with self._lock:
+                self._cache[(scenario, seed)] = body
+        return body
+
+
+def send_request(host: str, port: int, body: bytes, timeout: float = LOAD_REQUEST_TIMEOUT) -> Tuple[int, Optional[str]]:
+    """发送一个 /api/lineage 请求，返回 (状态码, 错误信息)；连接失败或超时时状态码为 0"""
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request('POST', '/api/lineage', body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        data = response.read()
+        if response.status >= 400:
+            try:
+                return response.status, json.loads(data).get('error')
+            except ValueError:
+                return response.status, data[:200].decode('utf-8', 'replace')
+        return response.status, None
+    except (OSError, http.client.HTTPException) as e:
+        return 0, f'{type(e).__name__}: {e}'
+    finally:
+        conn.close()
+
+
+def process_tree_rss(pid: int) -> Tuple[float, int]:
+    """pid 及其全部子孙进程的 RSS 之和（MB）和进程数；无法读取 /proc 时返回 (0, 0)"""
+    children: Dict[int, List[int]] = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return 0.0, 0
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # comm 字段可能包含空格，ppid 在最后一个 ')' 之后
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total_kb, count, stack = 0, 0, [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+        count += 1
+        stack.extend(children.get(current, ()))
+    return total_kb / 1024, count
+
+
+class RSSSampler(threading.Thread):
+    """后台定期采样服务进程树的 RSS"""
+
+    def __init__(self, pid: int, started: float, interval: float = RSS_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.started = started
+        self.interval = interval
+        self.samples: List[Dict] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            rss_mb, processes = process_tree_rss(self.pid)
+            if processes:
+                self.samples.append({
+                    't': round(time.perf_counter() - self.started, 3),
+                    'rss_mb': round(rss_mb, 1),
+                    'processes': processes
+                })
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_load(
+        host: str,
+        port: int,
+        mix: Dict[str, float],
+        payloads: PayloadFactory,
+        concurrency: int = LOAD_CONCURRENCY,
+        rate: Optional[float] = None,
+        duration: float = LOAD_DURATION,
+        max_requests: Optional[int] = None,
+        started: Optional[float] = None,
+        seed: int = 0
+) -> List[Dict]:
+    """
+    回放请求直到 duration 秒或 max_requests 个请求。
+
+    Args:
+        rate: 每秒请求数；为 None 时以 concurrency 个线程闭环发送，否则按固定间隔开环发送，
+              此时 concurrency 为同时在途请求的上限
+        started: 计时起点（perf_counter），默认为调用时刻
+
+    Returns:
+        list: 每个请求的 {'t' 发出时刻, 'scenario', 'status', 'latency' 秒, 'error'}
+    """
+    names = sorted(mix)
+    cumulative, total = [], 0.0
+    for name in names:
+        total += mix[name]
+        cumulative.append(total)
+    started = time.perf_counter() if started is None else started
+    deadline = started + duration
+    samples: List[Dict] = []
+    lock = threading.Lock()
+    issued = [0]
+
+    def take_slot() -> bool:
+        with lock:
+            if max_requests is not None and issued[0] >= max_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def execute(scenario: str, scheduled: float) -> None:
+        body = payloads(scenario)
+        status, error = send_request(host, port, body)
+        sample = {
+            't': round(scheduled - started, 4),
+            'scenario': scenario,
+            'status': status,
+            'latency': time.perf_counter() - scheduled,
+            'error': error
+        }
+        with lock:
+            samples.append(sample)
+
+    def pick(rng: random.Random) -> str:
+        return names[bisect.bisect_left(cumulative, rng.random() * total)]
+
+    if rate is None:
+        def client(index: int) -> None:
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline and take_slot():
+                execute(pick(rng), time.perf_counter())
+
+        threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    rng = random.Random(seed)
+    interval = 1.0 / rate
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        scheduled = started
+        while scheduled < deadline and take_slot():
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(execute, pick(rng), scheduled)
+            scheduled += interval
+    return samples
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def latency_stats(samples: List[Dict]) -> Dict[str, Optional[float]]:
+    latencies = sorted(s['latency'] * 1000 for s in samples)
+    if not latencies:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None, 'mean': None}
+    return {
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'max': round(latencies[-1], 2),
+        'mean': round(sum(latencies) / len(latencies), 2)
+    }
+
+
+def summarize(samples: List[Dict], elapsed: float, rss_samples: List[Dict], config: Dict) -> Dict:
+    """汇总为可对比的结果：整体和各场景的吞吐、延迟百分位数、错误率，每秒时间线和 RSS 采样"""
+    errors = [s for s in samples if not 200 <= s['status'] < 300]
+    status_counts: Dict[str, int] = {}
+    for s in samples:
+        status_counts[str(s['status'])] = status_counts.get(str(s['status']), 0) + 1
+    scenarios = {}
+    for name in sorted({s['scenario'] for s in samples}):
+        scenario_samples = [s for s in samples if s['scenario'] == name]
+        scenario_errors = sum(1 for s in scenario_samples if not 200 <= s['status'] < 300)
+        scenarios[name] = {
+            'requests': len(scenario_samples),
+            'errors': scenario_errors,
+            'latency_ms': latency_stats(scenario_samples)
+        }
+    timeline: Dict[int, List[Dict]] = {}
+    for s in samples:
+        timeline.setdefault(int(s['t']), []).append(s)
+    error_messages: Dict[str, int] = {}
+    for s in errors:
+        key = f"{s['status']}: {s['error']}"[:200]
+        error_messages[key] = error_messages.get(key, 0) + 1
+    return {
+        'config': config,
+        'created_at': time.time(),
+        'elapsed_seconds': round(elapsed, 3),
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 3) if elapsed > 0 else None,
+        'error_rate': round(len(errors) / len(samples), 4) if samples else None,
+        'status_counts': status_counts,
+        'errors': dict(sorted(error_messages.items(), key=lambda item: -item[1])[:20]),
+        'latency_ms': latency_stats(samples),
+        'scenarios': scenarios,
+        'timeline': [
+            {
+                'second': second,
+                'requests': len(bucket),
+                'errors': sum(1 for s in bucket if not 200 <= s['status'] < 300),
+                'p95_ms': latency_stats(bucket)['p95']
+            }
+            for second, bucket in sorted(timeline.items())
+        ],
+        'rss': rss_samples,
+        'rss_peak_mb': max((s['rss_mb'] for s in rss_samples), default=None)
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, threads: int) -> subprocess.Popen:
+    """在本机启动 serve.py 并等待其可以响应请求"""
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=API_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'serve.py exited with status {process.returncode}')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/cache/stats')
+            ok = conn.getresponse().status == 200
+            conn.close()
+            if ok:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'serve.py did not become ready within {SERVER_START_TIMEOUT}s')
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def print_report(report: Dict, previous: Optional[Dict] = None) -> None:
+    def change(key_path: Tuple[str, ...]) -> str:
+        if previous is None:
+            return ''
+        old, new = previous, report
+        for key in key_path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if not old or new is None:
+            return ''
+        return f' ({(new / old - 1) * 100:+.0f}% vs {old})'
+
+    latency = report['latency_ms']
+    print(f"requests {report['requests']} in {report['elapsed_seconds']}s, "
+          f"throughput {report['throughput_rps']} req/s{change(('throughput_rps',))}")
+    print(f"error rate {report['error_rate']}, status {report['status_counts']}")
+    for p in ('p50', 'p95', 'p99', 'max'):
+        print(f"latency {p:<4} {latency[p]} ms{change(('latency_ms', p))}")
+    print(f"{'scenario':<20} {'requests':>8} {'errors':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, stats in report['scenarios'].items():
+        lat = stats['latency_ms']
+        print(f"{name:<20} {stats['requests']:>8} {stats['errors']:>6} "
+              f"{lat['p50']:>10} {lat['p95']:>10} {lat['p99']:>10}")
+    if report['rss']:
+        print(f"server RSS peak {report['rss_peak_mb']} MB{change(('rss_peak_mb',))}, "
+              f"first {report['rss'][0]['rss_mb']} MB, last {report['rss'][-1]['rss_mb']} MB")
+    for message, count in report['errors'].items():
+        print(f'ERROR x{count} {message}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血缘分析 HTTP 接口负载测试')
+    parser.add_argument('--url', help='已运行服务的地址，不指定时在本机启动 serve.py')
+    parser.add_argument('--server-pid', type=int, help='配合 --url 使用，采样该进程树的 RSS')
+    parser.add_argument('--workers', type=int, default=1, help='本机启动 serve.py 时的工作进程数（大于 1 时只适合无状态请求）')
+    parser.add_argument('--threads', type=int, default=None, help='每个工作进程的请求并发数，默认同 --concurrency')
+    parser.add_argument('--concurrency', type=int, default=LOAD_CONCURRENCY, help='并发客户端数（开环时为在途请求上限）')
+    parser.add_argument('--rate', type=float, help='每秒请求数，指定时改为开环固定速率')
+    parser.add_argument('--duration', type=float, default=LOAD_DURATION, help='持续时间（秒）')
+    parser.add_argument('--requests', type=int, help='请求总数上限')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'请求组合，可选场景: {",".join(sorted(SCENARIOS))}')
+    parser.add_argument('--variants', type=int, default=0, help='每个场景轮换的脚本数，0 表示每个请求都不同')
+    parser.add_argument('--warmup', type=int, default=0, help='正式计时前先串行发送的请求数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load_results.json', help='结果 JSON 文件')
+    parser.add_argument('--compare', help='之前的结果 JSON 文件，打印对比')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    payloads = PayloadFactory(args.variants)
+    process = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port, server_pid = parts.hostname, parts.port or 80, args.server_pid
+    else:
+        host, port = '127.0.0.1', _free_port()
+        threads = args.threads or max(1, args.concurrency)
+        print(f'Starting serve.py on port {port} ({args.workers} worker(s) x {threads} thread(s))')
+        process = start_server(port, args.workers, threads)
+        server_pid = process.pid
+
+    try:
+        names = sorted(mix)
+        for i in range(args.warmup):
+            send_request(host, port, payloads(names[i % len(names)]))
+        started = time.perf_counter()
+        sampler = RSSSampler(server_pid, started) if server_pid else None
+        if sampler is not None:
+            sampler.start()
+        samples = run_load(
+            host, port, mix, payloads,
+            concurrency=max(1, args.concurrency), rate=args.rate, duration=args.duration,
+            max_requests=args.requests, started=started, seed=args.seed
+        )
+        elapsed = time.perf_counter() - started
+        if sampler is not None:
+            sampler.stop()
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    config = {
+        'url': args.url, 'workers': None if args.url else args.workers, 'concurrency': args.concurrency,
+        'rate': args.rate, 'duration': args.duration, 'requests': args.requests, 'mix': mix,
+        'variants': args.variants, 'warmup': args.warmup, 'seed': args.seed, 'cpu_count': os.cpu_count()
+    }
+    report = summarize(samples, elapsed, sampler.samples if sampler is not None else [], config)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+确定性的合成 SQL 工作负载，用于血缘流水线的基准测试。相同参数和种子总是生成相同的脚本。
+"""
+import random
+from typing import Dict, List
+
+# 预置工作负载：覆盖宽表、深 CTE 链和多表关联等典型形态
+WORKLOADS: Dict[str, Dict] = {
+    'small': {'statements': 40, 'cte_depth': 1, 'columns': 8, 'fan_in': 2, 'hidden_ratio': 0.3},
+    'wide': {'statements': 20, 'cte_depth': 1, 'columns': 40, 'fan_in': 3, 'hidden_ratio': 0.5},
+    'deep': {'statements': 20, 'cte_depth': 5, 'columns': 10, 'fan_in': 2, 'hidden_ratio': 1.0},
+    'fan_in': {'statements': 20, 'cte_depth': 1, 'columns': 12, 'fan_in': 6, 'hidden_ratio': 0.2},
+}
+
+
+def make_workload(
+        statements: int,
+        cte_depth: int = 1,
+        columns: int = 8,
+        fan_in: int = 2,
+        hidden_ratio: float = 0.3,
+        base_tables: int = 20,
+        seed: int = 42
+) -> str:
+    """
+    生成合成脚本：每条语句把 fan_in 张上游表按 id 关联后写入 dw.t<i>，上游从 ods 基础表和之前语句的目标表中选取，
+    因此会形成多层的物理中间表。按 hidden_ratio 的比例，语句的查询先经过 cte_depth 层 CTE 链
+    （不含 '.' 的隐藏中间节点，filter_ctes 时会被投影掉），其余语句直接查询上游表。
+
+    Args:
+        statements: 语句数
+        cte_depth: CTE 链的层数
+        columns: 每张表的字段数（列宽）
+        fan_in: 每条语句关联的上游表数
+        hidden_ratio: 经过 CTE 链的语句占比
+        base_tables: ods 基础表数量
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    upstream_pool: List[str] = [f'ods.s{k}' for k in range(base_tables)]
+    script = []
+    for i in range(statements):
+        sources = rng.sample(upstream_pool, min(fan_in, len(upstream_pool)))
+        joins = ''.join(f' JOIN {s} j{k} ON j{k}.id = j0.id' for k, s in enumerate(sources[1:], 1))
+        select_list = ', '.join(
+            f'j{rng.randrange(len(sources))}.c{rng.randrange(columns)} AS c{c}' for c in range(columns)
+        )
+        body = f'SELECT j0.id AS id, {select_list} FROM {sources[0]} j0{joins}'
+        target = f'dw.t{i}'
+        if cte_depth > 0 and rng.random() < hidden_ratio:
+            column_list = ', '.join(['id'] + [f'c{c}' for c in range(columns)])
+            ctes = [f'cte0 AS ({body})']
+            ctes.extend(f'cte{d} AS (SELECT {column_list} FROM cte{d - 1})' for d in range(1, cte_depth))
+            script.append(
+                f'INSERT INTO {target}\nWITH {", ".join(ctes)}\nSELECT {column_list} FROM cte{cte_depth - 1}'
+            )
+        else:
+            script.append(f'INSERT INTO {target}\n{body}')
+        upstream_pool.append(target)
+    return ';\n'.join(script) + ';'
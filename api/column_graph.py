@@ -0,0 +1,161 @@
+"""
+列级血缘图的紧凑表示：表名、字段名驻留为整数编号，列节点是整数，去重后的边以 CSR（压缩稀疏行）数组保存。
+合并、隐藏节点投影和分层都在整数上进行，只在生成结果时还原为字符串；
+十万级列的大图上，内存峰值和对象分配远低于以 (表, 字段) 元组为节点、列表为邻接的表示。
+
+    graph = ColumnGraph.from_entries(entries)
+    graph.successors.get(column)      # 下游列编号数组
+    graph.column_name(column)         # (表, 字段)
+"""
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EDGE_SHIFT = 32  # 边编码为 (from << EDGE_SHIFT) | to
+EDGE_MASK = (1 << EDGE_SHIFT) - 1
+
+
+class CSRAdjacency:
+    """CSR 邻接：节点 u 的邻居为 targets[offsets[u]:offsets[u + 1]]；接口与 dict.get 相同，可替代邻接表字典"""
+
+    __slots__ = ('offsets', 'targets')
+
+    def __init__(self, offsets: array, targets: array):
+        self.offsets = offsets
+        self.targets = targets
+
+    def get(self, node: int, default=()) -> array:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+
+def _build_csr(codes: List[int], node_count: int) -> CSRAdjacency:
+    """codes 须已按 (起点, 终点) 排序"""
+    offsets = array('i', bytes(4 * (node_count + 1)))
+    for code in codes:
+        offsets[(code >> EDGE_SHIFT) + 1] += 1
+    for i in range(node_count):
+        offsets[i + 1] += offsets[i]
+    return CSRAdjacency(offsets, array('i', (code & EDGE_MASK for code in codes)))
+
+
+class ColumnGraph:
+    """
+    按语句合并后的列级血缘图。构建阶段用 add_path/add_edge 登记列和边（边按整数编码去重），
+    freeze() 之后得到正反两个方向的 CSR 邻接，不再接受新边。
+    只在血缘路径中出现过的表和列会被登记，节点的字段列表即该表登记过的全部列。
+    """
+
+    def __init__(self):
+        self.tables: List[str] = []
+        self.table_ids: Dict[str, int] = {}
+        self.fields: List[str] = []
+        self.field_ids: Dict[str, int] = {}
+        self.column_table = array('i')  # 列编号 -> 表编号
+        self.column_field = array('i')  # 列编号 -> 字段编号
+        self._column_ids: Dict[int, int] = {}  # (表编号 << 32) | 字段编号 -> 列编号
+        self._edge_codes: Set[int] = set()
+        self.successors: Optional[CSRAdjacency] = None
+        self.predecessors: Optional[CSRAdjacency] = None
+
+    @property
+    def column_count(self) -> int:
+        return len(self.column_table)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.successors.targets) if self.successors is not None else len(self._edge_codes)
+
+    def table_id(self, table: str) -> int:
+        tid = self.table_ids.get(table)
+        if tid is None:
+            tid = self.table_ids[table] = len(self.tables)
+            self.tables.append(table)
+        return tid
+
+    def column(self, table: str, field: str) -> int:
+        """登记并返回列编号"""
+        tid = self.table_id(table)
+        fid = self.field_ids.get(field)
+        if fid is None:
+            fid = self.field_ids[field] = len(self.fields)
+            self.fields.append(field)
+        key = (tid << EDGE_SHIFT) | fid
+        cid = self._column_ids.get(key)
+        if cid is None:
+            cid = self._column_ids[key] = len(self.column_table)
+            self.column_table.append(tid)
+            self.column_field.append(fid)
+        return cid
+
+    def column_name(self, column: int) -> Tuple[str, str]:
+        return self.tables[self.column_table[column]], self.fields[self.column_field[column]]
+
+    def add_edge(self, u: int, v: int) -> None:
+        self._edge_codes.add((u << EDGE_SHIFT) | v)
+
+    def add_path(self, path: Iterable[Tuple[str, str]]) -> None:
+        """
+        登记一条列级血缘路径 ((table, field), ...)：路径上的列全部登记，
+        相邻且属于不同表的列之间连边（同 main2.iter_column_path_edges）。
+        """
+        prev = -1
+        prev_table = -1
+        for table, field in path:
+            cid = self.column(table, field)
+            tid = self.column_table[cid]
+            if prev >= 0 and prev_table != tid:
+                self._edge_codes.add((prev << EDGE_SHIFT) | cid)
+            prev, prev_table = cid, tid
+
+    def freeze(self) -> 'ColumnGraph':
+        """把去重后的边整理为正反两个方向的 CSR 数组"""
+        codes = sorted(self._edge_codes)
+        self._edge_codes = set()
+        n = self.column_count
+        self.successors = _build_csr(codes, n)
+        reverse = [((code & EDGE_MASK) << EDGE_SHIFT) | (code >> EDGE_SHIFT) for code in codes]
+        del codes
+        reverse.sort()
+        self.predecessors = _build_csr(reverse, n)
+        return self
+
+    def table_fields(self) -> List[List[int]]:
+        """表编号 -> 该表的字段编号列表"""
+        fields: List[List[int]] = [[] for _ in self.tables]
+        for tid, fid in zip(self.column_table, self.column_field):
+            fields[tid].append(fid)
+        return fields
+
+    def column_ranks(self) -> array:
+        """列编号 -> 按 (表名, 字段名) 排序后的名次；按名次比较边等价于按字符串四元组比较"""
+        order = sorted(
+            range(self.column_count),
+            key=lambda c: (self.tables[self.column_table[c]], self.fields[self.column_field[c]])
+        )
+        ranks = array('i', bytes(4 * len(order)))
+        for rank, column in enumerate(order):
+            ranks[column] = rank
+        return ranks
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict]) -> 'ColumnGraph':
+        """从逐语句血缘记录（见 lineage_cache.extract_statement_lineage）构建"""
+        graph = cls()
+        for entry in entries:
+            for path in entry['column_paths']:
+                graph.add_path(path)
+        return graph.freeze()
+
+    @classmethod
+    def from_edges(
+            cls,
+            raw_edges: Iterable[Tuple[str, str, str, str]],
+            fields: Dict[str, Iterable[str]]
+    ) -> 'ColumnGraph':
+        """从 (from_table, from_field, to_table, to_field) 边和表 -> 字段集合构建（会话增量合并的格式）"""
+        graph = cls()
+        for table, table_fields in fields.items():
+            for field in table_fields:
+                graph.column(table, field)
+        for from_t, from_f, to_t, to_f in raw_edges:
+            graph.add_edge(graph.column(from_t, from_f), graph.column(to_t, to_f))
+        return graph.freeze()
@@ -0,0 +1,271 @@
+from typing import Dict, List, Optional, Tuple
+
+from sqlparse import lexer
+from sqlparse import tokens as T
+
+DEFAULT_SCHEMA = '<default>'  # 与 sqllineage 对未限定表名的处理保持一致
+HIVE_LIKE_DIALECTS = {'hive', 'sparksql', 'databricks'}  # 支持 INSERT OVERWRITE / PARTITION 的方言
+
+# 出现这些关键字时轻量扫描无法可靠判断，交给完整解析器
+_UNSAFE_KEYWORDS = ('lateral', 'pivot', 'unnest', 'tablesample', 'recursive', 'values',
+                    'merge', 'update', 'delete', 'table', 'for', 'connect')
+# 所有方言的语法都接受的连接关键字；SEMI/ANTI/NATURAL/ASOF/STRAIGHT_JOIN 等只有部分方言支持，交给完整解析器判断
+_COMMON_JOINS = ('join', 'inner join', 'left join', 'left outer join', 'right join', 'right outer join',
+                 'full join', 'full outer join', 'cross join')
+# sqlparse 把这些修饰词拆成单独的记号（如 LEFT SEMI JOIN -> left, semi, join），出现在 JOIN 之前时不可靠
+_JOIN_MODIFIERS = {'semi', 'anti', 'asof', 'global', 'any', 'all', 'natural', 'straight', 'positional', 'paste',
+                   'array', 'left', 'right', 'full', 'inner', 'outer', 'cross'}
+# 按 sqlfluff 语法不支持轻量扫描所识别语句形式的方言：trino/soql 连基本的 INSERT ... SELECT 都会被拒绝
+_UNSUPPORTED_DIALECTS = {'trino', 'soql'}
+_NO_CTAS_DIALECTS = {'clickhouse', 'impala', 'materialize'}  # 不接受 CREATE TABLE ... AS SELECT
+_NO_INSERT_COLUMN_LIST_DIALECTS = {'hive'}  # 不接受 INSERT INTO t (a, b) ...
+_SKIP_TYPES = (T.Whitespace, T.Newline, T.Comment.Single, T.Comment.Multiline)
+
+
+class _NotConfident(Exception):
+    """扫描器无法确定该语句的表级血缘"""
+
+
+def _significant_tokens(sql: str) -> List[Tuple[object, str]]:
+    toks = []
+    for ttype, value in lexer.tokenize(sql):
+        if ttype in _SKIP_TYPES or ttype in T.Comment:
+            continue
+        toks.append((ttype, value.lower() if ttype in T.Keyword else value))
+    return toks
+
+
+def _is_keyword(tok, *values) -> bool:
+    return tok is not None and tok[0] in T.Keyword and (not values or ' '.join(tok[1].split()) in values)
+
+
+def _is_punct(tok, value) -> bool:
+    return tok is not None and tok[0] in T.Punctuation and tok[1] == value
+
+
+def _read_table_name(toks, i) -> Tuple[str, int]:
+    """从 i 开始读取 name 或 schema.name，返回 (规范化表名, 下一个位置)"""
+    parts = []
+    while True:
+        tok = toks[i] if i < len(toks) else None
+        if tok is None or tok[0] not in T.Name or tok[1][:1] in ('`', '"', '['):
+            raise _NotConfident()
+        parts.append(tok[1].lower())
+        i += 1
+        if _is_punct(toks[i] if i < len(toks) else None, '.'):
+            i += 1
+            continue
+        break
+    if len(parts) > 2:
+        raise _NotConfident()
+    if len(parts) == 1:
+        parts.insert(0, DEFAULT_SCHEMA)
+    return '.'.join(parts), i
+
+
+def _skip_parens(toks, i) -> int:
+    """i 指向 '('，返回匹配的 ')' 之后的位置"""
+    depth = 0
+    while i < len(toks):
+        if _is_punct(toks[i], '('):
+            depth += 1
+        elif _is_punct(toks[i], ')'):
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    raise _NotConfident()
+
+
+def _read_target(toks, dialect) -> Tuple[Optional[str], int]:
+    """解析语句头部，返回 (目标表, 查询体开始位置)；纯 SELECT/WITH 没有目标表"""
+    head = toks[0]
+    if head[0] in T.Keyword.DML and head[1] == 'select' or head[0] in T.Keyword.CTE:
+        return None, 0
+    if head[0] in T.Keyword.DML and head[1] == 'insert':
+        i = 1
+        if _is_keyword(toks[i] if i < len(toks) else None, 'into'):
+            i += 1
+        elif _is_keyword(toks[i] if i < len(toks) else None, 'overwrite') and dialect in HIVE_LIKE_DIALECTS:
+            i += 1
+            if not _is_keyword(toks[i] if i < len(toks) else None, 'table'):
+                raise _NotConfident()
+            i += 1
+        else:
+            raise _NotConfident()
+        target, i = _read_table_name(toks, i)
+        if _is_keyword(toks[i] if i < len(toks) else None, 'partition') and dialect in HIVE_LIKE_DIALECTS:
+            i = _skip_parens(toks, i + 1)
+        elif _is_punct(toks[i] if i < len(toks) else None, '(') and \
+                _is_column_list(toks[i + 1] if i + 1 < len(toks) else None):
+            if dialect in _NO_INSERT_COLUMN_LIST_DIALECTS:
+                raise _NotConfident()
+            i = _skip_parens(toks, i)  # 插入列清单
+        return target, i
+    if head[0] in T.Keyword.DDL and head[1] == 'create':
+        if dialect in _NO_CTAS_DIALECTS:
+            raise _NotConfident()
+        i = 1
+        if not _is_keyword(toks[i] if i < len(toks) else None, 'table'):
+            raise _NotConfident()
+        i += 1
+        if _is_keyword(toks[i] if i < len(toks) else None, 'if'):
+            if not (_is_keyword(toks[i + 1] if i + 1 < len(toks) else None, 'not')
+                    and _is_keyword(toks[i + 2] if i + 2 < len(toks) else None, 'exists')):
+                raise _NotConfident()
+            i += 3
+        target, i = _read_table_name(toks, i)
+        if not _is_keyword(toks[i] if i < len(toks) else None, 'as'):
+            raise _NotConfident()
+        return target, i + 1
+    raise _NotConfident()
+
+
+def _is_column_list(tok) -> bool:
+    """'(' 之后是名称而不是 SELECT/WITH/'(' 时，括号是列清单"""
+    return tok is not None and tok[0] in T.Name
+
+
+def _scan_body(toks, start, dialect) -> Tuple[Optional[str], set, set]:
+    """
+    扫描查询体，返回 (WITH ... INSERT 形式的目标表, FROM/JOIN 后引用的表, CTE 名称)。
+    子查询只接受出现在表的位置（FROM/JOIN 之后、CTE 定义、查询体开头）；SELECT 列表中的标量子查询、
+    WHERE/HAVING 中的 IN/EXISTS/ANY 子查询在完整解析器中不计入源表，遇到时回退。
+    """
+    body = toks[start:]
+    if not body:
+        raise _NotConfident()
+    first = body[0]
+    if not (first[0] in T.Keyword.DML and first[1] == 'select' or first[0] in T.Keyword.CTE
+            or _is_punct(first, '(')):
+        raise _NotConfident()
+
+    target = None
+    refs = set()
+    ctes = set()
+    paren_kinds = []  # 每层括号是子查询还是普通括号（函数调用、表达式）
+    subquery_at = {0}  # 允许出现子查询的 '(' 位置
+    i = 0
+    n = len(body)
+    while i < n:
+        tok = body[i]
+        nxt = body[i + 1] if i + 1 < n else None
+        if tok[0] in T.Keyword:
+            word = ' '.join(tok[1].split())
+            if any(k == word or word.startswith(k + ' ') or word.endswith(' ' + k) for k in _UNSAFE_KEYWORDS):
+                raise _NotConfident()
+        if _is_punct(tok, ';'):
+            raise _NotConfident()
+        if tok[0] in T.Keyword.DML and tok[1] != 'select':
+            # 只接受 WITH 之后顶层的一个 INSERT
+            if tok[1] != 'insert' or paren_kinds or target is not None or first[0] not in T.Keyword.CTE:
+                raise _NotConfident()
+            target, offset = _read_target(body[i:], dialect)
+            i += offset
+            continue
+        if _is_punct(tok, '('):
+            is_subquery = nxt is not None and (nxt[0] in T.Keyword.DML and nxt[1] == 'select'
+                                               or nxt[0] in T.Keyword.CTE or _is_punct(nxt, '('))
+            if is_subquery:
+                if i not in subquery_at:
+                    raise _NotConfident()
+                subquery_at.add(i + 1)  # ((SELECT ...)) 的内层括号
+            paren_kinds.append(is_subquery)
+            i += 1
+            continue
+        if _is_punct(tok, ')'):
+            if not paren_kinds:
+                raise _NotConfident()
+            if paren_kinds.pop():
+                # 子查询别名的列清单：(SELECT ...) [AS] x(a, b)
+                j = i + 1
+                if _is_keyword(body[j] if j < n else None, 'as'):
+                    j += 1
+                if j < n and body[j][0] in T.Name and _is_punct(body[j + 1] if j + 1 < n else None, '('):
+                    raise _NotConfident()
+            i += 1
+            continue
+        # CTE 定义：WITH name AS ( 或 , name AS (
+        if tok[0] in T.Name and i > 0 and (body[i - 1][0] in T.Keyword.CTE or _is_punct(body[i - 1], ',')) \
+                and _is_keyword(nxt, 'as') and _is_punct(body[i + 2] if i + 2 < n else None, '('):
+            if tok[1][:1] in ('`', '"', '['):
+                raise _NotConfident()
+            ctes.add(tok[1].lower())
+            i += 2
+            subquery_at.add(i)
+            continue
+        if _is_keyword(tok) and (tok[1] == 'from' or tok[1].endswith('join')):
+            if paren_kinds and not paren_kinds[-1] or _is_keyword(body[i - 1] if i else None, 'distinct'):
+                raise _NotConfident()  # 函数参数里的 FROM（例如 EXTRACT(YEAR FROM d)）或 IS DISTINCT FROM
+            if tok[1] != 'from':
+                prev = body[i - 1] if i else None
+                if ' '.join(tok[1].split()) not in _COMMON_JOINS or prev is None or prev[0] in T.Keyword \
+                        or prev[1].lower() in _JOIN_MODIFIERS:
+                    raise _NotConfident()
+            i = _scan_table_refs(body, i + 1, refs)
+            if _is_punct(body[i] if i < n else None, '('):
+                subquery_at.add(i)
+            continue
+        i += 1
+    if paren_kinds:
+        raise _NotConfident()
+    return target, refs, ctes
+
+
+def _scan_table_refs(body, i, refs) -> int:
+    """扫描 FROM/JOIN 后的表引用（包括逗号分隔的多个表），返回继续扫描的位置"""
+    n = len(body)
+    while True:
+        tok = body[i] if i < n else None
+        if _is_punct(tok, '('):
+            return i  # 子查询，由主循环继续扫描
+        table, i = _read_table_name(body, i)
+        if _is_punct(body[i] if i < n else None, '('):
+            raise _NotConfident()  # 表函数
+        refs.add(table)
+        # 可选别名：AS alias 或 alias
+        if _is_keyword(body[i] if i < n else None, 'as'):
+            i += 1
+            if not (i < n and body[i][0] in T.Name):
+                raise _NotConfident()
+            i += 1
+        elif i < n and body[i][0] in T.Name:
+            i += 1
+        if _is_punct(body[i] if i < n else None, '('):
+            raise _NotConfident()  # 别名的列清单 x(a, b)，部分方言（如 mysql）不支持
+        if _is_punct(body[i] if i < n else None, ','):
+            i += 1
+            continue
+        return i
+
+
+def scan_table_lineage(stmt: str, dialect: str = 'ansi') -> Optional[Dict]:
+    """
+    基于 sqlparse 词法记号的轻量表级血缘扫描，只处理能可靠判断的简单语句：
+    SELECT / WITH / INSERT INTO ... SELECT / CREATE TABLE ... AS SELECT（hive 类方言另支持 INSERT OVERWRITE）。
+
+    Returns:
+        dict: 与 lineage_cache.extract_statement_lineage(with_columns=False) 相同格式的记录；
+              无法可靠判断时返回 None，由调用方回退到完整解析器
+    """
+    if dialect in _UNSUPPORTED_DIALECTS:
+        return None
+    try:
+        toks = _significant_tokens(stmt)
+        if not toks:
+            return None
+        target, start = _read_target(toks, dialect)
+        cte_target, refs, ctes = _scan_body(toks, start, dialect)
+        target = target or cte_target
+    except (_NotConfident, IndexError):
+        return None
+
+    sources = {t for t in refs if not (t.startswith(DEFAULT_SCHEMA + '.') and t.split('.', 1)[1] in ctes)}
+    if target is not None and target in sources:
+        return None  # 自引用语句的分类规则较复杂，交给完整解析器
+    return {
+        'sources': tuple(sorted(sources)),
+        'targets': (target,) if target else (),
+        'intermediates': (),
+        'column_paths': None
+    }
@@ -0,0 +1,353 @@
+"""
+数仓 SQL 目录批量血缘采集。递归扫描目录下的 SQL 文件，多进程并行解析，合并为一张血缘图并写出快照；
+服务启动时通过 LINEAGE_SNAPSHOT 环境变量加载快照，无需再经 /api/lineage 重新提交 SQL。
+
+    python ingest.py /path/to/warehouse --output lineage_snapshot.json --workers 8
+
+加 --store（或设置 LINEAGE_STORE_URL）时同时把逐文件血缘写入持久化存储，脚本名为文件相对路径，
+内容哈希与存储中一致的文件不重复写入，见 lineage_store.py。
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+from typing import Dict, List, Optional, Tuple
+
+from lineage_cache import extract_statement_lineage, split_statements
+from main2 import build_lineage_json_from_entries
+from metadata_catalog import CATALOG_PATH, get_catalog
+from parallel_parse import get_executor, set_parse_workers, shutdown_executor
+from parser_context import DEFAULT_DIALECT, validate_dialect
+from metrics import get_logger
+from table_lineage import build_table_lineage_json_from_entries
+
+logger = get_logger(__name__)
+
+STATE_VERSION = 3  # 状态文件格式版本，不一致时全部重新解析
+SNAPSHOT_PATH = os.environ.get('LINEAGE_SNAPSHOT', '')  # 服务启动时加载的快照路径
+# 文件修改时间距上次检查不足该时长（纳秒）时不信任 mtime，需比较内容哈希；覆盖粗粒度时间戳的文件系统（FAT 为 2 秒）
+MTIME_RACY_NS = int(os.environ.get('LINEAGE_INGEST_MTIME_RACY_NS', 2 * 10 ** 9))
+VERIFY_HASH = os.environ.get('LINEAGE_INGEST_VERIFY_HASH', '') == '1'  # 为 1 时总是比较内容哈希，不使用 mtime 快速路径
+STORE_SYNC_FILES = 200  # 写入持久化存储时每个事务包含的文件数
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat_unchanged(old: Dict, st: os.stat_result) -> bool:
+    """
+    mtime 快速路径：大小和纳秒级 mtime 都与上次一致，且上次检查时 mtime 已经早于检查时刻 MTIME_RACY_NS 以上，
+    才认为文件未变。检查时刻附近被修改的文件可能在同一个时间戳内再次被改写，mtime 不可信，需要比较哈希。
+    """
+    return (
+        old['size'] == st.st_size
+        and old['mtime_ns'] == st.st_mtime_ns
+        and st.st_mtime_ns < old['checked_ns'] - MTIME_RACY_NS
+    )
+
+
+def _parse_file(path: str, dialect: str, with_columns: bool, metadata_catalog: Optional[str] = None) -> Dict:
+    """
+    工作进程入口：解析一个文件中的全部语句。单条语句失败不影响同文件的其他语句。
+
+    Returns:
+        dict: {'entries': 逐语句血缘记录, 'indexes': 每条记录在文件中的语句序号,
+               'errors': [{'statement': 序号, 'error': 信息}], 'seconds': 耗时}
+    """
+    start = time.perf_counter()
+    entries = []
+    indexes = []
+    errors = []
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            statements = split_statements(f.read())
+    except Exception as e:
+        return {'entries': [], 'indexes': [], 'errors': [{'statement': None, 'error': str(e)}],
+                'seconds': time.perf_counter() - start}
+    for i, stmt in enumerate(statements):
+        try:
+            entries.append(extract_statement_lineage(
+                stmt, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog
+            ))
+            indexes.append(i)
+        except Exception as e:
+            errors.append({'statement': i, 'error': str(e)})
+    return {'entries': entries, 'indexes': indexes, 'errors': errors, 'seconds': time.perf_counter() - start}
+
+
+def _entry_from_json(entry: Dict) -> Dict:
+    """状态文件中的记录是 JSON 列表，还原为 extract_statement_lineage 的元组格式"""
+    return {
+        'sources': tuple(entry['sources']),
+        'targets': tuple(entry['targets']),
+        'intermediates': tuple(entry['intermediates']),
+        'column_paths': None if entry['column_paths'] is None else tuple(
+            tuple(tuple(column) for column in path) for path in entry['column_paths']
+        )
+    }
+
+
+def _sync_store(store_url: str, files: List[str], state: Dict[str, Dict], previous: Dict[str, Dict]) -> int:
+    """把内容哈希与存储中不一致的文件写入持久化存储，每个事务写入 STORE_SYNC_FILES 个文件，返回写入的文件数"""
+    from lineage_store import get_lineage_store
+
+    store = get_lineage_store(store_url)
+    stored_hashes = store.script_hashes()
+    removed = [rel for rel in previous if rel not in state and rel in stored_hashes]
+    if removed:
+        store.delete_scripts(removed)
+    pending = [rel for rel in files if stored_hashes.get(rel) != state[rel]['sha256']]
+    for i in range(0, len(pending), STORE_SYNC_FILES):
+        store.record_scripts(
+            (rel, list(zip(state[rel]['indexes'], map(_entry_from_json, state[rel]['entries']))), state[rel]['sha256'])
+            for rel in pending[i:i + STORE_SYNC_FILES]
+        )
+    return len(pending)
+
+
+def find_sql_files(root: str, pattern: str = '*.sql') -> List[str]:
+    """递归查找匹配的文件，返回按相对路径排序的列表，保证合并顺序稳定"""
+    matches = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for name in filenames:
+            if fnmatch.fnmatch(name, pattern):
+                matches.append(os.path.relpath(os.path.join(dirpath, name), root))
+    return sorted(matches)
+
+
+def load_state(path: str, options: Dict) -> Dict[str, Dict]:
+    """读取上次运行的逐文件状态；文件不存在、版本或解析选项不一致时返回空状态"""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignore unreadable state file %s: %s", path, e)
+        return {}
+    if state.get('version') != STATE_VERSION or state.get('options') != options:
+        return {}
+    return state.get('files', {})
+
+
+def ingest_directory(
+        root: str,
+        dialect: str = DEFAULT_DIALECT,
+        lineage_level: str = 'column',
+        filter_ctes: bool = True,
+        workers: Optional[int] = None,
+        pattern: str = '*.sql',
+        state_path: Optional[str] = None,
+        store_url: Optional[str] = None,
+        metadata_catalog: Optional[str] = None,
+        verify_hash: bool = VERIFY_HASH
+) -> Tuple[Dict, Dict[str, Dict]]:
+    """
+    采集目录下所有 SQL 文件的血缘。大小和 mtime 未变且 mtime 可信（见 _stat_unchanged）的文件直接复用上次结果，
+    其余文件比较内容哈希，哈希相同的也不重新解析；verify_hash 为 True 时所有文件都比较哈希。
+    指定 store_url 时把内容与存储不一致的文件写入持久化存储，并删除上次采集后已不存在的文件（仅列级采集）。
+    指定 metadata_catalog 时用元数据目录解析字段；目录内容变化后所有文件重新解析。
+
+    Returns:
+        tuple: (快照, 新的逐文件状态)
+    """
+    with_columns = lineage_level != 'table'
+    options = {
+        'dialect': dialect,
+        'lineage_level': lineage_level,
+        'metadata': get_catalog(metadata_catalog).cache_token() if metadata_catalog else None
+    }
+    previous = load_state(state_path, options)
+    files = find_sql_files(root, pattern)
+
+    state: Dict[str, Dict] = {}
+    to_parse: List[Tuple[str, Dict, str]] = []
+    for rel in files:
+        path = os.path.join(root, rel)
+        # 先取检查时刻再 stat，之后的修改一定晚于 checked_ns
+        checked_ns = time.time_ns()
+        st = os.stat(path)
+        signature = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'checked_ns': checked_ns}
+        old = previous.get(rel)
+        if old is not None and not verify_hash and _stat_unchanged(old, st):
+            state[rel] = dict(old, status='unchanged')
+            continue
+        sha256 = _file_sha256(path)
+        if old is not None and old['sha256'] == sha256:
+            state[rel] = dict(old, **signature, status='unchanged')
+            continue
+        to_parse.append((rel, signature, sha256))
+
+    start = time.perf_counter()
+    if to_parse:
+        # 采集是独立的命令行进程，--workers 直接决定本进程共享解析进程池的大小
+        if workers:
+            set_parse_workers(workers)
+        executor = get_executor()
+        futures = {
+            executor.submit(_parse_file, os.path.join(root, rel), dialect, with_columns, metadata_catalog):
+                (rel, signature, sha256)
+            for rel, signature, sha256 in to_parse
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            rel, signature, sha256 = futures[future]
+            try:
+                parsed = future.result()
+            except Exception as e:
+                parsed = {'entries': [], 'indexes': [], 'errors': [{'statement': None, 'error': str(e)}],
+                          'seconds': 0.0}
+            state[rel] = {
+                **signature,
+                'sha256': sha256,
+                'seconds': round(parsed['seconds'], 4),
+                'errors': parsed['errors'],
+                'entries': parsed['entries'],
+                'indexes': parsed['indexes'],
+                'status': 'failed' if parsed['errors'] else 'parsed'
+            }
+            print(f"[{done}/{len(to_parse)}] {rel}: {parsed['seconds']:.3f}s"
+                  + (f", {len(parsed['errors'])} failed statement(s)" if parsed['errors'] else ''))
+    parse_seconds = time.perf_counter() - start
+
+    stored = 0
+    store_seconds = 0.0
+    # 表级采集的记录没有列级路径，写入会把同一文件已入库的列级边替换为空，因此只有列级采集写入存储
+    if store_url and not with_columns:
+        logger.warning("Skip writing to lineage store: table-level ingest has no column lineage")
+    elif store_url:
+        start = time.perf_counter()
+        stored = _sync_store(store_url, files, state, previous)
+        store_seconds = time.perf_counter() - start
+
+    # 按文件路径顺序合并，保证结果与文件完成的先后无关
+    entries = [_entry_from_json(e) for rel in files for e in state[rel]['entries']]
+    if lineage_level == 'table':
+        result = build_table_lineage_json_from_entries(entries, filter_ctes=filter_ctes)
+    else:
+        result = build_lineage_json_from_entries(entries, filter_ctes=filter_ctes)
+
+    snapshot = {
+        'generated_at': time.time(),
+        'source_dir': os.path.abspath(root),
+        'dialect': dialect,
+        'lineage_level': lineage_level,
+        'filter_ctes': filter_ctes,
+        'options': options,
+        'stats': {
+            'files': len(files),
+            'parsed': sum(1 for s in state.values() if s['status'] != 'unchanged'),
+            'unchanged': sum(1 for s in state.values() if s['status'] == 'unchanged'),
+            'failed': sum(1 for s in state.values() if s['errors']),
+            'statements': len(entries),
+            'parse_seconds': round(parse_seconds, 3),
+            'stored': stored,
+            'store_seconds': round(store_seconds, 3)
+        },
+        'failed_files': {rel: s['errors'] for rel, s in state.items() if s['errors']},
+        'result': result
+    }
+    return snapshot, state
+
+
+def write_json(path: str, data: Dict) -> None:
+    """先写临时文件再替换，避免服务读到写了一半的快照"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH) -> Optional[Dict]:
+    """
+    加载 ingest 生成的快照，并登记血缘图以支持上下游、字段和视口查询；未配置或读取失败时返回 None。
+    快照图在服务运行期间一直有效，固定在 graph_store 中，不会被分析请求登记的图挤出。
+    """
+    if not path:
+        return None
+    from reachability import graph_store
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Failed to load lineage snapshot %s: %s", path, e)
+        return None
+    snapshot['result']['graph_id'] = graph_store.register(snapshot['result'], pinned=True)
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量采集数仓 SQL 目录的血缘')
+    parser.add_argument('directory', help='SQL 文件所在目录（递归扫描）')
+    parser.add_argument('--output', default='lineage_snapshot.json', help='快照输出路径')
+    parser.add_argument('--state', default=None, help='逐文件状态路径，默认 <output>.state.json')
+    parser.add_argument('--pattern', default='*.sql', help='文件名匹配模式')
+    parser.add_argument('--dialect', default=DEFAULT_DIALECT)
+    parser.add_argument('--level', choices=('column', 'table'), default='column')
+    parser.add_argument('--keep-ctes', action='store_true', help='保留 CTE 中间表（默认只显示物理表）')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认 LINEAGE_PARSE_WORKERS')
+    parser.add_argument('--top', type=int, default=20, help='报告中列出最慢的文件数')
+    parser.add_argument('--report', default=None, help='把逐文件耗时和失败信息写入 JSON 文件')
+    parser.add_argument('--metadata', default=CATALOG_PATH or None,
+                        help='元数据目录（JSON 或 SQLite 文件），默认 LINEAGE_METADATA_CATALOG')
+    parser.add_argument('--store', default=os.environ.get('LINEAGE_STORE_URL', ''),
+                        help='持久化血缘存储的 SQLAlchemy URL，如 sqlite:///lineage_store.db，默认 LINEAGE_STORE_URL')
+    parser.add_argument('--verify-hash', action='store_true', default=VERIFY_HASH,
+                        help='所有文件都比较内容哈希，不信任大小和 mtime（如从归档恢复、保留了 mtime 的目录）')
+    args = parser.parse_args()
+
+    dialect = validate_dialect(args.dialect)
+    state_path = args.state or f'{args.output}.state.json'
+    try:
+        snapshot, state = ingest_directory(
+            args.directory, dialect=dialect, lineage_level=args.level, filter_ctes=not args.keep_ctes,
+            workers=args.workers, pattern=args.pattern, state_path=state_path, store_url=args.store,
+            metadata_catalog=args.metadata, verify_hash=args.verify_hash
+        )
+    finally:
+        shutdown_executor()
+
+    write_json(args.output, snapshot)
+    write_json(state_path, {
+        'version': STATE_VERSION,
+        'options': snapshot['options'],
+        'files': {rel: {k: v for k, v in s.items() if k != 'status'} for rel, s in state.items()}
+    })
+
+    stats = snapshot['stats']
+    print(f"Files: {stats['files']} (parsed {stats['parsed']}, unchanged {stats['unchanged']}, "
+          f"failed {stats['failed']}), statements: {stats['statements']}, parse time: {stats['parse_seconds']}s")
+    print(f"Graph: {len(snapshot['result']['nodes'])} nodes, {len(snapshot['result']['edges'])} edges -> {args.output}")
+    if args.store:
+        print(f"Store: {stats['stored']} file(s) written in {stats['store_seconds']}s -> {args.store}")
+    slowest = sorted(
+        ((rel, s['seconds']) for rel, s in state.items() if s['status'] != 'unchanged'),
+        key=lambda x: -x[1]
+    )[:args.top]
+    if slowest:
+        print('Slowest files:')
+        for rel, seconds in slowest:
+            print(f"  {seconds:>8.3f}s  {rel}")
+    for rel, errors in snapshot['failed_files'].items():
+        print(f"Failed: {rel}: {errors[0]['error']}" + (f" (+{len(errors) - 1} more)" if len(errors) > 1 else ''),
+              file=sys.stderr)
+    if args.report:
+        write_json(args.report, {
+            'stats': stats,
+            'files': {rel: {'status': s['status'], 'seconds': s['seconds'], 'errors': s['errors']}
+                      for rel, s in state.items()}
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from lineage_cache import statement_cache
+from reachability import graph_store
+
+# --- 异步任务配置 (可通过环境变量覆盖) ---
+JOB_WORKERS = int(os.environ.get('LINEAGE_JOB_WORKERS', 2))  # 同时运行的任务数
+JOB_QUEUE_LIMIT = int(os.environ.get('LINEAGE_JOB_QUEUE_LIMIT', 32))  # 排队任务上限
+JOB_TIMEOUT = float(os.environ.get('LINEAGE_JOB_TIMEOUT', 300))  # 单个任务的墙钟超时（秒）
+STATEMENT_TIMEOUT = float(os.environ.get('LINEAGE_STATEMENT_TIMEOUT', 60))  # 单条语句的解析超时（秒）
+JOB_RESULT_TTL = float(os.environ.get('LINEAGE_JOB_RESULT_TTL', 600))  # 已结束任务结果的保留时间（秒）
+POLL_INTERVAL = 0.2  # 等待子进程时检查取消/超时的间隔
+
+# 服务进程是多线程的，直接 fork 可能继承被其他线程持有的锁；
+# 优先使用 forkserver 并预加载血缘模块，每个任务仍能快速启动
+if 'forkserver' in multiprocessing.get_all_start_methods():
+    _mp_context = multiprocessing.get_context('forkserver')
+    _mp_context.set_forkserver_preload(['lineage'])
+else:
+    _mp_context = multiprocessing.get_context()
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMEOUT = 'timeout'
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED, TIMEOUT}
+
+
+class JobQueueFull(Exception):
+    """排队任务数达到上限"""
+
+
+class StatementTimeout(Exception):
+    """单条语句解析超时"""
+
+
+def _raise_statement_timeout(signum, frame):
+    raise StatementTimeout()
+
+
+def _statement_keys(data: Dict):
+    """返回任务各语句的 (语句, 缓存键, 列级缓存键, 解析参数)；参数不合法时返回空列表，错误交给 analyze_sql_lineage 报告"""
+    from lineage import get_parse_options
+    from lineage_cache import split_statements, statement_cache_keys
+
+    try:
+        parse_options = get_parse_options(data)
+    except ValueError:
+        return []
+    with_columns = data.get('lineage_level', 'column') != 'table'
+    return [
+        (stmt,) + statement_cache_keys(stmt, parse_options['dialect'], with_columns, parse_options['metadata_catalog'])
+        + (parse_options,)
+        for stmt in split_statements(data['sql_query'])
+    ]
+
+
+def _cached_entries(data: Dict) -> Dict[str, Dict]:
+    """服务进程语句缓存中已有的本任务语句记录，随任务交给子进程，命中的语句不再解析"""
+    cached = {}
+    for _, key, full_key, _ in _statement_keys(data):
+        entry = statement_cache.get(key, full_key)
+        if entry is not None:
+            cached[key] = entry
+    return cached
+
+
+def _run_job_process(data: Dict, statement_timeout: float, cached: Dict[str, Dict], conn) -> None:
+    """
+    任务子进程入口：先放入服务进程已缓存的记录，再逐条预解析其余语句（带单语句超时并上报进度），
+    新解析的记录写入本进程的语句缓存并发回服务进程；随后原样调用 analyze_sql_lineage，此时所有语句都命中缓存。
+    任务进程是守护进程，不能再创建解析进程池，因此总是按 parallel=false 串行解析。
+    """
+    from lineage import analyze_sql_lineage
+    from lineage_cache import extract_statement_lineage
+
+    try:
+        data = dict(data, parallel=False)
+        for key, entry in cached.items():
+            statement_cache.put(key, entry)
+        statements = _statement_keys(data)
+        with_columns = data.get('lineage_level', 'column') != 'table'
+        # Windows 等平台没有 setitimer，此时只受任务级超时约束
+        use_timer = statement_timeout > 0 and hasattr(signal, 'setitimer')
+        if use_timer:
+            signal.signal(signal.SIGALRM, _raise_statement_timeout)
+        conn.send(('progress', 0, len(statements)))
+        for i, (stmt, key, full_key, parse_options) in enumerate(statements):
+            if statement_cache.get(key, full_key) is None:
+                entry = None
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, statement_timeout)
+                try:
+                    entry = extract_statement_lineage(
+                        stmt, dialect=parse_options['dialect'], with_columns=with_columns,
+                        metadata_catalog=parse_options['metadata_catalog']
+                    )
+                except StatementTimeout:
+                    conn.send(('timeout', f'Statement {i + 1} exceeded {statement_timeout}s parse timeout'))
+                    return
+                except Exception:
+                    # 解析错误交给 analyze_sql_lineage 按原有方式报告
+                    pass
+                finally:
+                    if use_timer:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+                if entry is not None:
+                    statement_cache.put(key, entry)
+                    conn.send(('entry', key, entry))
+            conn.send(('progress', i + 1, len(statements)))
+
+        result, status_code = analyze_sql_lineage(data)
+        # 连同登记的血缘图一起返回，服务进程据此支持上下游、字段和视口查询
+        graph = graph_store.get_graph(result.get('graph_id')) if status_code == 200 else None
+        graph = (graph['edges'], graph['nodes'], graph['collapsed']) if graph else None
+        conn.send(('done', result, status_code, graph))
+    except Exception as e:
+        conn.send(('done', {'error': str(e)}, 500, None))
+    finally:
+        conn.close()
+
+
+class LineageJob:
+    def __init__(self, data: Dict):
+        self.id = uuid.uuid4().hex
+        self.data = data
+        self.status = QUEUED
+        self.progress = {'done': 0, 'total': None}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class LineageJobManager:
+    """
+    有界的后台血缘分析任务池。每个任务在独立子进程中运行 analyze_sql_lineage，
+    超时或取消时直接终止子进程，卡死的 sqlfluff 解析不会占住服务进程。
+    子进程与服务进程共享语句缓存的内容（启动时带上已缓存的记录，解析结果发回服务进程），结果中的血缘图登记到服务进程的 graph_store。
+    排队上限按仍处于排队状态的任务计数，取消排队中的任务会立即释放名额。
+    """
+
+    def __init__(
+            self,
+            workers: int = JOB_WORKERS,
+            queue_limit: int = JOB_QUEUE_LIMIT,
+            job_timeout: float = JOB_TIMEOUT,
+            statement_timeout: float = STATEMENT_TIMEOUT,
+            result_ttl: float = JOB_RESULT_TTL
+    ):
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.statement_timeout = statement_timeout
+        self.result_ttl = result_ttl
+        self.queue_limit = queue_limit
+        self._queue: 'queue.Queue[LineageJob]' = queue.Queue()
+        self._queued = 0  # 处于排队状态的任务数；已取消的任务仍留在 _queue 中，由工作线程取出后丢弃
+        self._jobs: Dict[str, LineageJob] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_started(self) -> None:
+        # 工作线程在首次提交任务时才启动，导入本模块没有副作用
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(max(1, self.workers)):
+                thread = threading.Thread(target=self._worker_loop, name=f'lineage-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and now - job.finished_at > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def submit(self, data: Dict) -> LineageJob:
+        """提交任务；排队数达到上限时抛出 JobQueueFull"""
+        self._purge_expired()
+        self._ensure_started()
+        job = LineageJob(data)
+        with self._lock:
+            if self._queued >= self.queue_limit:
+                raise JobQueueFull(f'Job queue is full ({self.queue_limit} pending jobs)')
+            self._queued += 1
+            self._jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[LineageJob]:
+        self._purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[LineageJob]:
+        """取消排队中或运行中的任务；已结束的任务保持原状态"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            if job.status == QUEUED:
+                self._queued -= 1
+                self._finish(job, CANCELLED, error='Job cancelled')
+            elif job.status == RUNNING:
+                job.cancel_event.set()
+        return job
+
+    def _finish(self, job: LineageJob, status: str, result: Optional[Dict] = None,
+                error: Optional[str] = None) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        job.data = None  # 结束后不再持有原始 SQL
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.status != QUEUED:
+                        continue  # 排队期间已被取消
+                    self._queued -= 1
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                self._run(job)
+            except Exception as e:
+                with self._lock:
+                    self._finish(job, FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: LineageJob) -> None:
+        parent_conn, child_conn = _mp_context.Pipe(duplex=False)
+        process = _mp_context.Process(
+            target=_run_job_process,
+            args=(job.data, self.statement_timeout, _cached_entries(job.data), child_conn),
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        deadline = job.started_at + self.job_timeout
+        try:
+            while True:
+                if job.cancel_event.is_set():
+                    with self._lock:
+                        self._finish(job, CANCELLED, error='Job cancelled')
+                    return
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    with self._lock:
+                        self._finish(job, TIMEOUT, error=f'Job exceeded {self.job_timeout}s timeout')
+                    return
+                if not parent_conn.poll(min(POLL_INTERVAL, remaining)):
+                    continue
+                try:
+                    message = parent_conn.recv()
+                except EOFError:
+                    with self._lock:
+                        self._finish(job, FAILED, error='Worker process exited unexpectedly')
+                    return
+                if message[0] == 'progress':
+                    job.progress = {'done': message[1], 'total': message[2]}
+                elif message[0] == 'entry':
+                    statement_cache.put(message[1], message[2])
+                elif message[0] == 'timeout':
+                    with self._lock:
+                        self._finish(job, TIMEOUT, error=message[1])
+                    return
+                elif message[0] == 'done':
+                    result, status_code, graph = message[1], message[2], message[3]
+                    if graph is not None:
+                        # 子进程里登记的血缘图不在本进程，这里按原 graph_id 转登记
+                        graph_store.add(result['graph_id'], *graph)
+                    with self._lock:
+                        if status_code == 200:
+                            self._finish(job, SUCCEEDED, result=result)
+                        else:
+                            self._finish(job, FAILED, error=result.get('error', 'Analysis failed'))
+                    return
+        finally:
+            parent_conn.close()
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+
+    def stats(self) -> Dict[str, int]:
+        self._purge_expired()
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            queued = self._queued
+        return {'queued': queued, 'workers': self.workers, 'jobs': counts}
+
+
+# 进程级共享任务池
+job_manager = LineageJobManager()
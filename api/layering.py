@@ -0,0 +1,169 @@
+import collections
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def build_table_adjacency(
+        tables: Set[str],
+        table_edges: Iterable[Tuple[str, str]]
+) -> Dict[str, Set[str]]:
+    """
+    一次性构建表级邻接表（去重、去掉自环，只保留 tables 内部的边）。
+    """
+    adj: Dict[str, Set[str]] = {t: set() for t in tables}
+    for from_t, to_t in table_edges:
+        if from_t != to_t and from_t in adj and to_t in adj:
+            adj[from_t].add(to_t)
+    return adj
+
+
+def find_strongly_connected_components(adj: Dict[str, Set[str]]) -> List[List[str]]:
+    """
+    迭代版 Tarjan 算法求强连通分量，避免深链路触发 Python 递归上限。
+    返回的分量按逆拓扑序排列（下游分量在前）。
+    """
+    index_of: Dict[str, int] = {}
+    low: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    components: List[List[str]] = []
+    counter = 0
+
+    for root in adj:
+        if root in index_of:
+            continue
+        index_of[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adj[root]))]
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index_of:
+                    index_of[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(adj[child])))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index_of[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(sorted(component))
+    return components
+
+
+def find_feedback_edges(adj: Dict[str, Set[str]]) -> Set[Tuple[str, str]]:
+    """
+    迭代 DFS 求反馈边：指向当前 DFS 路径上节点的回边。去掉这些边后图中没有环。
+    DFS 先从没有上游的表出发，再按表名处理剩余的表，邻居按表名排序，结果是确定的；
+    环从其外部上游进入的表开始展开，回边即数据流回到入口表的那条边。
+    """
+    in_degree: Dict[str, int] = {t: 0 for t in adj}
+    for nexts in adj.values():
+        for n in nexts:
+            in_degree[n] += 1
+    roots = sorted(t for t in adj if in_degree[t] == 0) + sorted(t for t in adj if in_degree[t] > 0)
+
+    visited: Set[str] = set()
+    on_path: Set[str] = set()
+    feedback: Set[Tuple[str, str]] = set()
+    for root in roots:
+        if root in visited:
+            continue
+        visited.add(root)
+        on_path.add(root)
+        work = [(root, iter(sorted(adj[root])))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child in on_path:
+                    feedback.add((node, child))
+                elif child not in visited:
+                    visited.add(child)
+                    on_path.add(child)
+                    work.append((child, iter(sorted(adj[child]))))
+                    break
+            else:
+                work.pop()
+                on_path.discard(node)
+    return feedback
+
+
+def assign_table_layers(
+        tables: Set[str],
+        table_edges: Iterable[Tuple[str, str]],
+        source_tables: Set[str],
+        target_tables: Set[str]
+) -> Tuple[Dict[str, int], List[List[str]], List[Tuple[str, str]]]:
+    """
+    基于 Kahn 拓扑排序的最长路径分层：Origin=0，Middle 按最长上游路径自动分层，RS=最右。
+
+    环（例如 INSERT ... SELECT 回写到源表）先去掉 DFS 回边（find_feedback_edges）打破，
+    环上的表在剩余的无环图上按最长路径排成一条链，去掉的边作为回边返回，由调用方画成从右指向左的边；
+    没有任何上游的 Middle 表放在第 1 层。
+
+    Args:
+        tables (set): 要渲染的表集合
+        table_edges (iterable): 表级边 (from_table, to_table)，允许重复
+        source_tables (set): Origin 表
+        target_tables (set): RS 表
+
+    Returns:
+        tuple: (表 -> 层号 的字典, 检测到的环列表（每个环为排序后的表名列表）, 排序后的回边列表 (from_table, to_table))
+    """
+    # RS 表统一放最右，不参与 Middle 分层
+    middle_adj = build_table_adjacency(tables - target_tables, table_edges)
+    cycles = [c for c in find_strongly_connected_components(middle_adj) if len(c) > 1]
+
+    # 1. 去掉回边，得到 DAG
+    feedback_edges = find_feedback_edges(middle_adj) if cycles else set()
+    in_degree: Dict[str, int] = {t: 0 for t in middle_adj}
+    for t, nexts in middle_adj.items():
+        for n in nexts:
+            if (t, n) not in feedback_edges:
+                in_degree[n] += 1
+
+    # 2. Kahn 拓扑序上做最长路径松弛
+    table_layers: Dict[str, int] = {
+        t: 0 if t in source_tables else 1  # 没有上游的 Middle 至少放在 Origin 右侧
+        for t in middle_adj
+    }
+    queue = collections.deque(t for t in middle_adj if in_degree[t] == 0)
+    while queue:
+        t = queue.popleft()
+        for n in middle_adj[t]:
+            if (t, n) in feedback_edges:
+                continue
+            if table_layers[t] + 1 > table_layers[n]:
+                table_layers[n] = table_layers[t] + 1
+            in_degree[n] -= 1
+            if in_degree[n] == 0:
+                queue.append(n)
+    for t in source_tables & middle_adj.keys():
+        table_layers[t] = 0
+
+    # 3. 目标表 layer = Middle 最大层 + 1
+    max_middle_layer = max(
+        (l for t, l in table_layers.items() if t not in source_tables),
+        default=0
+    )
+    for t in tables:
+        if t in target_tables:
+            table_layers[t] = max_middle_layer + 1
+    return table_layers, cycles, sorted(feedback_edges)
@@ -0,0 +1,235 @@
+import itertools
+import os
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，缺失时坐标分配使用纯 Python 实现
+    np = None
+
+# --- 布局配置 (可通过环境变量覆盖) ---
+# 交叉消减的工作量预算：每轮扫描按重排时访问的节点、邻居数和统计交叉时访问的边数计算，与机器快慢无关，布局可复现；
+# 单核约每秒 100 万，默认值约对应原来 2 秒的时间预算
+LAYOUT_WORK_BUDGET = int(os.environ.get('LINEAGE_LAYOUT_WORK_BUDGET', 2_000_000))
+# 墙钟时间保护（秒，0 表示不限制）：只在工作量预算之外兜底，超时时整体回退为 sort_key 顺序堆叠，结果仍是确定的某一种布局
+LAYOUT_TIME_BUDGET = float(os.environ.get('LINEAGE_LAYOUT_TIME_BUDGET', 10.0))
+LAYOUT_MAX_SWEEPS = int(os.environ.get('LINEAGE_LAYOUT_MAX_SWEEPS', 12))  # 最多的上下扫描轮数
+LAYOUT_METHOD = os.environ.get('LINEAGE_LAYOUT_METHOD', 'barycenter')  # barycenter / median
+LAYOUT_METHODS = ('barycenter', 'median')
+
+
+class _BudgetExceeded(Exception):
+    """交叉消减超出墙钟时间保护"""
+
+
+def _count_crossings(layer_nodes: List[List[int]], down: List[List[int]], pos: List[int]) -> int:
+    """统计相邻层之间的边交叉数：边按上端位置排序后，下端位置序列的逆序对数即交叉数"""
+    total = 0
+    for upper in layer_nodes[:-1]:
+        targets = []
+        for u in sorted(upper, key=pos.__getitem__):
+            targets.extend(sorted(pos[v] for v in down[u]))
+        if len(targets) < 2:
+            continue
+        # 树状数组统计逆序对
+        size = max(targets) + 1
+        tree = [0] * (size + 1)
+        seen = 0
+        for t in targets:
+            i = t + 1
+            not_greater = 0
+            while i > 0:
+                not_greater += tree[i]
+                i -= i & -i
+            total += seen - not_greater
+            seen += 1
+            i = t + 1
+            while i <= size:
+                tree[i] += 1
+                i += i & -i
+    return total
+
+
+def _neighbor_key(neighbors: List[int], pos: List[int], method: str) -> Optional[float]:
+    if not neighbors:
+        return None
+    if method == 'median':
+        values = sorted(pos[n] for n in neighbors)
+        mid = len(values) // 2
+        return float(values[mid]) if len(values) % 2 else (values[mid - 1] + values[mid]) / 2
+    return sum(pos[n] for n in neighbors) / len(neighbors)
+
+
+def _reorder_layer(nodes: List[int], neighbors: List[List[int]], pos: List[int], method: str) -> None:
+    """按相邻层邻居的重心/中位数重排一层；没有邻居的节点保持原位置，位置相同时按原顺序，保证结果可复现"""
+    keys = {}
+    for n in nodes:
+        key = _neighbor_key(neighbors[n], pos, method)
+        keys[n] = pos[n] if key is None else key
+    nodes.sort(key=lambda n: (keys[n], pos[n]))
+    for i, n in enumerate(nodes):
+        pos[n] = i
+
+
+def _stack_positions(heights: List[float], desired: List[float], start_y: float, spacing: float) -> List[float]:
+    """
+    按顺序纵向排列一层节点：节点尽量放在期望位置，但不能与上一个节点重叠。
+    设 P 为前面节点高度加间距的前缀和，则 y = P + 前缀最大值(max(desired - P, start_y))，可整体向量化。
+    """
+    if np is not None:
+        h = np.asarray(heights, dtype=float) + spacing
+        prefix = np.concatenate(([0.0], np.cumsum(h)[:-1]))
+        offsets = np.maximum(np.asarray(desired, dtype=float) - prefix, start_y)
+        return (prefix + np.maximum.accumulate(offsets)).tolist()
+    prefix = list(itertools.accumulate((height + spacing for height in heights[:-1]), initial=0.0))
+    offsets = itertools.accumulate((max(d - p, start_y) for d, p in zip(desired, prefix)), max)
+    return [p + o for p, o in zip(prefix, offsets)]
+
+
+def compute_layered_layout(
+        layers: Dict[Hashable, int],
+        edges: Iterable[Tuple[Hashable, Hashable]],
+        heights: Dict[Hashable, float],
+        sort_key: Callable[[Hashable], object],
+        start_x: float,
+        start_y: float,
+        layer_spacing: float,
+        node_spacing: float,
+        method: str = LAYOUT_METHOD,
+        work_budget: int = LAYOUT_WORK_BUDGET,
+        max_sweeps: int = LAYOUT_MAX_SWEEPS,
+        time_budget: float = LAYOUT_TIME_BUDGET
+) -> Tuple[Dict[Hashable, Tuple[int, int]], Dict]:
+    """
+    分层布局：层内顺序用重心/中位数启发式上下交替扫描以减少边交叉，再按上游邻居的位置对齐纵坐标。
+    跨越多层的边在中间层插入虚拟节点参与排序；同层的边（环）不影响排序，反向边按正向处理。
+    下一轮扫描会超出工作量预算时停止，保留目前交叉最少的顺序；一轮都放不下（或预算为 0）时回退到
+    sort_key 顺序依次堆叠（原布局）。工作量只取决于图本身，相同输入总是得到相同布局（图 ID 也因此稳定）。
+    墙钟时间保护只在预算设置过大时兜底：超时即回退为 sort_key 顺序堆叠，不使用扫描到一半的顺序。
+
+    Args:
+        layers: 节点 -> 层号（非负）
+        edges: 节点之间的边 (from, to)
+        heights: 节点 -> 高度
+        sort_key: 初始层内顺序的排序键，也是回退时的顺序
+        start_x, start_y: 起始坐标
+        layer_spacing: 相邻层的水平间距
+        node_spacing: 同层节点的垂直间距
+        method: 'barycenter' 或 'median'
+        work_budget: 交叉消减的工作量预算（访问的节点和边数）
+        max_sweeps: 最多扫描轮数（每轮包含一次自上而下和一次自下而上）
+        time_budget: 墙钟时间保护（秒），0 表示不限制
+
+    Returns:
+        tuple: (节点 -> (left, top),
+                统计信息 {'crossings_before', 'crossings_after', 'sweeps', 'work', 'fallback', 'timed_out'})
+    """
+    if method not in LAYOUT_METHODS:
+        raise ValueError(f'Unsupported layout method: {method}')
+    deadline = time.perf_counter() + time_budget if time_budget > 0 else None
+
+    # 1. 节点编号：真实节点按 (层, sort_key) 排序，保证可复现
+    real_nodes = sorted(layers, key=lambda n: (layers[n], sort_key(n)))
+    node_ids = {n: i for i, n in enumerate(real_nodes)}
+    max_layer = max(layers.values(), default=-1)
+    layer_nodes: List[List[int]] = [[] for _ in range(max_layer + 1)]
+    node_layer: List[int] = []
+    for i, n in enumerate(real_nodes):
+        layer_nodes[layers[n]].append(i)
+        node_layer.append(layers[n])
+
+    # 2. 把边拆成相邻层之间的边，跨层的边插入虚拟节点
+    up: List[List[int]] = [[] for _ in real_nodes]
+    down: List[List[int]] = [[] for _ in real_nodes]
+    real_up: List[List[int]] = [[] for _ in real_nodes]
+    for a, b in sorted(set(edges), key=lambda e: (node_ids.get(e[0], -1), node_ids.get(e[1], -1))):
+        if a not in node_ids or b not in node_ids or layers[a] == layers[b]:
+            continue
+        u, v = node_ids[a], node_ids[b]
+        if node_layer[u] > node_layer[v]:
+            u, v = v, u
+        real_up[v].append(u)
+        prev = u
+        for layer in range(node_layer[u] + 1, node_layer[v]):
+            dummy = len(node_layer)
+            node_layer.append(layer)
+            layer_nodes[layer].append(dummy)
+            up.append([prev])
+            down.append([])
+            down[prev].append(dummy)
+            prev = dummy
+        down[prev].append(v)
+        up[v].append(prev)
+
+    pos = [0] * len(node_layer)
+    for nodes in layer_nodes:
+        for i, n in enumerate(nodes):
+            pos[n] = i
+
+    # 3. 上下交替扫描，保留交叉数最少的顺序。每轮的工作量：两个方向各重排一次所有层，再统计一次交叉
+    neighbor_count = sum(len(d) for d in down)
+    sweep_work = 2 * (len(node_layer) + 2 * neighbor_count) + neighbor_count
+    crossings_before = best_crossings = _count_crossings(layer_nodes, down, pos)
+    best_pos = list(pos)
+    sweeps = 0
+    work = 0
+    fallback = work_budget < sweep_work  # 一轮扫描都放不下时直接使用原布局
+    timed_out = False
+    stale = 0
+    while not fallback and sweeps < max_sweeps and best_crossings > 0 and stale < 2 \
+            and work + sweep_work <= work_budget:
+        try:
+            for layer in range(1, len(layer_nodes)):
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise _BudgetExceeded()
+                _reorder_layer(layer_nodes[layer], up, pos, method)
+            for layer in range(len(layer_nodes) - 2, -1, -1):
+                if deadline is not None and time.perf_counter() > deadline:
+                    raise _BudgetExceeded()
+                _reorder_layer(layer_nodes[layer], down, pos, method)
+        except _BudgetExceeded:
+            fallback = timed_out = True
+            break
+        sweeps += 1
+        work += sweep_work
+        crossings = _count_crossings(layer_nodes, down, pos)
+        if crossings < best_crossings:
+            best_crossings = crossings
+            best_pos = list(pos)
+            stale = 0
+        else:
+            stale += 1
+
+    # 4. 坐标分配：回退时按原顺序依次堆叠，否则按上游邻居的中心对齐
+    result: Dict[Hashable, Tuple[int, int]] = {}
+    tops: List[float] = [0.0] * len(real_nodes)
+    for layer, nodes in enumerate(layer_nodes):
+        ordered = sorted((n for n in nodes if n < len(real_nodes)), key=best_pos.__getitem__)
+        if not ordered:
+            continue
+        node_heights = [heights[real_nodes[n]] for n in ordered]
+        if fallback:
+            desired = [start_y] * len(ordered)
+        else:
+            desired = []
+            for n, height in zip(ordered, node_heights):
+                parents = real_up[n]
+                if parents:
+                    center = sum(tops[p] + heights[real_nodes[p]] / 2 for p in parents) / len(parents)
+                    desired.append(round(center - height / 2))  # 取整后与整数高度相加不会产生舍入重叠
+                else:
+                    desired.append(start_y)
+        for n, y in zip(ordered, _stack_positions(node_heights, desired, start_y, node_spacing)):
+            tops[n] = y
+            result[real_nodes[n]] = (int(round(start_x + layer * layer_spacing)), int(round(y)))
+
+    stats = {
+        'crossings_before': crossings_before,
+        'crossings_after': crossings_before if fallback else best_crossings,
+        'sweeps': sweeps,
+        'work': work,
+        'fallback': fallback,
+        'timed_out': timed_out
+    }
+    return result, stats
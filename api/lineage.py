@@ -1,9 +1,99 @@
 from http.server import BaseHTTPRequestHandler
+import hashlib
 import json
-import traceback
-import sys
-from main2 import get_lineage_json_from_parsed_output
-from table_lineage import get_table_lineage_json  # 新增导入
+import os
+import time
+
+# 冷启动耗时：本模块及其依赖的导入时间记为启动阶段 'import'
+_import_started = time.perf_counter()
+from main2 import (
+    build_lineage_json_from_entries,
+    iter_column_path_edges,
+)
+from table_lineage import (
+    TABLE_TIERS,
+    get_table_lineage_json,
+    build_table_lineage_json_from_entries,
+    build_table_lineage_json_from_column_result,
+)  # 新增导入
+from lineage_cache import split_statements
+from parallel_parse import clamp_max_workers, get_statement_lineages, iter_statement_lineages
+from parser_context import DEFAULT_DIALECT, validate_dialect
+from wire_format import RESPONSE_FORMATS, encode_compact
+from reachability import graph_store
+from viewport import collapse_lineage_result
+from summary import get_graph_summaries
+from metadata_catalog import CATALOG_PATH
+from metrics import count, finish_request, get_logger, record_startup, stage, start_request
+
+record_startup('import', time.perf_counter() - _import_started)
+logger = get_logger(__name__)
+
+LINEAGE_LEVELS = ('column', 'table', 'both')  # both: 一次解析同时返回列级和表级结果
+
+# --- 请求限制 (可通过环境变量覆盖，0 表示不限制) ---
+MAX_BODY_BYTES = int(os.environ.get('LINEAGE_MAX_BODY_BYTES', 16 * 1024 * 1024))  # 请求体字节数上限，由 server.py 在读取请求体前检查
+MAX_SQL_CHARS = int(os.environ.get('LINEAGE_MAX_SQL_CHARS', 4 * 1024 * 1024))  # sql_query 的字符数上限
+MAX_STATEMENTS = int(os.environ.get('LINEAGE_MAX_STATEMENTS', 5000))  # 单个请求的语句数上限
+
+def check_sql_limits(sql_query):
+    """
+    在解析前检查 SQL 的类型、大小和语句数，超限的请求直接拒绝，不占用工作进程的解析时间。
+
+    Returns:
+        tuple: 不通过时返回 (错误信息, 状态码)，通过时返回 None
+    """
+    if not isinstance(sql_query, str):
+        return {'error': 'sql_query must be a string'}, 400
+    if MAX_SQL_CHARS and len(sql_query) > MAX_SQL_CHARS:
+        return {'error': f'sql_query has {len(sql_query)} characters, limit is {MAX_SQL_CHARS}'}, 413
+    # 分号数是语句数的上界，未超过时无需真正拆分
+    if MAX_STATEMENTS and sql_query.count(';') >= MAX_STATEMENTS:
+        statement_count = len(split_statements(sql_query))
+        if statement_count > MAX_STATEMENTS:
+            return {'error': f'sql_query has {statement_count} statements, limit is {MAX_STATEMENTS}'}, 413
+    return None
+
+def get_parse_options(data):
+    """
+    从请求体中提取语句解析相关的可选参数，参数不合法时抛出 ValueError（方言不受支持时为 UnsupportedDialectError）。
+    max_workers 截断到 LINEAGE_PARSE_WORKERS，只限制本次请求占用的工作进程数，不会改变共享进程池。
+    """
+    chunk_size = data.get('chunk_size')
+    if chunk_size is not None and (isinstance(chunk_size, bool) or not isinstance(chunk_size, int) or chunk_size < 1):
+        raise ValueError(f'chunk_size must be a positive integer, got {chunk_size!r}')
+    return {
+        'dialect': validate_dialect(data.get('dialect') or DEFAULT_DIALECT),
+        'parallel': bool(data.get('parallel', False)),
+        'max_workers': clamp_max_workers(data.get('max_workers')),
+        'chunk_size': chunk_size,
+        # 配置了 LINEAGE_METADATA_CATALOG 时默认使用元数据目录，请求可用 use_metadata: false 关闭
+        'metadata_catalog': CATALOG_PATH if CATALOG_PATH and data.get('use_metadata', True) else None
+    }
+
+def persist_lineage(data, sql_query, lineage_level, entries):
+    """
+    把本次分析的逐语句血缘写入持久化存储（配置了 LINEAGE_STORE_URL 且请求未关闭 persist 时）。
+    entries 是分析时已算好的逐语句记录（与 split_statements(sql_query) 一一对应），这里不会重新解析：
+    语句数可能超过语句缓存容量，重新获取既可能重复解析，也可能在第二次解析时失败。
+    只写入列级（column/both）分析：存储按脚本整体替换边，表级记录没有列级路径，
+    写入会清空同一脚本已入库的列级边（界面上切换分析级别就会触发）。
+
+    Returns:
+        dict: 写入的脚本名和边数；未启用存储或为表级分析时返回 None
+    """
+    # lineage_store 依赖 SQLAlchemy，导入较慢；未配置存储（如 Vercel 部署）时不导入
+    if not os.environ.get('LINEAGE_STORE_URL') or not data.get('persist', True) or lineage_level == 'table':
+        return None
+    from lineage_store import get_lineage_store
+
+    store = get_lineage_store()
+    if store is None:
+        return None
+    sha256 = hashlib.sha256(sql_query.encode('utf-8')).hexdigest()
+    # 未指定脚本名时按内容哈希命名，同一段 SQL 重复提交只保留一份
+    script_name = data.get('script_name') or f'adhoc/{sha256[:16]}'
+    return store.record_script(script_name, list(enumerate(entries)), sha256)
 
 def analyze_sql_lineage(data):
     """
@@ -13,11 +103,22 @@ def analyze_sql_lineage(data):
     {
         "sql_query": "SQL查询语句",
         "filter_ctes": true/false,  # 可选，默认true，是否仅显示物理表
-        "lineage_level": "table"/"column"  # 可选，默认"column"
+        "lineage_level": "table"/"column"/"both",  # 可选，默认"column"；both 时另在 "table" 键中返回由同一次解析推导的表级结果
+        "dialect": "ansi",  # 可选，默认"ansi"，如 hive/sparksql/mysql
+        "parallel": true/false,  # 可选，默认false，是否多进程并行解析语句
+        "max_workers": 4,  # 可选，并行解析最多占用的工作进程数，不超过 LINEAGE_PARSE_WORKERS
+        "chunk_size": 8,  # 可选，每次派发给工作进程的语句数
+        "table_tier": "auto"/"full",  # 可选，默认"auto"，表级分析时简单语句使用轻量扫描
+        "format": "json"/"compact",  # 可选，默认"json"，compact 为字符串驻留的紧凑格式，见 wire_format.encode_compact
+        "use_metadata": true/false,  # 可选，默认true，配置了 LINEAGE_METADATA_CATALOG 时用目录中的表结构展开 SELECT * 和解析未加表前缀的字段
+        "collapse_fields": true/false,  # 可选，默认false，列级分析时节点只返回字段数量，字段通过 /api/lineage/graph/<graph_id>/fields 按需获取
+        "summaries": true/false,  # 可选，默认false，在 "summaries" 键中附带多级概要视图（Middle 链收缩、按 schema 分组），见 summary.py
+        "persist": true/false,  # 可选，默认true，配置了 LINEAGE_STORE_URL 时把列级（column/both）血缘写入持久化存储
+        "script_name": "etl/daily.sql"  # 可选，存储中的脚本名，同名脚本的旧血缘会被替换；默认按内容哈希命名
     }
     
     返回:
-        JSON格式的血缘关系数据
+        JSON格式的血缘关系数据，graph_id 用于 /api/lineage/query 上下游查询
     """
     try:
         if not data or 'sql_query' not in data:
@@ -27,43 +128,192 @@ def analyze_sql_lineage(data):
             
         # 获取参数
         sql_query = data['sql_query']
+        rejected = check_sql_limits(sql_query)
+        if rejected is not None:
+            return rejected
         filter_ctes = data.get('filter_ctes', True)
         lineage_level = data.get('lineage_level', 'column')  # 新增参数
+        if lineage_level not in LINEAGE_LEVELS:
+            return {'error': f'Unsupported lineage_level: {lineage_level}'}, 400
+        try:
+            parse_options = get_parse_options(data)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        table_tier = data.get('table_tier', 'auto')
+        if table_tier not in TABLE_TIERS:
+            return {'error': f'Unsupported table_tier: {table_tier}'}, 400
+        response_format = data.get('format', 'json')
+        if response_format not in RESPONSE_FORMATS:
+            return {'error': f'Unsupported format: {response_format}'}, 400
+        collapse_fields = bool(data.get('collapse_fields', False)) and lineage_level != 'table'
         
-        print(f"Processing SQL query: {sql_query}")
-        print(f"Parameters: filter_ctes={filter_ctes}, lineage_level={lineage_level}")
+        # 完整 SQL 只在 DEBUG 级别记录，大脚本逐次打印本身就很耗时
+        logger.debug("Processing SQL query: %s", sql_query)
+        logger.info("Analyzing %d chars: filter_ctes=%s, lineage_level=%s, dialect=%s, parallel=%s",
+                    len(sql_query), filter_ctes, lineage_level, parse_options['dialect'], parse_options['parallel'])
         
         # 根据分析级别调用相应的函数
         if lineage_level == 'table':
             result = get_table_lineage_json(
                 sql_query=sql_query,
-                filter_ctes=filter_ctes
-            )
-        else:  # column level
-            result = get_lineage_json_from_parsed_output(
-                sql_query=sql_query,
-                filter_ctes=filter_ctes
+                filter_ctes=filter_ctes,
+                table_tier=table_tier,
+                **parse_options
             )
+            entries = None
+        else:  # column / both
+            # 逐语句记录同时用于写入持久化存储，每条语句只解析一次；
+            # both 的表级视图由同一批记录推导，等价于 main2.get_both_lineage_json
+            statements = split_statements(sql_query)
+            count('statements', len(statements))
+            entries = get_statement_lineages(statements, **parse_options)
+            result = build_lineage_json_from_entries(entries, filter_ctes=filter_ctes, collapse_fields=collapse_fields)
+            if lineage_level == 'both':
+                result['table'] = build_table_lineage_json_from_column_result(result, entries, filter_ctes=filter_ctes)
         
-        print(f"Analysis completed successfully")
+        count('nodes', len(result['nodes']))
+        count('edges', len(result['edges']))
+        logger.info("Analysis completed: %d nodes, %d edges", len(result['nodes']), len(result['edges']))
+        # 写入持久化存储失败不影响本次分析结果
+        try:
+            with stage('store'):
+                stored = persist_lineage(data, sql_query, lineage_level, entries)
+            if stored is not None:
+                result['store'] = stored
+        except Exception as e:
+            logger.exception("Error persisting lineage")
+            result['store'] = {'error': str(e)}
+        # 登记完整的血缘图，前端可用 graph_id 查询上下游、按需展开字段或按视口分页
+        with stage('register'):
+            result['graph_id'] = graph_store.register(result, collapsed=collapse_fields)
+        # 概要视图随图缓存，之后也可通过 /api/lineage/graph/<graph_id>/summary 获取
+        if data.get('summaries', False):
+            with stage('summary'):
+                result['summaries'] = get_graph_summaries(result['graph_id'])
+        with stage('encode'):
+            if collapse_fields:
+                result = collapse_lineage_result(result)
+            if response_format == 'compact':
+                if 'table' in result:
+                    result['table'] = encode_compact(result['table'])
+                result = encode_compact(result)
         return result, 200
         
     except Exception as e:
-        print("Error in analyze_sql_lineage:", file=sys.stderr)
-        traceback.print_exc()
+        logger.exception("Error in analyze_sql_lineage")
         return {
             'error': str(e)
         }, 500
 
+def _statement_edges(entry, lineage_level):
+    """单条语句的边：列级为相邻列之间的边，表级为源表到目标表的边"""
+    if lineage_level == 'table':
+        return [
+            {"from": {"field": "", "name": source}, "to": {"field": "", "name": target}}
+            for target in entry['targets'] for source in entry['sources']
+        ]
+    edges = set()
+    for col_lineage_path in entry['column_paths']:
+        edges.update(iter_column_path_edges(col_lineage_path))
+    return [
+        {"from": {"field": from_f, "name": from_t}, "to": {"field": to_f, "name": to_t}}
+        for from_t, from_f, to_t, to_f in sorted(edges)
+    ]
+
+def stream_sql_lineage(data):
+    """
+    流式SQL血缘分析，逐条语句产出进度记录，最后产出合并、分层后的完整结果。
+    请求体格式同 analyze_sql_lineage。
+
+    产出的记录（由调用方序列化为 NDJSON，每行一条）:
+        {"type": "start", "total": 语句数}
+        {"type": "statement", "index": i, "total": 语句数, "sources": [...], "targets": [...],
+         "intermediates": [...], "edges": [...], "error": null 或 错误信息}
+        {"type": "result", "nodes": [...], "edges": [...], "failed_statements": [失败语句序号]}
+            # format 为 compact 时 result 记录使用紧凑格式；lineage_level 为 both 时另有 "table" 键
+
+        {"type": "error", "error": 错误信息}  # 合并阶段失败时
+    单条语句解析失败不会中断整个分析，该语句会被跳过并记录在 failed_statements 中。
+    """
+    sql_query = data['sql_query']
+    rejected = check_sql_limits(sql_query)
+    if rejected is not None:
+        yield {'type': 'error', 'error': rejected[0]['error']}
+        return
+    filter_ctes = data.get('filter_ctes', True)
+    lineage_level = data.get('lineage_level', 'column')
+    if lineage_level not in LINEAGE_LEVELS:
+        yield {'type': 'error', 'error': f'Unsupported lineage_level: {lineage_level}'}
+        return
+    try:
+        parse_options = get_parse_options(data)
+    except ValueError as e:
+        yield {'type': 'error', 'error': str(e)}
+        return
+    response_format = data.get('format', 'json')
+    if response_format not in RESPONSE_FORMATS:
+        yield {'type': 'error', 'error': f'Unsupported format: {response_format}'}
+        return
+    with_columns = lineage_level != 'table'
+
+    statements = split_statements(sql_query)
+    count('statements', len(statements))
+    yield {'type': 'start', 'total': len(statements)}
+
+    entries = []
+    failed_statements = []
+    for index, entry, error in iter_statement_lineages(
+            statements,
+            dialect=parse_options['dialect'],
+            with_columns=with_columns,
+            parallel=parse_options['parallel'],
+            max_workers=parse_options['max_workers'],
+            metadata_catalog=parse_options['metadata_catalog']
+    ):
+        if error is not None:
+            failed_statements.append(index)
+            yield {
+                'type': 'statement', 'index': index, 'total': len(statements),
+                'sources': [], 'targets': [], 'intermediates': [], 'edges': [],
+                'error': str(error)
+            }
+            continue
+        entries.append(entry)
+        yield {
+            'type': 'statement', 'index': index, 'total': len(statements),
+            'sources': list(entry['sources']),
+            'targets': list(entry['targets']),
+            'intermediates': list(entry['intermediates']),
+            'edges': _statement_edges(entry, lineage_level),
+            'error': None
+        }
+
+    try:
+        if lineage_level == 'table':
+            result = build_table_lineage_json_from_entries(entries, filter_ctes=filter_ctes)
+        else:
+            result = build_lineage_json_from_entries(entries, filter_ctes=filter_ctes)
+            if lineage_level == 'both':
+                result['table'] = build_table_lineage_json_from_column_result(result, entries, filter_ctes=filter_ctes)
+        result['graph_id'] = graph_store.register(result)
+        if response_format == 'compact':
+            if 'table' in result:
+                result['table'] = encode_compact(result['table'])
+            result = encode_compact(result)
+    except Exception as e:
+        logger.exception("Error in stream_sql_lineage")
+        yield {'type': 'error', 'error': str(e)}
+        return
+    yield {'type': 'result', 'failed_statements': failed_statements, **result}
+
 def handler(request):
     """
     Vercel Serverless Function handler
     """
-    print("Request received:", request.method)  # 添加请求方法日志
+    logger.debug("Request received: %s", request.method)
     
     # 处理 OPTIONS 请求
     if request.method == 'OPTIONS':
-        print("Handling OPTIONS request")  # 添加 OPTIONS 请求日志
         headers = {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
@@ -73,15 +323,11 @@ def handler(request):
 
     # 处理 POST 请求
     if request.method == 'POST':
+        request_metrics = start_request()
         try:
-            print("Handling POST request")  # 添加 POST 请求日志
             # 获取请求体
             body = json.loads(request.body)
-            print("Request body:", body)  # 添加请求体日志
-            
-            # 分析 SQL
-            result, status_code = analyze_sql_lineage(body)
-            print("Analysis result:", result)  # 添加分析结果日志
+            logger.debug("Request body: %s", body)
             
             # 设置响应头
             headers = {
@@ -90,20 +336,43 @@ def handler(request):
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Content-Type': 'application/json'
             }
-            
+
+            if getattr(request, 'path', '').rstrip('/').endswith('/stream'):
+                # 流式接口：Serverless 函数不能分块返回，所有 NDJSON 记录在分析结束后一次返回，
+                # 格式与 server.py 的 /api/lineage/stream 相同
+                rejected = check_sql_limits(body.get('sql_query', ''))
+                if rejected is not None:
+                    result, status_code = rejected
+                    response_body = json.dumps(result)
+                else:
+                    status_code = 200
+                    headers['Content-Type'] = 'application/x-ndjson'
+                    with stage('serialize'):
+                        response_body = ''.join(
+                            json.dumps(record, ensure_ascii=False) + '\n' for record in stream_sql_lineage(body)
+                        )
+            else:
+                # 分析 SQL
+                result, status_code = analyze_sql_lineage(body)
+                logger.debug("Analysis result: %s", result)
+
+                with stage('serialize'):
+                    response_body = json.dumps(result)
+            finish_request('handler', status_code)
+            headers['Server-Timing'] = request_metrics.server_timing()
+
             # 返回响应
             response = {
                 'statusCode': status_code,
                 'headers': headers,
-                'body': json.dumps(result)
+                'body': response_body
             }
-            print("Sending response:", response)  # 添加响应日志
+            logger.debug("Sending response: %s", response)
             return response
             
         except Exception as e:
-            print("Error in handler:", str(e))  # 添加错误日志
-            print("Error details:", file=sys.stderr)
-            traceback.print_exc()
+            logger.exception("Error in handler: %s", e)
+            finish_request('handler', 500)
             
             headers = {
                 'Access-Control-Allow-Origin': '*',
@@ -117,11 +386,11 @@ def handler(request):
                 'headers': headers,
                 'body': json.dumps({'error': str(e)})
             }
-            print("Sending error response:", error_response)  # 添加错误响应日志
+            logger.debug("Sending error response: %s", error_response)
             return error_response
 
     # 处理其他请求方法
-    print(f"Unsupported method: {request.method}")  # 添加不支持的方法日志
+    logger.warning("Unsupported method: %s", request.method)
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json'},
@@ -0,0 +1,216 @@
+import collections
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from parser_context import DEFAULT_DIALECT, analyze_statement
+from metadata_catalog import get_catalog, get_metadata_provider
+from metrics import count, stage
+
+# --- 缓存配置 (可通过环境变量覆盖) ---
+CACHE_MAX_ENTRIES = int(os.environ.get('LINEAGE_CACHE_MAX_ENTRIES', 4096))  # 最多缓存的语句数
+CACHE_MAX_BYTES = int(os.environ.get('LINEAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 估算内存上限
+
+# 引号内的内容（字符串字面量、带引号的标识符）不能做空白归一化；引号外的连续空白和注释作为一段分隔符
+_QUOTED_OR_SPACE_RE = re.compile(
+    r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)|(?:\s+|--[^\n]*|/\*.*?\*/)+",
+    re.DOTALL
+)
+
+
+def normalize_statement(stmt: str) -> str:
+    """
+    归一化单条 SQL 语句文本：去掉引号外的注释，把连续空白折叠为一个空格，再去掉首尾空白。
+    仅改变排版或注释的重复提交会得到相同的缓存键；注释先于换行折叠去掉，
+    行注释不会把下一行的内容吞进同一个键。
+    """
+    return _QUOTED_OR_SPACE_RE.sub(lambda m: m.group(1) or ' ', stmt).strip()
+
+
+def make_cache_key(stmt: str, dialect: str = DEFAULT_DIALECT, **options) -> str:
+    """
+    根据归一化后的语句文本、方言和解析选项生成内容寻址的缓存键。
+    """
+    parts = [normalize_statement(stmt), dialect]
+    parts.extend(f'{k}={options[k]}' for k in sorted(options))
+    return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+
+def statement_cache_keys(
+        stmt: str,
+        dialect: str = DEFAULT_DIALECT,
+        with_columns: bool = True,
+        metadata_catalog: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    返回 (本次请求的缓存键, 同一语句列级结果的缓存键)。使用元数据目录时键中带上目录版本，
+    目录更新后旧的解析结果不再命中。
+    """
+    options = {'metadata': get_catalog(metadata_catalog).cache_token()} if metadata_catalog else {}
+    full_key = make_cache_key(stmt, dialect, columns=True, **options)
+    if with_columns:
+        return full_key, full_key
+    return make_cache_key(stmt, dialect, columns=False, **options), full_key
+
+
+def _estimate_size(entry: Dict) -> int:
+    """粗略估算一条缓存记录占用的字节数（字符串长度 + 容器开销）"""
+    size = 200
+    for key in ('sources', 'targets', 'intermediates'):
+        size += sum(len(t) + 50 for t in entry[key])
+    for path in entry.get('column_paths') or ():
+        size += 60
+        for table, field in path:
+            size += len(table) + len(field) + 120
+    return size
+
+
+def extract_statement_lineage(
+        stmt: str,
+        dialect: str = DEFAULT_DIALECT,
+        with_columns: bool = True,
+        metadata_catalog: Optional[str] = None
+) -> Dict:
+    """
+    使用按方言共享的分析器解析单条语句，只提取后续计算需要的纯数据（不保留解析结果对象）。
+    metadata_catalog 为元数据目录文件路径，用于展开 SELECT * 和确定未加表前缀的字段来源，见 metadata_catalog.py。
+
+    Returns:
+        dict: {
+            'sources': 源表名元组,
+            'targets': 目标表名元组,
+            'intermediates': 中间表名元组,
+            'column_paths': 列级血缘路径元组，每条路径为 ((table, field), ...)；
+                            with_columns 为 False 时为 None
+        }
+    """
+    with stage('parse'):
+        holder = analyze_statement(stmt, dialect=dialect, metadata_provider=get_metadata_provider(metadata_catalog))
+    entry = {
+        'sources': tuple(sorted(str(t) for t in holder.source_tables)),
+        'targets': tuple(sorted(str(t) for t in holder.target_tables)),
+        'intermediates': tuple(sorted(str(t) for t in holder.intermediate_tables)),
+        'column_paths': None
+    }
+    if with_columns:
+        with stage('column_lineage'):
+            column_paths = []
+            # 与 LineageRunner.get_column_lineage 相同：按目标列、源列排序
+            column_lineage = sorted(
+                holder.get_column_lineage(True, False),
+                key=lambda x: (str(x[-1]), str(x[0]))
+            )
+            for col_lineage_path_tuple in column_lineage:
+                # 没有所属表的列既不参与字段收集也不参与连边，这里直接丢弃
+                column_paths.append(tuple(
+                    (str(col_obj.parent), str(col_obj).split('.')[-1])
+                    for col_obj in col_lineage_path_tuple
+                    if col_obj.parent is not None
+                ))
+            entry['column_paths'] = tuple(column_paths)
+    return entry
+
+
+class StatementLineageCache:
+    """
+    有界的进程内语句血缘缓存，按 LRU 顺序淘汰，同时受条目数和估算内存大小约束。
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'collections.OrderedDict[str, Tuple[Dict, int]]' = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, *keys: str) -> Optional[Dict]:
+        """按顺序查找多个候选键，返回第一个命中的记录；一次查找只计一次命中或未命中"""
+        with self._lock:
+            entry = None
+            for key in keys:
+                item = self._entries.get(key)
+                if item is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entry = item[0]
+                    break
+            else:
+                self.misses += 1
+        count('cache_hits' if entry is not None else 'cache_misses')
+        return entry
+
+    def put(self, key: str, entry: Dict) -> None:
+        size = _estimate_size(entry)
+        with self._lock:
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (entry, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# 进程级共享缓存实例
+statement_cache = StatementLineageCache()
+
+
+def get_statement_lineage(
+        stmt: str,
+        dialect: str = DEFAULT_DIALECT,
+        with_columns: bool = True,
+        metadata_catalog: Optional[str] = None
+) -> Dict:
+    """
+    带缓存的单语句血缘提取。表级请求可以直接复用已缓存的列级结果。
+    """
+    # 表级请求：已有列级结果时直接复用
+    key, full_key = statement_cache_keys(stmt, dialect, with_columns, metadata_catalog)
+    entry = statement_cache.get(key, full_key)
+
+    if entry is None:
+        entry = extract_statement_lineage(
+            stmt, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog
+        )
+        statement_cache.put(key, entry)
+    return entry
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """返回语句缓存的命中/未命中等统计信息，用于评估缓存容量"""
+    return statement_cache.stats()
+
+
+def split_statements(sql_query: str) -> List[str]:
+    """按分号拆分脚本并去掉空语句（与原有逻辑保持一致）"""
+    with stage('split'):
+        statements = sql_query.strip().split(';')
+        return [stmt.strip() for stmt in statements if stmt.strip()]
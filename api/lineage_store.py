@@ -0,0 +1,459 @@
+"""
+持久化血缘存储：把逐语句血缘写入 SQLAlchemy 支持的数据库（默认 SQLite），
+记录每条边来自哪个脚本的哪条语句；多跳上下游影响分析用递归 CTE 在数据库内完成，不把整张图加载到 Python。
+
+    LINEAGE_STORE_URL=sqlite:///lineage_store.db python server.py
+"""
+import collections
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import (
+    Column, Float, Index, Integer, MetaData, String, Table, UniqueConstraint,
+    create_engine, delete, event, func, insert, select, text, update
+)
+
+from main2 import iter_column_path_edges
+from projection import project_edges_to_visible
+from reachability import QUERY_DIRECTIONS
+
+# --- 血缘存储配置 (可通过环境变量覆盖) ---
+STORE_URL = os.environ.get('LINEAGE_STORE_URL', '')  # 为空时不启用持久化存储
+STORE_BATCH_SIZE = int(os.environ.get('LINEAGE_STORE_BATCH_SIZE', 5000))  # 每批 executemany 插入的行数
+STORE_IN_CHUNK = 500  # IN 查询每批的参数个数，低于 SQLite 的变量数上限
+IMPACT_LEVELS = ('column', 'table')
+
+metadata = MetaData()
+
+scripts_table = Table(
+    'lineage_scripts', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String, nullable=False, unique=True),
+    Column('sha256', String),
+    Column('statement_count', Integer, nullable=False, default=0),
+    Column('updated_at', Float, nullable=False)
+)
+
+tables_table = Table(
+    'lineage_tables', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('name', String, nullable=False, unique=True)
+)
+
+columns_table = Table(
+    'lineage_columns', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('table_id', Integer, nullable=False),
+    Column('name', String, nullable=False),
+    UniqueConstraint('table_id', 'name')
+)
+
+# 列级边：两个方向各有一个索引，上游和下游递归查询都走索引
+column_edges_table = Table(
+    'lineage_column_edges', metadata,
+    Column('from_column_id', Integer, nullable=False),
+    Column('to_column_id', Integer, nullable=False),
+    Column('script_id', Integer, nullable=False),
+    Column('statement_index', Integer, nullable=False),
+    Index('ix_column_edges_from', 'from_column_id', 'to_column_id'),
+    Index('ix_column_edges_to', 'to_column_id', 'from_column_id'),
+    Index('ix_column_edges_script', 'script_id')
+)
+
+# 表级边：每条语句的源表 -> 目标表，表级分析的脚本没有列级边也能做影响分析
+table_edges_table = Table(
+    'lineage_table_edges', metadata,
+    Column('from_table_id', Integer, nullable=False),
+    Column('to_table_id', Integer, nullable=False),
+    Column('script_id', Integer, nullable=False),
+    Column('statement_index', Integer, nullable=False),
+    Index('ix_table_edges_from', 'from_table_id', 'to_table_id'),
+    Index('ix_table_edges_to', 'to_table_id', 'from_table_id'),
+    Index('ix_table_edges_script', 'script_id')
+)
+
+# 递归查询的边表和端点列：(边表, 已到达一端的列, 下一跳一端的列)
+_WALKS = {
+    ('column', 'downstream'): ('lineage_column_edges', 'from_column_id', 'to_column_id'),
+    ('column', 'upstream'): ('lineage_column_edges', 'to_column_id', 'from_column_id'),
+    ('table', 'downstream'): ('lineage_table_edges', 'from_table_id', 'to_table_id'),
+    ('table', 'upstream'): ('lineage_table_edges', 'to_table_id', 'from_table_id'),
+}
+
+
+def _chunks(items: Sequence, size: int) -> Iterable[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def statement_edges(entry: Dict) -> Tuple[Set[Tuple[str, str]], Set[Tuple[str, str, str, str]]]:
+    """
+    单条语句入库的边。CTE 等不含 '.' 的表只在本语句内有意义（不同脚本的同名 CTE 不是同一张表），
+    列级边先在语句内投影到物理表上再入库，避免跨脚本误连。
+
+    Returns:
+        tuple: (表级边 {(source, target)}, 列级边 {(from_table, from_field, to_table, to_field)})
+    """
+    table_edges = {(s, t) for t in entry['targets'] for s in entry['sources'] if s != t}
+    if not entry.get('column_paths'):
+        return table_edges, set()
+    raw_edges = set()
+    for path in entry['column_paths']:
+        raw_edges.update(iter_column_path_edges(path))
+    adj_map: Dict[Tuple[str, str], List[Tuple[str, str]]] = collections.defaultdict(list)
+    rev_adj: Dict[Tuple[str, str], List[Tuple[str, str]]] = collections.defaultdict(list)
+    tables = set()
+    for from_t, from_f, to_t, to_f in raw_edges:
+        adj_map[(from_t, from_f)].append((to_t, to_f))
+        rev_adj[(to_t, to_f)].append((from_t, from_f))
+        tables.update((from_t, to_t))
+    visible = {t for t in tables if '.' in t}
+    column_edges = {
+        e for e in project_edges_to_visible(sorted(raw_edges), visible, adj_map, rev_adj)
+        if e[0] != e[2] or e[1] != e[3]
+    }
+    return table_edges, column_edges
+
+
+class LineageStore:
+    """
+    基于 SQLAlchemy Core 的血缘存储。表名和字段驻留为整数 ID（进程内缓存名称到 ID 的映射，
+    表和字段只增不删，缓存不会失效）；重新写入同名脚本时先删除该脚本原有的边。
+    """
+
+    def __init__(self, url: str, batch_size: int = STORE_BATCH_SIZE):
+        self.url = url
+        self.batch_size = batch_size
+        self.engine = create_engine(url)
+        if self.engine.dialect.name == 'sqlite':
+            event.listen(self.engine, 'connect', self._configure_sqlite)
+        metadata.create_all(self.engine)
+        self._table_ids: Dict[str, int] = {}
+        self._column_ids: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection, connection_record) -> None:
+        # WAL 模式下写入不阻塞读取，批量写入时 synchronous=NORMAL 已足够安全
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    def _insert_ignore(self, table: Table):
+        # 并发写入时其他进程可能已插入同名记录，冲突时跳过，随后重新查询 ID
+        return insert(table).prefix_with('OR IGNORE', dialect='sqlite')
+
+    def _ensure_table_ids(self, conn, names: Iterable[str]) -> Dict[str, int]:
+        missing = sorted(set(n for n in names if n not in self._table_ids))
+        for chunk in _chunks(missing, STORE_IN_CHUNK):
+            found = dict(conn.execute(
+                select(tables_table.c.name, tables_table.c.id).where(tables_table.c.name.in_(chunk))
+            ).all())
+            new = [{'name': n} for n in chunk if n not in found]
+            if new:
+                conn.execute(self._insert_ignore(tables_table), new)
+                found = dict(conn.execute(
+                    select(tables_table.c.name, tables_table.c.id).where(tables_table.c.name.in_(chunk))
+                ).all())
+            self._table_ids.update(found)
+        return self._table_ids
+
+    def _ensure_column_ids(self, conn, columns: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+        missing = sorted(set(c for c in columns if c not in self._column_ids))
+        by_table: Dict[int, Set[str]] = collections.defaultdict(set)
+        for table_id, name in missing:
+            by_table[table_id].add(name)
+
+        def load(table_ids):
+            rows = conn.execute(
+                select(columns_table.c.table_id, columns_table.c.name, columns_table.c.id)
+                .where(columns_table.c.table_id.in_(table_ids))
+            ).all()
+            return {(table_id, name): column_id for table_id, name, column_id in rows}
+
+        for chunk in _chunks(sorted(by_table), STORE_IN_CHUNK):
+            found = load(chunk)
+            new = [
+                {'table_id': table_id, 'name': name}
+                for table_id in chunk for name in sorted(by_table[table_id]) if (table_id, name) not in found
+            ]
+            for batch in _chunks(new, self.batch_size):
+                conn.execute(self._insert_ignore(columns_table), list(batch))
+            if new:
+                found = load(chunk)
+            self._column_ids.update(found)
+        return self._column_ids
+
+    def _write_script(self, conn, name: str, entries: Sequence[Tuple[int, Dict]], sha256: Optional[str]) -> Dict:
+        table_edges: Dict[Tuple[str, str], int] = {}
+        column_edges: Dict[Tuple[str, str, str, str], int] = {}
+        for statement_index, entry in entries:
+            t_edges, c_edges = statement_edges(entry)
+            for edge in t_edges:
+                table_edges.setdefault(edge, statement_index)
+            for edge in c_edges:
+                column_edges.setdefault(edge, statement_index)
+
+        table_ids = self._ensure_table_ids(
+            conn, {t for edge in table_edges for t in edge} | {e[i] for e in column_edges for i in (0, 2)}
+        )
+        column_ids = self._ensure_column_ids(
+            conn, {(table_ids[e[i]], e[i + 1]) for e in column_edges for i in (0, 2)}
+        )
+
+        statement_count = max((i for i, _ in entries), default=-1) + 1
+        script_id = conn.execute(select(scripts_table.c.id).where(scripts_table.c.name == name)).scalar()
+        if script_id is None:
+            script_id = conn.execute(insert(scripts_table).values(
+                name=name, sha256=sha256, statement_count=statement_count, updated_at=time.time()
+            )).inserted_primary_key[0]
+        else:
+            conn.execute(delete(column_edges_table).where(column_edges_table.c.script_id == script_id))
+            conn.execute(delete(table_edges_table).where(table_edges_table.c.script_id == script_id))
+            conn.execute(update(scripts_table).where(scripts_table.c.id == script_id).values(
+                sha256=sha256, statement_count=statement_count, updated_at=time.time()
+            ))
+
+        table_rows = [
+            {'from_table_id': table_ids[s], 'to_table_id': table_ids[t],
+             'script_id': script_id, 'statement_index': i}
+            for (s, t), i in sorted(table_edges.items())
+        ]
+        column_rows = [
+            {'from_column_id': column_ids[(table_ids[from_t], from_f)],
+             'to_column_id': column_ids[(table_ids[to_t], to_f)],
+             'script_id': script_id, 'statement_index': i}
+            for (from_t, from_f, to_t, to_f), i in sorted(column_edges.items())
+        ]
+        for batch in _chunks(table_rows, self.batch_size):
+            conn.execute(insert(table_edges_table), list(batch))
+        for batch in _chunks(column_rows, self.batch_size):
+            conn.execute(insert(column_edges_table), list(batch))
+        return {'script': name, 'table_edges': len(table_rows), 'column_edges': len(column_rows)}
+
+    def record_scripts(self, scripts: Iterable[Tuple[str, Sequence[Tuple[int, Dict]], Optional[str]]]) -> List[Dict]:
+        """
+        在一个事务中写入多个脚本的血缘，替换同名脚本原有的边。
+
+        Args:
+            scripts: (脚本名, [(语句序号, 血缘记录)], 内容哈希) 序列，血缘记录格式同 extract_statement_lineage
+
+        Returns:
+            list: 每个脚本写入的表级/列级边数
+        """
+        with self._lock:
+            try:
+                with self.engine.begin() as conn:
+                    return [self._write_script(conn, name, entries, sha256) for name, entries, sha256 in scripts]
+            except Exception:
+                # 事务回滚后本次新分配的 ID 已失效，清空缓存下次重新查询
+                self._table_ids.clear()
+                self._column_ids.clear()
+                raise
+
+    def record_script(self, name: str, entries: Sequence[Tuple[int, Dict]], sha256: Optional[str] = None) -> Dict:
+        return self.record_scripts([(name, entries, sha256)])[0]
+
+    def delete_scripts(self, names: Iterable[str]) -> int:
+        """删除脚本及其边（表和字段保留），返回删除的脚本数"""
+        names = list(names)
+        deleted = 0
+        with self._lock, self.engine.begin() as conn:
+            for chunk in _chunks(names, STORE_IN_CHUNK):
+                ids = conn.execute(select(scripts_table.c.id).where(scripts_table.c.name.in_(chunk))).scalars().all()
+                if not ids:
+                    continue
+                conn.execute(delete(column_edges_table).where(column_edges_table.c.script_id.in_(ids)))
+                conn.execute(delete(table_edges_table).where(table_edges_table.c.script_id.in_(ids)))
+                conn.execute(delete(scripts_table).where(scripts_table.c.id.in_(ids)))
+                deleted += len(ids)
+        return deleted
+
+    def script_hashes(self) -> Dict[str, Optional[str]]:
+        """已入库脚本的内容哈希，用于增量采集时判断是否需要重新写入"""
+        with self.engine.connect() as conn:
+            return dict(conn.execute(select(scripts_table.c.name, scripts_table.c.sha256)).all())
+
+    def stats(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            return {
+                name: conn.execute(select(func.count()).select_from(table)).scalar()
+                for name, table in (
+                    ('scripts', scripts_table), ('tables', tables_table), ('columns', columns_table),
+                    ('table_edges', table_edges_table), ('column_edges', column_edges_table)
+                )
+            }
+
+    def _walk(self, conn, level: str, direction: str, start_sql: str, params: Dict,
+              max_depth: Optional[int], include_edges: bool) -> Tuple[Dict[int, Optional[int]], List[Tuple]]:
+        """
+        在数据库内用递归 CTE 求闭包。不限深度时按节点去重（UNION），遇到环也会终止；
+        限深度时带上跳数，最后按节点取最小跳数。
+
+        Returns:
+            tuple: (节点 ID -> 最小跳数（不限深度时为 None）, 闭包内的边 [(from_id, to_id, 脚本名, 语句序号)])
+        """
+        edge_table, near, far = _WALKS[(level, direction)]
+        if max_depth is None:
+            walk = (
+                f"WITH RECURSIVE walk(node_id) AS ("
+                f" {start_sql}"
+                f" UNION SELECT e.{far} FROM {edge_table} e JOIN walk w ON e.{near} = w.node_id"
+                f"), reached AS (SELECT node_id, NULL AS depth FROM walk)"
+            )
+        else:
+            walk = (
+                f"WITH RECURSIVE walk(node_id, depth) AS ("
+                f" SELECT node_id, 0 FROM ({start_sql}) starts"
+                f" UNION SELECT e.{far}, w.depth + 1 FROM {edge_table} e JOIN walk w ON e.{near} = w.node_id"
+                f" WHERE w.depth < :max_depth"
+                f"), reached AS (SELECT node_id, MIN(depth) AS depth FROM walk GROUP BY node_id)"
+            )
+            params = dict(params, max_depth=max_depth)
+        nodes = dict(conn.execute(text(f"{walk} SELECT node_id, depth FROM reached"), params).all())
+        edges = []
+        if include_edges:
+            edges = conn.execute(text(
+                f"{walk} SELECT e.{near}, e.{far}, s.name, e.statement_index FROM {edge_table} e"
+                f" JOIN reached a ON e.{near} = a.node_id JOIN reached b ON e.{far} = b.node_id"
+                f" JOIN lineage_scripts s ON s.id = e.script_id"
+            ), params).all()
+        return nodes, edges
+
+    def impact(self, table: str, field: Optional[str] = None, direction: str = 'downstream',
+               max_depth: Optional[int] = None, level: str = 'column', include_edges: bool = True) -> Optional[Dict]:
+        """
+        多跳上下游影响分析。列级从表的全部字段（或指定字段）出发沿列级边递归，表级沿表级边递归。
+        同一条边来自多个脚本或语句时逐条返回来源。
+
+        Returns:
+            dict: {'tables', 'columns', 'edges'}；起点表或字段不存在时返回 None
+        """
+        directions = ('upstream', 'downstream') if direction == 'both' else (direction,)
+        with self.engine.connect() as conn:
+            table_id = conn.execute(select(tables_table.c.id).where(tables_table.c.name == table)).scalar()
+            if table_id is None:
+                return None
+            if level == 'table':
+                start_sql, params = 'SELECT :table_id AS node_id', {'table_id': table_id}
+            else:
+                start_sql = 'SELECT id AS node_id FROM lineage_columns WHERE table_id = :table_id'
+                params = {'table_id': table_id}
+                if field is not None:
+                    start_sql += ' AND name = :field'
+                    params['field'] = field
+                if conn.execute(text(start_sql + ' LIMIT 1'), params).first() is None:
+                    return None
+
+            depths: Dict[int, Optional[int]] = {}
+            edge_rows: Set[Tuple] = set()
+            for d in directions:
+                nodes, edges = self._walk(conn, level, d, start_sql, params, max_depth, include_edges)
+                for node_id, depth in nodes.items():
+                    if node_id not in depths or (depth is not None and depth < depths[node_id]):
+                        depths[node_id] = depth
+                # 上游方向的边按 (near=to, far=from) 取出，统一转为 from -> to
+                edge_rows.update(edges if d == 'downstream' else
+                                 ((b, a, script, index) for a, b, script, index in edges))
+
+            names = self._node_names(conn, level, set(depths) | {i for e in edge_rows for i in e[:2]})
+
+        if level == 'table':
+            return {
+                'tables': [{'name': names[n], 'depth': depths[n]} for n in sorted(depths, key=names.get)],
+                'columns': [],
+                'edges': sorted(
+                    ({'from': {'field': '', 'name': names[a]}, 'to': {'field': '', 'name': names[b]},
+                      'script': script, 'statement_index': index} for a, b, script, index in edge_rows),
+                    key=lambda e: (e['from']['name'], e['to']['name'], e['script'], e['statement_index'])
+                )
+            }
+        columns = sorted(depths, key=names.get)
+        return {
+            'tables': sorted({names[n][0] for n in columns}),
+            'columns': [{'name': names[n][0], 'field': names[n][1], 'depth': depths[n]} for n in columns],
+            'edges': sorted(
+                ({'from': {'field': names[a][1], 'name': names[a][0]},
+                  'to': {'field': names[b][1], 'name': names[b][0]},
+                  'script': script, 'statement_index': index} for a, b, script, index in edge_rows),
+                key=lambda e: (e['from']['name'], e['from']['field'], e['to']['name'], e['to']['field'],
+                               e['script'], e['statement_index'])
+            )
+        }
+
+    def _node_names(self, conn, level: str, node_ids: Set[int]) -> Dict[int, object]:
+        names = {}
+        for chunk in _chunks(sorted(node_ids), STORE_IN_CHUNK):
+            if level == 'table':
+                rows = conn.execute(
+                    select(tables_table.c.id, tables_table.c.name).where(tables_table.c.id.in_(chunk))
+                ).all()
+                names.update(rows)
+            else:
+                rows = conn.execute(
+                    select(columns_table.c.id, tables_table.c.name, columns_table.c.name)
+                    .join(tables_table, tables_table.c.id == columns_table.c.table_id)
+                    .where(columns_table.c.id.in_(chunk))
+                ).all()
+                names.update((column_id, (table, field)) for column_id, table, field in rows)
+        return names
+
+
+_store: Optional[LineageStore] = None
+_store_lock = threading.Lock()
+
+
+def get_lineage_store(url: Optional[str] = None) -> Optional[LineageStore]:
+    """返回进程级共享的血缘存储；未配置 LINEAGE_STORE_URL（且未传入 url）时返回 None"""
+    global _store
+    url = url or STORE_URL
+    if not url:
+        return None
+    with _store_lock:
+        if _store is None or _store.url != url:
+            _store = LineageStore(url)
+        return _store
+
+
+def query_impact(data: Dict) -> Tuple[Dict, int]:
+    """
+    持久化存储上的影响分析接口。
+
+    请求体JSON格式:
+    {
+        "table": "库.表",
+        "field": "字段名",  # 可选，不传时从整张表的所有字段出发
+        "direction": "upstream"/"downstream"/"both",  # 可选，默认"downstream"
+        "depth": 3,  # 可选，最大跳数，默认不限
+        "level": "column"/"table",  # 可选，默认"column"
+        "include_edges": true/false  # 可选，默认true，边带有来源脚本名和语句序号
+    }
+    """
+    store = get_lineage_store()
+    if store is None:
+        return {'error': 'Lineage store is not configured, set LINEAGE_STORE_URL'}, 503
+    if not data or not data.get('table'):
+        return {'error': 'Missing required parameter: table'}, 400
+    direction = data.get('direction', 'downstream')
+    if direction not in QUERY_DIRECTIONS:
+        return {'error': f'Unsupported direction: {direction}'}, 400
+    level = data.get('level', 'column')
+    if level not in IMPACT_LEVELS:
+        return {'error': f'Unsupported level: {level}'}, 400
+    depth = data.get('depth')
+    if depth is not None and (not isinstance(depth, int) or depth < 0):
+        return {'error': 'depth must be a non-negative integer'}, 400
+
+    start = time.perf_counter()
+    result = store.impact(
+        data['table'], data.get('field'), direction=direction, max_depth=depth,
+        level=level, include_edges=bool(data.get('include_edges', True))
+    )
+    if result is None:
+        return {'error': 'Table or field not found in lineage store'}, 404
+    result.update({'direction': direction, 'depth': depth, 'level': level,
+                   'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)})
+    return result, 200
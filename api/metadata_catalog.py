@@ -0,0 +1,202 @@
+"""
+本地表结构目录，作为 sqllineage 的 MetaDataProvider 使用，用于展开 SELECT * 和确定 JOIN 中未加表前缀的字段来源。
+
+目录文件支持两种格式：
+    JSON：{"库.表": ["字段1", "字段2"]}，或按库嵌套 {"库": {"表": ["字段1", "字段2"]}}；
+          未指定库的表可直接写表名
+    SQLite（扩展名 .db/.sqlite/.sqlite3）：
+          columns(table_schema, table_name, column_name, ordinal_position)，库名和表名存小写，未指定库时 table_schema 为空串
+
+查询结果经进程内 LRU 缓存；目录文件修改后（按 mtime 和大小判断）自动重新加载，无需重启服务。
+"""
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqllineage.core.metadata_provider import MetaDataProvider
+from sqllineage.core.models import Schema
+
+from metrics import get_logger
+
+logger = get_logger(__name__)
+
+# --- 元数据目录配置 (可通过环境变量覆盖) ---
+CATALOG_PATH = os.environ.get('LINEAGE_METADATA_CATALOG', '')  # 默认使用的目录文件，为空时不使用元数据
+CATALOG_LRU_SIZE = int(os.environ.get('LINEAGE_METADATA_LRU_SIZE', 4096))  # 缓存的表结构数
+CATALOG_RELOAD_INTERVAL = float(os.environ.get('LINEAGE_METADATA_RELOAD_INTERVAL', 2.0))  # 检查文件变更的最小间隔（秒）
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+
+def _table_key(schema: str, table: str) -> str:
+    return f'{schema}.{table}'.lower() if schema else table.lower()
+
+
+class MetadataCatalog:
+    """
+    一个目录文件对应一个共享实例：持有已加载的表结构（JSON）或只读连接（SQLite），以及表结构的 LRU 缓存。
+    文件被修改后在下一次查询时重新加载并清空缓存；加载失败时继续使用上一个版本。
+    """
+
+    def __init__(self, path: str, lru_size: int = CATALOG_LRU_SIZE):
+        self.path = os.path.abspath(path)
+        self.lru_size = lru_size
+        self.is_sqlite = self.path.lower().endswith(SQLITE_SUFFIXES)
+        self.version: Optional[Tuple[int, int]] = None  # (mtime_ns, size)
+        self.table_count = 0
+        self.reloads = 0
+        self.hits = 0
+        self.misses = 0
+        self._tables: Dict[str, Tuple[str, ...]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lru: 'collections.OrderedDict[str, Tuple[str, ...]]' = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._maybe_reload(force=True)
+
+    def _load_json(self) -> Dict[str, Tuple[str, ...]]:
+        with open(self.path, encoding='utf-8') as f:
+            raw = json.load(f)
+        tables = {}
+        for key, value in raw.items():
+            if isinstance(value, dict):
+                for table, columns in value.items():
+                    tables[_table_key(key, table)] = tuple(columns)
+            else:
+                tables[key.lower()] = tuple(value)
+        return tables
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        """按间隔检查文件是否变更，变更时重新加载；调用方不需要持有锁"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < CATALOG_RELOAD_INTERVAL:
+            return
+        with self._lock:
+            if not force and now - self._checked_at < CATALOG_RELOAD_INTERVAL:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                version = (stat.st_mtime_ns, stat.st_size)
+                if version == self.version:
+                    return
+                if self.is_sqlite:
+                    conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+                    table_count = conn.execute(
+                        'SELECT COUNT(*) FROM (SELECT DISTINCT table_schema, table_name FROM columns)'
+                    ).fetchone()[0]
+                    if self._conn is not None:
+                        self._conn.close()
+                    self._conn = conn
+                    self.table_count = table_count
+                else:
+                    self._tables = self._load_json()
+                    self.table_count = len(self._tables)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                logger.warning("Failed to load metadata catalog %s, keep previous version: %s", self.path, e)
+                return
+            self.version = version
+            self.reloads += 1
+            self._lru.clear()
+
+    def _lookup(self, key: str, schema: str, table: str) -> Tuple[str, ...]:
+        if not self.is_sqlite:
+            return self._tables.get(key, ())
+        if self._conn is None:
+            return ()
+        rows = self._conn.execute(
+            'SELECT column_name FROM columns WHERE table_schema = ? AND table_name = ? ORDER BY ordinal_position',
+            (schema.lower(), table.lower())
+        ).fetchall()
+        return tuple(row[0] for row in rows)
+
+    def get_columns(self, schema: str, table: str) -> Tuple[str, ...]:
+        """返回表的字段列表，未登记的表返回空元组。schema 为 sqllineage 的 <default> 时按未指定库处理"""
+        self._maybe_reload()
+        if schema == Schema.unknown:
+            schema = ''
+        key = _table_key(schema, table)
+        with self._lock:
+            columns = self._lru.get(key)
+            if columns is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return columns
+            self.misses += 1
+            columns = self._lookup(key, schema, table)
+            self._lru[key] = columns
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+            return columns
+
+    def cache_token(self) -> str:
+        """标识目录当前版本，参与语句缓存键；目录更新后旧的解析结果不再命中"""
+        self._maybe_reload()
+        return f'{self.path}:{self.version}'
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'format': 'sqlite' if self.is_sqlite else 'json',
+                'tables': self.table_count,
+                'version': list(self.version) if self.version else None,
+                'reloads': self.reloads,
+                'lru_entries': len(self._lru),
+                'lru_size': self.lru_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def __bool__(self) -> bool:
+        return self.table_count > 0
+
+
+class CatalogMetaDataProvider(MetaDataProvider):
+    """
+    基于 MetadataCatalog 的 MetaDataProvider。会话级元数据（脚本中创建的表）保存在 provider 实例上，
+    因此每次分析创建一个新实例，只共享底层目录和缓存。
+    """
+
+    def __init__(self, catalog: MetadataCatalog):
+        super().__init__()
+        self.catalog = catalog
+
+    def _get_table_columns(self, schema: str, table: str, **kwargs) -> List[str]:
+        return list(self.catalog.get_columns(schema, table))
+
+    def __bool__(self) -> bool:
+        return bool(self.catalog)
+
+
+_catalogs: Dict[str, MetadataCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: str) -> MetadataCatalog:
+    """按路径返回进程内共享的目录实例（并行解析的工作进程各自加载一份）"""
+    key = os.path.abspath(path)
+    catalog = _catalogs.get(key)
+    if catalog is not None:
+        return catalog
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = MetadataCatalog(key)
+        return catalog
+
+
+def get_metadata_provider(path: Optional[str]) -> Optional[CatalogMetaDataProvider]:
+    """为一次分析创建 provider；未指定目录时返回 None（使用 sqllineage 默认的空元数据）"""
+    if not path:
+        return None
+    return CatalogMetaDataProvider(get_catalog(path))
+
+
+def get_catalog_stats() -> List[Dict]:
+    return [catalog.stats() for catalog in list(_catalogs.values())]
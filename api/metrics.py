@@ -0,0 +1,208 @@
+"""
+分阶段计时与计数：请求内的耗时和计数通过 Server-Timing 响应头返回，进程内累计值以 Prometheus 文本格式导出（/api/metrics）。
+
+    with stage('parse'):
+        holder = analyze_statement(stmt)
+    count('statements', len(statements))
+
+不在请求上下文中（如 ingest.py、基准脚本）时只累计进程级指标。多进程部署时每个进程各自累计。
+
+启动阶段（模块导入、方言加载等一次性开销）用 startup_phase 记录，在之后第一个响应的 Server-Timing 中
+以 cold-<阶段> 返回，并作为 lineage_startup_seconds 导出，用于跟踪冷启动耗时。
+"""
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# --- 指标与日志配置 (可通过环境变量覆盖) ---
+LOG_LEVEL = os.environ.get('LINEAGE_LOG_LEVEL', 'INFO').upper()  # DEBUG 时记录完整的 SQL、请求体和响应
+# 直方图分桶上界（秒）
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """返回按 LINEAGE_LOG_LEVEL 配置的日志器；宿主（如 gunicorn）已配置根日志器时沿用其处理器"""
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    root = logging.getLogger()
+    if not root.handlers and not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+
+class RequestMetrics:
+    """一次请求内按阶段累计的耗时（秒）和计数，按首次出现的顺序输出"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def server_timing(self) -> str:
+        parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.started_at) * 1000:.2f}')
+        parts.extend(f'{name};desc="{value}"' for name, value in self.counts.items())
+        parts.extend(f'cold-{name};dur={seconds * 1000:.2f}' for name, seconds in _take_unreported_startup())
+        return ', '.join(parts)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """进程级累计指标：阶段耗时直方图、按接口的请求数与耗时、以及各类计数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds: Dict[str, _Histogram] = {}
+        self.request_seconds: Dict[str, _Histogram] = {}
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.counts: Dict[str, int] = {}
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.stage_seconds.setdefault(name, _Histogram()).observe(seconds)
+
+    def observe_request(self, endpoint: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.request_seconds.setdefault(endpoint, _Histogram()).observe(seconds)
+            self.requests[(endpoint, status)] = self.requests.get((endpoint, status), 0) + 1
+
+    def add_count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def render_prometheus(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus 文本格式（0.0.4）；gauges 为导出时才读取的瞬时值，如语句缓存条目数"""
+        lines: List[str] = []
+
+        def histogram(metric: str, label: str, series: Dict[str, _Histogram], help_text: str) -> None:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for key in sorted(series):
+                h = series[key]
+                cumulative = 0
+                for bound, n in zip(HISTOGRAM_BUCKETS, h.buckets):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{{label}="{key}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{{label}="{key}",le="+Inf"}} {h.count}')
+                lines.append(f'{metric}_sum{{{label}="{key}"}} {h.sum:.6f}')
+                lines.append(f'{metric}_count{{{label}="{key}"}} {h.count}')
+
+        with self._lock:
+            histogram('lineage_stage_seconds', 'stage', self.stage_seconds, 'Time spent in each analysis stage')
+            histogram('lineage_request_seconds', 'endpoint', self.request_seconds, 'Request duration by endpoint')
+            lines.append('# HELP lineage_requests_total Requests by endpoint and status')
+            lines.append('# TYPE lineage_requests_total counter')
+            for (endpoint, status), n in sorted(self.requests.items()):
+                lines.append(f'lineage_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+            lines.append('# HELP lineage_items_total Statements, nodes, edges and cache lookups processed')
+            lines.append('# TYPE lineage_items_total counter')
+            for name, n in sorted(self.counts.items()):
+                lines.append(f'lineage_items_total{{kind="{name}"}} {n}')
+        with _startup_lock:
+            phases = sorted(startup_phases.items())
+        if phases:
+            lines.append('# HELP lineage_startup_seconds One-off startup cost by phase (imports, dialect loading)')
+            lines.append('# TYPE lineage_startup_seconds gauge')
+            for name, seconds in phases:
+                lines.append(f'lineage_startup_seconds{{phase="{name}"}} {seconds:.6f}')
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# 进程级共享指标
+metrics_registry = MetricsRegistry()
+# 启动阶段耗时，每个阶段只记录首次；尚未通过 Server-Timing 返回的阶段按发生顺序排队
+startup_phases: Dict[str, float] = {}
+_unreported_startup: List[Tuple[str, float]] = []
+_startup_lock = threading.Lock()
+_current: contextvars.ContextVar[Optional[RequestMetrics]] = contextvars.ContextVar('lineage_request_metrics', default=None)
+
+
+def start_request() -> RequestMetrics:
+    """开始记录一次请求；返回的对象在请求结束时用于生成 Server-Timing"""
+    request_metrics = RequestMetrics()
+    _current.set(request_metrics)
+    return request_metrics
+
+
+def finish_request(endpoint: str, status: int) -> Optional[RequestMetrics]:
+    """结束当前请求的记录并计入按接口的请求指标；没有进行中的记录时返回 None"""
+    request_metrics = _current.get()
+    if request_metrics is None:
+        return None
+    _current.set(None)
+    metrics_registry.observe_request(endpoint, status, time.perf_counter() - request_metrics.started_at)
+    return request_metrics
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """记录一个阶段的耗时；同一请求内同名阶段的耗时累加"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics_registry.observe_stage(name, seconds)
+        request_metrics = _current.get()
+        if request_metrics is not None:
+            request_metrics.stages[name] = request_metrics.stages.get(name, 0.0) + seconds
+
+
+def record_startup(name: str, seconds: float) -> None:
+    """记录一个启动阶段的耗时，同名阶段只保留首次"""
+    with _startup_lock:
+        if name not in startup_phases:
+            startup_phases[name] = seconds
+            _unreported_startup.append((name, seconds))
+
+
+@contextlib.contextmanager
+def startup_phase(name: str) -> Iterator[None]:
+    """记录一次性的启动阶段（如首次加载某个方言）；已记录过的阶段不再计时"""
+    if name in startup_phases:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup(name, time.perf_counter() - start)
+
+
+def _take_unreported_startup() -> List[Tuple[str, float]]:
+    with _startup_lock:
+        phases = list(_unreported_startup)
+        _unreported_startup.clear()
+    return phases
+
+
+def count(name: str, value: int = 1) -> None:
+    """累加计数（语句数、节点数、边数、缓存命中等）"""
+    metrics_registry.add_count(name, value)
+    request_metrics = _current.get()
+    if request_metrics is not None:
+        request_metrics.counts[name] = request_metrics.counts.get(name, 0) + value
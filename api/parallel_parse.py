@@ -0,0 +1,243 @@
+import contextlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lineage_cache import (
+    DEFAULT_DIALECT,
+    extract_statement_lineage,
+    get_statement_lineage,
+    statement_cache,
+    statement_cache_keys,
+)
+from metrics import get_logger, stage
+
+logger = get_logger(__name__)
+
+# --- 并行解析配置 (可通过环境变量覆盖) ---
+PARSE_WORKERS = int(os.environ.get('LINEAGE_PARSE_WORKERS', os.cpu_count() or 1))  # 工作进程数
+PARSE_CHUNK_SIZE = int(os.environ.get('LINEAGE_PARSE_CHUNK_SIZE', 8))  # 每次派发给工作进程的语句数
+MIN_PARALLEL_STATEMENTS = 2  # 待解析语句少于该值时直接串行，避免进程间通信开销
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def clamp_max_workers(max_workers=None) -> int:
+    """
+    校验请求指定的解析进程数：须为正整数，超过 PARSE_WORKERS 时截断，未指定时为 PARSE_WORKERS；不合法时抛出 ValueError。
+    它只限制单个请求同时占用的工作进程数，共享进程池的大小不受请求影响。
+    """
+    if max_workers is None:
+        return PARSE_WORKERS
+    if isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers < 1:
+        raise ValueError(f'max_workers must be a positive integer, got {max_workers!r}')
+    return min(max_workers, PARSE_WORKERS)
+
+
+def set_parse_workers(workers: int) -> None:
+    """
+    设置本进程共享解析进程池的大小（进程级配置：serve.py 按工作进程数分摊 CPU，ingest.py 的 --workers）。
+    进程池已创建且大小不同时会等待其关闭后重建，不能在处理请求期间调用。
+    """
+    global PARSE_WORKERS, _executor
+    workers = max(1, int(workers))
+    with _executor_lock:
+        if workers == PARSE_WORKERS:
+            return
+        PARSE_WORKERS = workers
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    获取进程级共享的解析进程池（PARSE_WORKERS 个进程），首次使用时创建并跨请求复用，不会因请求参数而重建。
+    工作进程异常退出（如被 OOM killer 杀掉）后进程池不可再用，此时丢弃旧进程池并重建。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None and getattr(_executor, '_broken', False):
+            logger.warning("Parse pool is broken, recreating it")
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        return _executor
+
+
+def discard_executor(executor: ProcessPoolExecutor) -> None:
+    """
+    丢弃已损坏的进程池，下次 get_executor 时重建。
+    只有 executor 仍是当前共享进程池时才丢弃，避免其他请求已重建的健康进程池被关闭。
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def shutdown_executor() -> None:
+    """关闭共享进程池（进程退出或测试时使用）"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+
+
+def get_statement_lineages(
+        statements: List[str],
+        dialect: str = DEFAULT_DIALECT,
+        with_columns: bool = True,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        metadata_catalog: Optional[str] = None
+) -> List[Dict]:
+    """
+    批量获取语句血缘，结果顺序与 statements 一致。
+
+    Args:
+        statements (list): 已拆分的 SQL 语句列表
+        dialect (str): SQL 方言
+        with_columns (bool): 是否提取列级血缘路径
+        parallel (bool): 是否将未命中缓存的语句分发到进程池并行解析
+        max_workers (int): 本次最多占用的工作进程数，不超过 PARSE_WORKERS；为 1 时在本进程串行解析
+        chunk_size (int): 每批派发的语句数，默认 PARSE_CHUNK_SIZE
+        metadata_catalog (str): 元数据目录文件路径，工作进程各自加载
+
+    Returns:
+        list: 每条语句的血缘记录，格式同 extract_statement_lineage
+    """
+    workers = clamp_max_workers(max_workers)
+    if not parallel or workers <= 1:
+        return [
+            get_statement_lineage(stmt, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog)
+            for stmt in statements
+        ]
+
+    # 先在主进程查缓存，只把未命中的语句交给进程池
+    key_pairs = [statement_cache_keys(stmt, dialect, with_columns, metadata_catalog) for stmt in statements]
+    keys = [key for key, _ in key_pairs]
+    results = [statement_cache.get(key, full_key) for key, full_key in key_pairs]
+
+    # 同一脚本内重复出现的语句只解析一次
+    pending: Dict[str, List[int]] = {}
+    for i, entry in enumerate(results):
+        if entry is None:
+            pending.setdefault(keys[i], []).append(i)
+    if not pending:
+        return results
+
+    first_indexes = [indexes[0] for indexes in pending.values()]
+    todo = [statements[i] for i in first_indexes]
+    extract = partial(
+        extract_statement_lineage, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog
+    )
+    if len(todo) < MIN_PARALLEL_STATEMENTS:
+        parsed = [extract(stmt) for stmt in todo]
+        timer = contextlib.nullcontext()
+    else:
+        chunk_size = max(1, chunk_size or PARSE_CHUNK_SIZE)
+        if workers < PARSE_WORKERS:
+            # 按 workers 份切分，同时占用的工作进程不超过请求的 max_workers
+            chunk_size = max(chunk_size, -(-len(todo) // workers))
+        executor = get_executor()
+        try:
+            parsed = executor.map(extract, todo, chunksize=chunk_size)
+        except BrokenProcessPool:
+            discard_executor(executor)
+            parsed = iter(())
+        # 工作进程内的阶段耗时无法计入本请求，这里记录等待进程池的总时间
+        timer = stage('parse_pool')
+
+    # executor.map 按输入顺序返回结果，首个失败的语句会在这里抛出异常，与串行路径一致
+    items = list(pending.items())
+    done = 0
+    with timer:
+        try:
+            for (key, indexes), entry in zip(items, parsed):
+                statement_cache.put(key, entry)
+                for i in indexes:
+                    results[i] = entry
+                done += 1
+        except BrokenProcessPool:
+            logger.warning("Parse pool broken, parsing %d remaining statements serially", len(items) - done)
+            discard_executor(executor)
+    # 进程池损坏时剩余的语句在本进程串行解析
+    for key, indexes in items[done:]:
+        entry = extract(statements[indexes[0]])
+        statement_cache.put(key, entry)
+        for i in indexes:
+            results[i] = entry
+    return results
+
+
+def iter_statement_lineages(
+        statements: List[str],
+        dialect: str = DEFAULT_DIALECT,
+        with_columns: bool = True,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        metadata_catalog: Optional[str] = None
+) -> Iterator[Tuple[int, Optional[Dict], Optional[Exception]]]:
+    """
+    逐条产出语句血缘 (index, entry, error)，顺序与 statements 一致。
+    与 get_statement_lineages 不同，单条语句解析失败不会中断后续语句，异常通过 error 返回。
+    并行模式下所有未命中缓存的语句会先全部提交到进程池，再按顺序等待结果。
+    """
+    if not parallel or clamp_max_workers(max_workers) <= 1:
+        for i, stmt in enumerate(statements):
+            try:
+                yield i, get_statement_lineage(
+                    stmt, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog
+                ), None
+            except Exception as e:
+                yield i, None, e
+        return
+
+    extract = partial(
+        extract_statement_lineage, dialect=dialect, with_columns=with_columns, metadata_catalog=metadata_catalog
+    )
+    executor = get_executor()
+    broken = False
+    pending = []
+    for stmt in statements:
+        key, full_key = statement_cache_keys(stmt, dialect, with_columns, metadata_catalog)
+        entry = statement_cache.get(key, full_key)
+        future = None
+        if entry is None and not broken:
+            try:
+                future = executor.submit(extract, stmt)
+            except BrokenProcessPool:
+                broken = True
+        pending.append((key, entry, future))
+
+    for i, (key, entry, future) in enumerate(pending):
+        if entry is not None:
+            yield i, entry, None
+            continue
+        try:
+            if future is not None:
+                try:
+                    with stage('parse_pool'):
+                        entry = future.result()
+                except BrokenProcessPool:
+                    broken = True
+            if entry is None:
+                # 进程池损坏后尚未完成的语句在本进程串行解析
+                entry = extract(statements[i])
+        except Exception as e:
+            yield i, None, e
+            continue
+        statement_cache.put(key, entry)
+        yield i, entry, None
+    if broken:
+        logger.warning("Parse pool broken, remaining statements were parsed serially")
+        discard_executor(executor)
@@ -0,0 +1,139 @@
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from sqllineage import SQLPARSE_DIALECT
+from sqllineage.config import SQLLineageConfig
+from sqllineage.core.analyzer import LineageAnalyzer
+from sqllineage.core.holders import SQLLineageHolder
+from sqllineage.core.metadata.dummy import DummyMetaDataProvider
+from sqllineage.core.metadata_provider import MetaDataProvider
+from sqllineage.core.models import Table
+from sqllineage.core.parser.sqlparse.analyzer import SqlParseLineageAnalyzer
+from sqllineage.utils.helpers import split
+
+from metrics import get_logger, startup_phase
+
+logger = get_logger(__name__)
+
+
+def _import_sqlfluff_analyzer():
+    """
+    导入 sqllineage 的 sqlfluff 分析器而不加载全部方言。sqllineage 在类定义时用 sqlfluff 的 dialect_readout()
+    生成 SUPPORTED_DIALECTS，会导入全部二十多个方言模块（约占冷启动的一半）；导入期间换成只列出方言名称的版本，
+    方言改为在 get_analyzer 首次使用时按需加载。sqlfluff 内部结构不符时按原方式导入。
+    """
+    import sqlfluff.core
+    from sqlfluff.core import dialects
+
+    original = sqlfluff.core.dialect_readout
+    lookup = getattr(dialects, '_dialect_lookup', None)
+    if lookup is not None:
+        def label_only_readout():
+            for label in sorted(lookup):
+                yield dialects.DialectTuple(label=label, name=label, inherits_from='', docstring='')
+        sqlfluff.core.dialect_readout = label_only_readout
+    try:
+        from sqllineage.core.parser.sqlfluff.analyzer import SqlFluffLineageAnalyzer
+    finally:
+        sqlfluff.core.dialect_readout = original
+    return SqlFluffLineageAnalyzer
+
+
+with startup_phase('sqlfluff'):
+    SqlFluffLineageAnalyzer = _import_sqlfluff_analyzer()
+
+DEFAULT_DIALECT = 'ansi'
+# 服务启动时预热的方言列表，逗号分隔
+PREWARM_DIALECTS = [
+    d.strip() for d in os.environ.get('LINEAGE_PREWARM_DIALECTS', 'ansi,hive,sparksql,mysql').split(',')
+    if d.strip()
+]
+WARMUP_SQL = 'INSERT INTO warmup.target SELECT a FROM warmup.source'
+
+_analyzers: Dict[str, LineageAnalyzer] = {}
+_analyzers_lock = threading.Lock()
+
+
+class UnsupportedDialectError(ValueError):
+    """请求的方言不被 sqlfluff/sqlparse 支持"""
+
+
+def supported_dialects() -> List[str]:
+    return list(SqlFluffLineageAnalyzer.SUPPORTED_DIALECTS) + [SQLPARSE_DIALECT]
+
+
+def validate_dialect(dialect: str) -> str:
+    """校验方言名称，不支持时抛出 UnsupportedDialectError"""
+    if dialect not in supported_dialects():
+        raise UnsupportedDialectError(f'Unsupported dialect: {dialect}')
+    return dialect
+
+
+def get_analyzer(dialect: str = DEFAULT_DIALECT) -> LineageAnalyzer:
+    """
+    获取某个方言的共享分析器。sqlfluff 的配置和方言只在首次使用时构建一次，之后所有语句和请求复用。
+    """
+    analyzer = _analyzers.get(dialect)
+    if analyzer is not None:
+        return analyzer
+    validate_dialect(dialect)
+    with _analyzers_lock:
+        analyzer = _analyzers.get(dialect)
+        if analyzer is None:
+            # 首次使用某个方言时才加载其语法，耗时记为启动阶段
+            with startup_phase(f'dialect-{dialect}'):
+                if dialect == SQLPARSE_DIALECT:
+                    analyzer = SqlParseLineageAnalyzer()
+                else:
+                    analyzer = SqlFluffLineageAnalyzer('.', dialect)
+            _analyzers[dialect] = analyzer
+        return analyzer
+
+
+def prewarm_parsers(dialects: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    预热方言：构建分析器并解析一条小语句，使 sqlfluff 的方言语法在处理真实请求前就已加载。
+    返回成功预热的方言列表；不支持的方言会被跳过。
+    """
+    warmed = []
+    for dialect in (PREWARM_DIALECTS if dialects is None else dialects):
+        try:
+            analyze_statement(WARMUP_SQL, dialect)
+        except Exception as e:
+            logger.warning("Skip prewarming dialect %s: %s", dialect, e)
+            continue
+        warmed.append(dialect)
+    return warmed
+
+
+def analyze_statement(
+        sql: str,
+        dialect: str = DEFAULT_DIALECT,
+        metadata_provider: Optional[MetaDataProvider] = None
+) -> SQLLineageHolder:
+    """
+    使用共享分析器解析 SQL，与 LineageRunner._eval 的处理流程一致，但不再为每条语句重新构建 sqlfluff 配置。
+    """
+    if metadata_provider is None:
+        metadata_provider = DummyMetaDataProvider()
+    if SQLLineageConfig.TSQL_NO_SEMICOLON and dialect == 'tsql':
+        # split_tsql 会在分析器上缓存语句片段，这种情况使用独立的分析器
+        analyzer = SqlFluffLineageAnalyzer('.', dialect)
+        stmts = analyzer.split_tsql(sql.strip())
+    else:
+        analyzer = get_analyzer(dialect)
+        stmts = split(sql.strip())
+
+    with metadata_provider.session() as session:
+        stmt_holders = []
+        for stmt in stmts:
+            stmt_holder = analyzer.analyze(stmt, session.metadata_provider)
+            if write := stmt_holder.write:
+                tgt_table = next(iter(write))
+                if isinstance(tgt_table, Table) and (
+                        tgt_columns := stmt_holder.get_table_columns(tgt_table)
+                ):
+                    session.register_session_metadata(tgt_table, tgt_columns)
+            stmt_holders.append(stmt_holder)
+        return SQLLineageHolder.of(session.metadata_provider, *stmt_holders)
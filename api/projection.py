@@ -0,0 +1,147 @@
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from column_graph import EDGE_SHIFT, ColumnGraph
+from layering import find_strongly_connected_components
+
+ColumnNode = Tuple[str, str]  # (table, field)
+
+
+def compute_visible_closure(
+        starts: Iterable[ColumnNode],
+        adj: Dict[ColumnNode, List[ColumnNode]],  # 也可以是 column_graph.CSRAdjacency，节点为列编号
+        is_visible: Callable[[ColumnNode], bool]
+) -> Dict[ColumnNode, FrozenSet[ColumnNode]]:
+    """
+    对隐藏节点计算"穿过隐藏节点能到达的第一批可见节点"集合，每个隐藏节点只计算一次。
+
+    先迭代收集从 starts 出发、只经过隐藏节点能到达的子图，再在该子图上求强连通分量：
+    Tarjan 按逆拓扑序输出分量，下游分量的结果总是先算好，同一个环里的节点共享同一个结果。
+
+    Args:
+        starts: 需要结果的隐藏节点
+        adj: 邻接表（正向求下游可见节点，传入反向邻接表则求上游可见节点）
+        is_visible: 判断节点是否可见
+
+    Returns:
+        dict: 隐藏节点 -> 可达可见节点的 frozenset
+    """
+    # 1. 迭代收集隐藏子图
+    hidden_adj: Dict[ColumnNode, List[ColumnNode]] = {}
+    stack = [s for s in starts if not is_visible(s)]
+    while stack:
+        node = stack.pop()
+        if node in hidden_adj:
+            continue
+        hidden_next = [n for n in adj.get(node, ()) if not is_visible(n)]
+        hidden_adj[node] = hidden_next
+        stack.extend(n for n in hidden_next if n not in hidden_adj)
+
+    # 2. 按逆拓扑序合并可见节点集合
+    closure: Dict[ColumnNode, FrozenSet[ColumnNode]] = {}
+    for component in find_strongly_connected_components(hidden_adj):
+        members = set(component)
+        reached: Set[ColumnNode] = set()
+        for node in component:
+            for n in adj.get(node, ()):
+                if is_visible(n):
+                    reached.add(n)
+                elif n not in members:
+                    reached.update(closure[n])
+        frozen = frozenset(reached)
+        for node in component:
+            closure[node] = frozen
+    return closure
+
+
+def project_edges_to_visible(
+        raw_edges: Iterable[Tuple[str, str, str, str]],
+        visible_tables: Set[str],
+        adj_map: Dict[ColumnNode, List[ColumnNode]],
+        rev_adj: Dict[ColumnNode, List[ColumnNode]]
+) -> Set[Tuple[str, str, str, str]]:
+    """
+    把原始列级边投影到可见表上：两端可见的边直接保留；只有一端可见的边，
+    沿隐藏节点找到另一侧最近的可见节点后连边；两端都隐藏的边不直接输出。
+
+    Returns:
+        set: (from_table, from_field, to_table, to_field) 边集合
+    """
+    raw_edges = list(raw_edges)
+
+    def is_visible(node: ColumnNode) -> bool:
+        return node[0] in visible_tables
+
+    # 只为真正需要的隐藏端点计算闭包
+    downstream_starts = []
+    upstream_starts = []
+    for from_t, from_f, to_t, to_f in raw_edges:
+        from_visible = from_t in visible_tables
+        to_visible = to_t in visible_tables
+        if from_visible and not to_visible:
+            downstream_starts.append((to_t, to_f))
+        elif to_visible and not from_visible:
+            upstream_starts.append((from_t, from_f))
+
+    downstream = compute_visible_closure(downstream_starts, adj_map, is_visible)
+    upstream = compute_visible_closure(upstream_starts, rev_adj, is_visible)
+
+    edges: Set[Tuple[str, str, str, str]] = set()
+    for from_t, from_f, to_t, to_f in raw_edges:
+        from_visible = from_t in visible_tables
+        to_visible = to_t in visible_tables
+        if from_visible and to_visible:
+            edges.add((from_t, from_f, to_t, to_f))
+        elif from_visible:
+            for target_table, target_field in downstream[(to_t, to_f)]:
+                edges.add((from_t, from_f, target_table, target_field))
+        elif to_visible:
+            for source_table, source_field in upstream[(from_t, from_f)]:
+                edges.add((source_table, source_field, to_t, to_f))
+    return edges
+
+
+def project_graph_to_visible(graph: ColumnGraph, visible_tables: Set[str]) -> Set[int]:
+    """
+    与 project_edges_to_visible 相同的投影，直接在 ColumnGraph 的列编号和 CSR 邻接上进行。
+
+    Returns:
+        set: 边编码 (from_column << EDGE_SHIFT) | to_column 的集合，见 column_graph.EDGE_SHIFT
+    """
+    visible = bytearray(len(graph.tables))
+    for tid, table in enumerate(graph.tables):
+        if table in visible_tables:
+            visible[tid] = 1
+    column_table = graph.column_table
+    offsets = graph.successors.offsets
+    targets = graph.successors.targets
+
+    def is_visible(column: int) -> bool:
+        return visible[column_table[column]] == 1
+
+    # 只为真正需要的隐藏端点计算闭包
+    downstream_starts = set()
+    upstream_starts = set()
+    for u in range(graph.column_count):
+        from_visible = visible[column_table[u]]
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            to_visible = visible[column_table[v]]
+            if from_visible and not to_visible:
+                downstream_starts.add(v)
+            elif to_visible and not from_visible:
+                upstream_starts.add(u)
+
+    downstream = compute_visible_closure(downstream_starts, graph.successors, is_visible)
+    upstream = compute_visible_closure(upstream_starts, graph.predecessors, is_visible)
+
+    edges: Set[int] = set()
+    for u in range(graph.column_count):
+        from_visible = visible[column_table[u]]
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            to_visible = visible[column_table[v]]
+            if from_visible and to_visible:
+                edges.add((u << EDGE_SHIFT) | v)
+            elif from_visible:
+                edges.update((u << EDGE_SHIFT) | target for target in downstream[v])
+            elif to_visible:
+                edges.update((source << EDGE_SHIFT) | v for source in upstream[u])
+    return edges
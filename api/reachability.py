@@ -0,0 +1,300 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from layering import find_strongly_connected_components
+from wire_format import COMPACT_FORMAT, decode_compact
+
+# --- 可达性索引配置 (可通过环境变量覆盖) ---
+GRAPH_STORE_MAX_COUNT = int(os.environ.get('LINEAGE_GRAPH_STORE_MAX_COUNT', 32))  # 最多保留的血缘图数量
+# 预计算闭包位图的分量数上限；位图内存最坏为 分量数² / 8 字节（每个方向），超过时不建位图，查询改为在原图上 BFS
+REACHABILITY_MAX_COMPONENTS = int(os.environ.get('LINEAGE_REACHABILITY_MAX_COMPONENTS', 10000))
+QUERY_DIRECTIONS = ('upstream', 'downstream', 'both')
+
+Edge = Tuple[str, str, str, str]  # (from_table, from_field, to_table, to_field)
+
+
+class ReachabilityIndex:
+    """
+    列级血缘图的可达性索引。列节点先驻留为整数，再按强连通分量缩点：
+    每个分量预先计算上游/下游闭包的位图（Python 整数，第 i 位表示第 i 个分量），
+    Tarjan 按逆拓扑序输出分量，下游分量的位图总是先算好，合并时只需按位或。
+    不限深度的查询只做位图合并；限深度的查询在原图上做有界 BFS。
+    分量数超过 max_components 时位图占用的内存（最坏 分量数² / 8 字节）不可接受，此时不建位图，
+    不限深度的查询同样在原图上 BFS。
+    """
+
+    def __init__(self, edges: Iterable[Edge], max_components: int = REACHABILITY_MAX_COMPONENTS):
+        self.columns: List[Tuple[str, str]] = []
+        self.column_ids: Dict[Tuple[str, str], int] = {}
+        self.table_columns: Dict[str, List[int]] = collections.defaultdict(list)
+        succ: Dict[int, Set[int]] = {}
+        pred: Dict[int, Set[int]] = {}
+        for from_t, from_f, to_t, to_f in edges:
+            u = self._intern(from_t, from_f)
+            v = self._intern(to_t, to_f)
+            succ.setdefault(u, set())
+            pred.setdefault(u, set())
+            succ.setdefault(v, set())
+            pred.setdefault(v, set())
+            if u != v:
+                succ[u].add(v)
+                pred[v].add(u)
+        self.succ = succ
+        self.pred = pred
+
+        # 缩点：分量编号即 Tarjan 的输出顺序（逆拓扑序）
+        components = find_strongly_connected_components(succ)
+        self.component_of: List[int] = [0] * len(self.columns)
+        self.component_members: List[List[int]] = components
+        for cid, members in enumerate(components):
+            for node in members:
+                self.component_of[node] = cid
+        self.descendants: Optional[List[int]] = None
+        self.ancestors: Optional[List[int]] = None
+        if len(components) > max_components:
+            return
+
+        component_succ: List[Set[int]] = [set() for _ in components]
+        for u, targets in succ.items():
+            cu = self.component_of[u]
+            for v in targets:
+                cv = self.component_of[v]
+                if cu != cv:
+                    component_succ[cu].add(cv)
+
+        # 下游闭包：逆拓扑序（下游在前）依次计算
+        self.descendants = [0] * len(components)
+        for cid in range(len(components)):
+            bits = 1 << cid
+            for child in component_succ[cid]:
+                bits |= self.descendants[child]
+            self.descendants[cid] = bits
+        # 上游闭包：拓扑序（上游在前）依次计算
+        component_pred: List[Set[int]] = [set() for _ in components]
+        for cu, targets in enumerate(component_succ):
+            for cv in targets:
+                component_pred[cv].add(cu)
+        self.ancestors = [0] * len(components)
+        for cid in range(len(components) - 1, -1, -1):
+            bits = 1 << cid
+            for parent in component_pred[cid]:
+                bits |= self.ancestors[parent]
+            self.ancestors[cid] = bits
+
+    def _intern(self, table: str, field: str) -> int:
+        key = (table, field)
+        node = self.column_ids.get(key)
+        if node is None:
+            node = len(self.columns)
+            self.column_ids[key] = node
+            self.columns.append(key)
+            self.table_columns[table].append(node)
+        return node
+
+    def resolve(self, table: str, field: Optional[str] = None) -> List[int]:
+        """把表或表.字段解析为列节点编号列表，不存在时返回空列表"""
+        if field is None:
+            return list(self.table_columns.get(table, ()))
+        node = self.column_ids.get((table, field))
+        return [] if node is None else [node]
+
+    def _closure_bits(self, starts: List[int], direction: str) -> int:
+        bits = 0
+        for node in starts:
+            cid = self.component_of[node]
+            if direction in ('downstream', 'both'):
+                bits |= self.descendants[cid]
+            if direction in ('upstream', 'both'):
+                bits |= self.ancestors[cid]
+        return bits
+
+    def _bounded_bfs(self, starts: List[int], adj: Dict[int, Set[int]], depth: Optional[int]) -> Set[int]:
+        """depth 为 None 时不限跳数"""
+        seen = set(starts)
+        frontier = list(starts)
+        hops = 0
+        while depth is None or hops < depth:
+            hops += 1
+            next_frontier = []
+            for node in frontier:
+                for n in adj[node]:
+                    if n not in seen:
+                        seen.add(n)
+                        next_frontier.append(n)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return seen
+
+    def query(self, starts: List[int], direction: str = 'both', depth: Optional[int] = None) -> Set[int]:
+        """
+        返回 starts 的上游/下游闭包（包含 starts 本身）。
+
+        Args:
+            starts: 起点列节点编号
+            direction: 'upstream' / 'downstream' / 'both'
+            depth: 最大跳数，None 表示不限
+        """
+        if depth is None and self.descendants is not None:
+            bits = self._closure_bits(starts, direction)
+            nodes: Set[int] = set()
+            while bits:
+                low = bits & -bits
+                nodes.update(self.component_members[low.bit_length() - 1])
+                bits ^= low
+            return nodes
+        nodes = set(starts)
+        if direction in ('downstream', 'both'):
+            nodes |= self._bounded_bfs(starts, self.succ, depth)
+        if direction in ('upstream', 'both'):
+            nodes |= self._bounded_bfs(starts, self.pred, depth)
+        return nodes
+
+    def closure_edges(self, starts: List[int], nodes: Set[int], direction: str) -> List[Edge]:
+        """闭包内位于起点上游或下游路径上的边"""
+        downstream = self.query(starts, 'downstream') & nodes if direction != 'upstream' else set()
+        upstream = self.query(starts, 'upstream') & nodes if direction != 'downstream' else set()
+        edges = []
+        for u in nodes:
+            for v in self.succ[u]:
+                if v in nodes and ((u in downstream and v in downstream) or (u in upstream and v in upstream)):
+                    edges.append(self.columns[u] + self.columns[v])
+        edges.sort()
+        return edges
+
+
+def compute_graph_id(edges: List[Edge], nodes: List[Dict] = (), collapsed: bool = False) -> str:
+    """按边、节点布局和折叠方式计算确定性的图 ID，相同的血缘图复用同一个索引"""
+    digest = hashlib.sha256()
+    for edge in sorted(edges):
+        digest.update('\x1f'.join(edge).encode('utf-8'))
+        digest.update(b'\x1e')
+    for node in nodes:
+        digest.update(f"{node['name']}\x1f{node['left']}\x1f{node['top']}\x1f{len(node.get('fields', ()))}".encode('utf-8'))
+        digest.update(b'\x1e')
+    digest.update(b'collapsed' if collapsed else b'expanded')
+    return digest.hexdigest()
+
+
+def result_edges(result: Dict) -> List[Edge]:
+    """从血缘结果中取出边元组"""
+    return [
+        (e['from']['name'], e['from']['field'], e['to']['name'], e['to']['field'])
+        for e in result.get('edges', [])
+    ]
+
+
+class LineageGraphStore:
+    """
+    按图 ID 保存血缘图的边和节点布局，首次查询时才构建 ReachabilityIndex，超出数量上限时淘汰最久未使用的图。
+    固定（pinned）的图（如启动时加载的全仓快照）不计入数量上限，也不会被淘汰。
+    """
+
+    def __init__(self, max_count: int = GRAPH_STORE_MAX_COUNT):
+        self.max_count = max_count
+        self._graphs: 'collections.OrderedDict[str, Dict]' = collections.OrderedDict()
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def register(self, result: Dict, collapsed: bool = False, pinned: bool = False) -> str:
+        """
+        登记血缘结果（普通或紧凑格式，节点须带完整字段列表），返回图 ID。
+        collapsed 表示客户端拿到的布局是否按折叠节点计算，视口查询据此估算节点高度；pinned 的图不会被淘汰。
+        """
+        if result.get('format') == COMPACT_FORMAT:
+            result = decode_compact(result)
+        edges = result_edges(result)
+        nodes = result.get('nodes', [])
+        graph_id = compute_graph_id(edges, nodes, collapsed)
+        self.add(graph_id, edges, nodes, collapsed, pinned)
+        return graph_id
+
+    def add(self, graph_id: str, edges: List[Edge], nodes: List[Dict], collapsed: bool = False,
+            pinned: bool = False) -> None:
+        """按已知的图 ID 登记（用于把子进程中登记的图转交给服务进程）"""
+        with self._lock:
+            if graph_id not in self._graphs:
+                self._graphs[graph_id] = {
+                    'edges': edges, 'nodes': nodes, 'collapsed': collapsed,
+                    'index': None, 'spatial': None, 'tables': None, 'summaries': None, 'lock': threading.Lock()
+                }
+            if pinned:
+                self._pinned.add(graph_id)
+            self._graphs.move_to_end(graph_id)
+            # 按最久未使用的顺序淘汰未固定的图
+            while len(self._graphs) - len(self._pinned) > self.max_count:
+                victim = next(g for g in self._graphs if g not in self._pinned)
+                del self._graphs[victim]
+
+    def get_graph(self, graph_id: str) -> Optional[Dict]:
+        with self._lock:
+            graph = self._graphs.get(graph_id)
+            if graph is not None:
+                self._graphs.move_to_end(graph_id)
+            return graph
+
+    def get_index(self, graph_id: str) -> Optional[ReachabilityIndex]:
+        graph = self.get_graph(graph_id)
+        if graph is None:
+            return None
+        with graph['lock']:
+            if graph['index'] is None:
+                graph['index'] = ReachabilityIndex(graph['edges'])
+            return graph['index']
+
+
+# 进程级共享血缘图存储
+graph_store = LineageGraphStore()
+
+
+def query_lineage(data: Dict) -> Tuple[Dict, int]:
+    """
+    上下游血缘查询接口。
+
+    请求体JSON格式:
+    {
+        "graph_id": "血缘结果中的 graph_id",
+        "table": "库.表",
+        "field": "字段名",  # 可选，不传时查询整张表所有字段的闭包
+        "direction": "upstream"/"downstream"/"both",  # 可选，默认"both"
+        "depth": 2,  # 可选，最大跳数，默认不限
+        "include_edges": true/false  # 可选，默认true
+    }
+    """
+    if not data or not data.get('graph_id') or not data.get('table'):
+        return {'error': 'Missing required parameter: graph_id, table'}, 400
+    direction = data.get('direction', 'both')
+    if direction not in QUERY_DIRECTIONS:
+        return {'error': f'Unsupported direction: {direction}'}, 400
+    depth = data.get('depth')
+    if depth is not None and (isinstance(depth, bool) or not isinstance(depth, int) or depth < 0):
+        return {'error': 'depth must be a non-negative integer'}, 400
+
+    start = time.perf_counter()
+    index = graph_store.get_index(data['graph_id'])
+    if index is None:
+        return {'error': 'Lineage graph not found or expired, please re-run the analysis'}, 404
+    starts = index.resolve(data['table'], data.get('field'))
+    if not starts:
+        return {'error': 'Table or field not found in lineage graph'}, 404
+
+    nodes = index.query(starts, direction, depth)
+    columns = sorted(index.columns[n] for n in nodes)
+    response = {
+        'graph_id': data['graph_id'],
+        'direction': direction,
+        'depth': depth,
+        'tables': sorted({table for table, _ in columns}),
+        'columns': [{'name': table, 'field': field} for table, field in columns]
+    }
+    if data.get('include_edges', True):
+        response['edges'] = [
+            {'from': {'field': from_f, 'name': from_t}, 'to': {'field': to_f, 'name': to_t}}
+            for from_t, from_f, to_t, to_f in index.closure_edges(starts, nodes, direction)
+        ]
+    response['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return response, 200
@@ -0,0 +1,194 @@
+"""
+生产环境服务入口。主进程先导入血缘模块并预热解析器，再 fork 出工作进程处理请求，
+工作进程以写时复制方式共享已加载的 sqllineage/sqlfluff 方言和语法；语句解析交给每个工作进程的共享解析进程池。
+
+    python serve.py --threads 8 --port 5000
+
+- 默认只有一个工作进程（--workers 1），用 --threads 指定同时处理的请求数。血缘图（graph_id）、增量会话和
+  异步任务只保存在工作进程自己的内存中，而多个工作进程从同一个监听套接字接受连接，由内核分配，无法按客户端固定；
+  多工作进程时 /api/lineage/query、/graph/<id>/fields、/summary、/viewport、会话和任务查询会落到别的进程而返回 404。
+  --workers > 1 只适用于不使用这些后续接口的无状态部署（如 CI 调用 /api/lineage/batch）
+- 多工作进程时每个工作进程的解析进程池按 LINEAGE_PARSE_WORKERS / workers 分摊，总进程数不超过 CPU 配额
+- 工作进程异常退出时由主进程重新拉起；SIGTERM/SIGINT 时等待各工作进程处理完当前请求后退出
+- 请求体大小、SQL 字符数和语句数上限见 lineage.py（LINEAGE_MAX_BODY_BYTES/LINEAGE_MAX_SQL_CHARS/LINEAGE_MAX_STATEMENTS），
+  超限请求在解析前直接拒绝；读取请求的客户端连接超过 LINEAGE_SERVE_TIMEOUT 秒无数据时断开
+- 依赖 fork，仅支持 Linux/macOS；Windows 上请使用 python server.py
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler, make_server
+
+# --- 服务配置 (可通过环境变量覆盖) ---
+SERVE_HOST = os.environ.get('LINEAGE_SERVE_HOST', '0.0.0.0')
+SERVE_PORT = int(os.environ.get('LINEAGE_SERVE_PORT', 5000))
+SERVE_WORKERS = int(os.environ.get('LINEAGE_SERVE_WORKERS', 1))  # 工作进程数，大于 1 时 graph_id 等进程内状态不可跨请求使用
+SERVE_THREADS = int(os.environ.get('LINEAGE_SERVE_THREADS', 8))  # 每个工作进程同时处理的请求数
+SERVE_TIMEOUT = float(os.environ.get('LINEAGE_SERVE_TIMEOUT', 30))  # 读取请求时的套接字超时（秒）
+SERVE_BACKLOG = int(os.environ.get('LINEAGE_SERVE_BACKLOG', 128))  # 监听队列长度
+RESPAWN_MIN_INTERVAL = 1.0  # 工作进程启动后这么快就退出时，重新拉起前先等待，避免崩溃循环
+
+
+class _RequestHandler(WSGIRequestHandler):
+    # 慢速或空闲的客户端连接超时后断开，不会一直占用工作进程
+    timeout = SERVE_TIMEOUT
+
+
+class _BoundedThreadedServer(ThreadedWSGIServer):
+    """每个请求一个线程，但同时处理的请求数不超过 threads，其余连接留在监听队列中"""
+
+    def __init__(self, *args, threads: int = SERVE_THREADS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def preload() -> None:
+    """在 fork 前导入应用并预热解析器，再冻结已有对象，避免垃圾回收改写共享页面"""
+    from parser_context import prewarm_parsers
+    import server  # noqa: F401  导入即加载全部血缘模块和快照
+
+    print(f"Prewarmed dialects: {prewarm_parsers()}")
+    gc.collect()
+    gc.freeze()
+
+
+def _run_worker(sock: socket.socket, host: str, threads: int) -> None:
+    from server import app
+
+    if threads > 1:
+        httpd = _BoundedThreadedServer(host, 0, app, handler=_RequestHandler, fd=sock.fileno(), threads=threads)
+    else:
+        httpd = make_server(host, 0, app, request_handler=_RequestHandler, fd=sock.fileno())
+
+    def stop(signum, frame):
+        # shutdown 会等待 serve_forever 退出，不能在其所在线程中直接调用
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    httpd.serve_forever()
+
+
+def _spawn(sock: socket.socket, host: str, threads: int) -> int:
+    pid = os.fork()
+    if pid == 0:
+        # 在工作进程安装自己的处理器之前，不执行继承自主进程的信号处理
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(sock, host, threads)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(
+        host: str = SERVE_HOST,
+        port: int = SERVE_PORT,
+        workers: int = SERVE_WORKERS,
+        threads: int = SERVE_THREADS,
+        sock: Optional[socket.socket] = None
+) -> None:
+    """
+    启动主进程：监听端口、预加载并按 workers 数 fork 工作进程，直到收到 SIGTERM/SIGINT。
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+        workers: 工作进程数
+        threads: 每个工作进程同时处理的请求数，1 表示逐个处理
+        sock: 已绑定并监听的套接字，为 None 时按 host/port 创建
+    """
+    if not hasattr(os, 'fork'):
+        raise RuntimeError('serve.py requires fork(), use "python server.py" on this platform')
+    if sock is None:
+        sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(SERVE_BACKLOG)
+    sock.set_inheritable(True)
+
+    if workers > 1:
+        # 在 fork 之前设置，各工作进程首次并行解析时按分摊后的大小创建进程池
+        from parallel_parse import PARSE_WORKERS, set_parse_workers
+
+        set_parse_workers(max(1, PARSE_WORKERS // workers))
+        print(f"Warning: {workers} workers do not share graph_id/session/job state, "
+              f"follow-up requests may return 404; use --workers 1 --threads N for the UI", file=sys.stderr)
+
+    start = time.perf_counter()
+    preload()
+    print(f"Preloaded in {time.perf_counter() - start:.2f}s, starting {workers} worker(s) "
+          f"x {threads} thread(s) on {host}:{sock.getsockname()[1]}")
+
+    children: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children[_spawn(sock, host, threads)] = time.monotonic()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = children.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting", file=sys.stderr)
+        if time.monotonic() - started_at < RESPAWN_MIN_INTERVAL:
+            time.sleep(RESPAWN_MIN_INTERVAL)
+        if not stopping:
+            children[_spawn(sock, host, threads)] = time.monotonic()
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='血缘分析服务（生产环境多进程模式）')
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, default=SERVE_PORT)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS, help='每个工作进程同时处理的请求数')
+    args = parser.parse_args()
+    serve(args.host, args.port, max(1, args.workers), max(1, args.threads))
+
+
+if __name__ == '__main__':
+    main()
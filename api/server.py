@@ -1,9 +1,61 @@
-from flask import Flask, request, jsonify
+import json
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from lineage import analyze_sql_lineage
+from lineage import MAX_BODY_BYTES, analyze_sql_lineage, check_sql_limits, stream_sql_lineage
+from lineage_cache import get_cache_stats
+from sessions import analyze_sql_lineage_incremental, session_store
+from batch import analyze_sql_lineage_batch
+from parser_context import prewarm_parsers
+from jobs import job_manager, JobQueueFull, FINISHED_STATES, SUCCEEDED
+from wire_format import GZIP_MIN_BYTES, accepts_gzip, gzip_body
+from reachability import query_lineage
+from viewport import get_table_fields, query_viewport
+from summary import get_graph_summary
+from wire_format import encode_compact
+from ingest import load_snapshot
+from metadata_catalog import get_catalog_stats
+from metrics import finish_request, get_logger, metrics_registry, stage, start_request
 
+logger = get_logger(__name__)
 app = Flask(__name__)
 CORS(app)
+# 超过上限的请求体在读取前即以 413 拒绝
+app.config['MAX_CONTENT_LENGTH'] = MAX_BODY_BYTES or None
+# ingest.py 生成的全仓血缘快照（由 LINEAGE_SNAPSHOT 指定），未配置时为 None
+lineage_snapshot = load_snapshot()
+
+@app.before_request
+def start_request_metrics():
+    start_request()
+
+# 在 compress_response 之前注册，Flask 逆序执行 after_request，因此压缩耗时也计入 Server-Timing
+@app.after_request
+def add_server_timing(response):
+    request_metrics = finish_request(request.endpoint or 'unknown', response.status_code)
+    # 流式响应在响应头发出后才开始计算，不返回 Server-Timing
+    if request_metrics is not None and not response.is_streamed:
+        response.headers['Server-Timing'] = request_metrics.server_timing()
+    return response
+
+@app.after_request
+def compress_response(response):
+    # 客户端接受 gzip 时压缩较大的 JSON 响应；流式响应逐行推送进度，不做压缩
+    if (response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not accepts_gzip(request.headers.get('Accept-Encoding', ''))):
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+    with stage('compress'):
+        response.set_data(gzip_body(body))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers.add('Vary', 'Accept-Encoding')
+    return response
+
+@app.errorhandler(413)
+def handle_request_too_large(e):
+    return jsonify({'error': f'Request body exceeds {MAX_BODY_BYTES} bytes'}), 413
 
 @app.route('/api/lineage', methods=['POST'])
 def handle_lineage():
@@ -13,10 +65,174 @@ def handle_lineage():
             return jsonify({'error': 'Missing SQL query'}), 400
             
         result, status_code = analyze_sql_lineage(data)
-        return jsonify(result), status_code
+        with stage('serialize'):
+            response = jsonify(result)
+        return response, status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/lineage/stream', methods=['POST'])
+def handle_lineage_stream():
+    # 以 NDJSON 逐条返回每个语句的解析结果，最后一行为合并后的完整血缘图
+    data = request.get_json()
+    if not data or 'sql_query' not in data:
+        return jsonify({'error': 'Missing SQL query'}), 400
+    # 超限的脚本在开始流式响应前拒绝，以便返回正确的状态码
+    rejected = check_sql_limits(data['sql_query'])
+    if rejected is not None:
+        return jsonify(rejected[0]), rejected[1]
+
+    def generate():
+        for record in stream_sql_lineage(data):
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+    )
+
+@app.route('/api/lineage/batch', methods=['POST'])
+def handle_lineage_batch():
+    # 一次请求分析多个独立脚本，语句在共享进程池中并发解析，逐脚本返回结果或错误
+    result, status_code = analyze_sql_lineage_batch(request.get_json(silent=True))
+    with stage('serialize'):
+        response = jsonify(result)
+    return response, status_code
+
+@app.route('/api/lineage/snapshot', methods=['GET'])
+def handle_lineage_snapshot():
+    # 返回启动时加载的全仓血缘快照，?format=compact 返回紧凑格式
+    if lineage_snapshot is None:
+        return jsonify({'error': 'No lineage snapshot loaded, set LINEAGE_SNAPSHOT to an ingest.py output'}), 404
+    result = lineage_snapshot['result']
+    if request.args.get('format') == 'compact':
+        result = encode_compact(result)
+    return jsonify({
+        **result,
+        'snapshot': {k: lineage_snapshot[k] for k in ('generated_at', 'source_dir', 'dialect', 'lineage_level', 'stats')}
+    }), 200
+
+@app.route('/api/lineage/query', methods=['POST'])
+def handle_lineage_query():
+    # 基于可达性索引查询某张表或某个字段的上下游闭包
+    result, status_code = query_lineage(request.get_json(silent=True))
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/graph/<graph_id>/fields', methods=['GET'])
+def handle_table_fields(graph_id):
+    # 展开折叠节点：按需获取一张表的字段和相连的列级边
+    table = request.args.get('table')
+    if not table:
+        return jsonify({'error': 'Missing required parameter: table'}), 400
+    result, status_code = get_table_fields(graph_id, table)
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/graph/<graph_id>/summary', methods=['GET'])
+def handle_graph_summary(graph_id):
+    # 多级概要视图：?level=chains 收缩 Middle 表链，?level=schemas 按 schema 分组，不指定时返回全部级别
+    result, status_code = get_graph_summary(graph_id, request.args.get('level'))
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/viewport', methods=['POST'])
+def handle_lineage_viewport():
+    # 只返回当前视口内的节点和边
+    result, status_code = query_viewport(request.get_json(silent=True))
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/impact', methods=['POST'])
+def handle_lineage_impact():
+    # 在持久化血缘存储上做跨脚本的多跳影响分析（LINEAGE_STORE_URL）
+    from lineage_store import query_impact  # 依赖 SQLAlchemy，首次使用时才导入
+
+    result, status_code = query_impact(request.get_json(silent=True))
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/store/stats', methods=['GET'])
+def handle_lineage_store_stats():
+    from lineage_store import get_lineage_store
+
+    store = get_lineage_store()
+    if store is None:
+        return jsonify({'error': 'Lineage store is not configured, set LINEAGE_STORE_URL'}), 503
+    return jsonify(store.stats()), 200
+
+@app.route('/api/lineage/session', methods=['POST'])
+def handle_lineage_session():
+    # 会话式增量分析：只重新解析新增或修改的语句，可选只返回增量
+    data = request.get_json()
+    if not data or 'sql_query' not in data:
+        return jsonify({'error': 'Missing SQL query'}), 400
+    result, status_code = analyze_sql_lineage_incremental(data)
+    return jsonify(result), status_code
+
+@app.route('/api/lineage/session/<session_id>', methods=['DELETE'])
+def delete_lineage_session(session_id):
+    if not session_store.delete(session_id):
+        return jsonify({'error': 'Session not found or expired'}), 404
+    return jsonify({'session_id': session_id}), 200
+
+@app.route('/api/lineage/jobs', methods=['POST'])
+def submit_lineage_job():
+    # 提交异步分析任务，立即返回任务 ID
+    data = request.get_json()
+    if not data or 'sql_query' not in data:
+        return jsonify({'error': 'Missing SQL query'}), 400
+    rejected = check_sql_limits(data['sql_query'])
+    if rejected is not None:
+        return jsonify(rejected[0]), rejected[1]
+    try:
+        job = job_manager.submit(data)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/lineage/jobs/<job_id>', methods=['GET'])
+def get_lineage_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/lineage/jobs/<job_id>/result', methods=['GET'])
+def get_lineage_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job.status not in FINISHED_STATES:
+        return jsonify(job.to_dict()), 202
+    if job.status != SUCCEEDED:
+        return jsonify({'error': job.error, 'status': job.status}), 409
+    return jsonify(job.result), 200
+
+@app.route('/api/lineage/jobs/<job_id>', methods=['DELETE'])
+def cancel_lineage_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/cache/stats', methods=['GET'])
+def handle_cache_stats():
+    # 语句解析缓存的命中/未命中统计，用于评估缓存容量
+    return jsonify(get_cache_stats()), 200
+
+@app.route('/api/metadata/catalog', methods=['GET'])
+def handle_metadata_catalog_stats():
+    # 已加载的元数据目录：表数量、版本、重新加载次数和 LRU 命中率
+    return jsonify(get_catalog_stats()), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def handle_metrics():
+    # Prometheus 文本格式：各阶段耗时直方图、按接口的请求数和耗时、语句/节点/边/缓存计数
+    cache_stats = get_cache_stats()
+    gauges = {
+        'lineage_statement_cache_entries': cache_stats['entries'],
+        'lineage_statement_cache_bytes': cache_stats['bytes'],
+        'lineage_statement_cache_hit_rate': cache_stats['hit_rate']
+    }
+    return Response(metrics_registry.render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -29,4 +245,7 @@ def login():
         return jsonify({'error': '账号或密码错误'}), 401
 
 if __name__ == '__main__':
+    # 开发服务器；生产环境使用 serve.py 启动多进程服务
+    # 启动前预热常用方言的解析器，避免首个请求承担 sqlfluff 的初始化开销
+    logger.info("Prewarmed dialects: %s", prewarm_parsers())
     app.run(port=5000) 
\ No newline at end of file
@@ -0,0 +1,275 @@
+import collections
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from lineage import LINEAGE_LEVELS, check_sql_limits
+from lineage_cache import split_statements, statement_cache_keys
+from main2 import build_lineage_json_from_merged, iter_column_path_edges
+from parallel_parse import clamp_max_workers, get_statement_lineages
+from table_lineage import build_table_lineage_json_from_column_result, build_table_lineage_json_from_entries
+from parser_context import DEFAULT_DIALECT, UnsupportedDialectError, validate_dialect
+from wire_format import RESPONSE_FORMATS, encode_compact
+from reachability import graph_store
+from metadata_catalog import CATALOG_PATH
+from metrics import get_logger
+
+logger = get_logger(__name__)
+
+# --- 会话配置 (可通过环境变量覆盖) ---
+SESSION_TTL = float(os.environ.get('LINEAGE_SESSION_TTL', 3600))  # 会话空闲过期时间（秒）
+SESSION_MAX_COUNT = int(os.environ.get('LINEAGE_SESSION_MAX_COUNT', 256))  # 最多保留的会话数
+
+
+def _node_key(node: Dict) -> str:
+    return node['name']
+
+
+def _edge_key(edge: Dict) -> Tuple[str, str, str, str]:
+    return edge['from']['name'], edge['from']['field'], edge['to']['name'], edge['to']['field']
+
+
+def diff_lineage_results(old: Dict, new: Dict) -> Dict[str, List]:
+    """
+    比较两次血缘结果，返回画布可直接应用的增量：
+    新增/删除的节点和边，以及名称相同但类型、字段或位置发生变化的节点。
+    """
+    old_nodes = {_node_key(n): n for n in old.get('nodes', [])}
+    new_nodes = {_node_key(n): n for n in new.get('nodes', [])}
+    old_edges = {_edge_key(e): e for e in old.get('edges', [])}
+    new_edges = {_edge_key(e): e for e in new.get('edges', [])}
+    return {
+        'added_nodes': [n for name, n in new_nodes.items() if name not in old_nodes],
+        'updated_nodes': [n for name, n in new_nodes.items() if name in old_nodes and old_nodes[name] != n],
+        'removed_nodes': [name for name in old_nodes if name not in new_nodes],
+        'added_edges': [e for key, e in new_edges.items() if key not in old_edges],
+        'removed_edges': [e for key, e in old_edges.items() if key not in new_edges]
+    }
+
+
+def _bump(counter: collections.Counter, key, sign: int) -> None:
+    value = counter[key] + sign
+    if value:
+        counter[key] = value
+    else:
+        del counter[key]
+
+
+class LineageSession:
+    """
+    会话级的增量血缘模型。按语句哈希保存逐语句血缘，并以计数的方式维护合并后的表分类、
+    列级边和字段：脚本再次提交时只解析新增或修改的语句，删除的语句只减去其贡献。
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.last_access = time.time()
+        self.statement_keys: List[str] = []
+        self.entries: Dict[str, Dict] = {}
+        self.source_counts = collections.Counter()
+        self.target_counts = collections.Counter()
+        self.edge_counts = collections.Counter()
+        self.field_counts: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self.last_options: Optional[Tuple] = None
+        self.last_result: Dict = {'nodes': [], 'edges': []}
+
+    def _apply(self, entry: Dict, sign: int) -> None:
+        """把一条语句的贡献加入（sign=1）或移出（sign=-1）合并后的计数，计数归零的项直接删除"""
+        for t in entry['sources']:
+            _bump(self.source_counts, t, sign)
+        for t in entry['targets']:
+            _bump(self.target_counts, t, sign)
+        for col_lineage_path in entry['column_paths']:
+            for table_name, field_name in col_lineage_path:
+                fields = self.field_counts[table_name]
+                _bump(fields, field_name, sign)
+                if not fields:
+                    del self.field_counts[table_name]
+            for edge in iter_column_path_edges(col_lineage_path):
+                _bump(self.edge_counts, edge, sign)
+
+    def _merged(self) -> Dict:
+        """当前计数对应的合并视图，格式同 main2.merge_statement_lineages"""
+        return {
+            'sources': set(self.source_counts),
+            'targets': set(self.target_counts),
+            'last_intermediates': (
+                set(self.entries[self.statement_keys[-1]]['intermediates']) if self.statement_keys else set()
+            ),
+            'raw_edges': list(self.edge_counts),
+            'fields': {t: set(fields) for t, fields in self.field_counts.items()}
+        }
+
+    def update(
+            self,
+            sql_query: str,
+            filter_ctes: bool = True,
+            lineage_level: str = 'column',
+            dialect: str = DEFAULT_DIALECT,
+            parallel: bool = False,
+            max_workers: Optional[int] = None,
+            metadata_catalog: Optional[str] = None
+    ) -> Tuple[Dict, Dict[str, int]]:
+        """
+        用新脚本更新会话，只解析新增或修改的语句。元数据目录更新后语句键随之变化，所有语句会重新解析。
+
+        Returns:
+            tuple: (最新血缘结果, 统计信息 {'statements', 'reparsed', 'reused', 'removed'})
+        """
+        statements = split_statements(sql_query)
+        new_keys = [statement_cache_keys(stmt, dialect, True, metadata_catalog)[0] for stmt in statements]
+        old_counter = collections.Counter(self.statement_keys)
+        new_counter = collections.Counter(new_keys)
+        removed = old_counter - new_counter
+        added = new_counter - old_counter
+
+        # 1. 只解析会话中还没有的语句（同一脚本内重复的语句只解析一次）
+        to_parse = {}
+        for stmt, key in zip(statements, new_keys):
+            if key not in self.entries and key not in to_parse:
+                to_parse[key] = stmt
+        parsed = get_statement_lineages(
+            list(to_parse.values()), dialect=dialect,
+            parallel=parallel, max_workers=max_workers, metadata_catalog=metadata_catalog
+        )
+
+        # 2. 减去删除语句的贡献，加上新增语句的贡献
+        for key, count in removed.items():
+            for _ in range(count):
+                self._apply(self.entries[key], -1)
+        self.entries.update(zip(to_parse.keys(), parsed))
+        for key, count in added.items():
+            for _ in range(count):
+                self._apply(self.entries[key], 1)
+        for key in removed:
+            if key not in new_counter:
+                del self.entries[key]
+
+        graph_changed = bool(removed or added) or self.statement_keys[-1:] != new_keys[-1:]
+        self.statement_keys = new_keys
+        stats = {
+            'statements': len(new_keys),
+            'reparsed': len(to_parse),
+            'reused': sum((new_counter & old_counter).values()),
+            'removed': sum(removed.values())
+        }
+
+        # 3. 合并图和选项都没变时直接复用上次的结果
+        options = (filter_ctes, lineage_level)
+        if not graph_changed and options == self.last_options:
+            return self.last_result, stats
+
+        if lineage_level == 'table':
+            result = build_table_lineage_json_from_entries(
+                [self.entries[key] for key in new_keys], filter_ctes=filter_ctes
+            )
+        else:
+            result = build_lineage_json_from_merged(self._merged(), filter_ctes=filter_ctes)
+            if lineage_level == 'both':
+                result['table'] = build_table_lineage_json_from_column_result(
+                    result, [self.entries[key] for key in new_keys], filter_ctes=filter_ctes
+                )
+        self.last_options = options
+        self.last_result = result
+        return result, stats
+
+
+class LineageSessionStore:
+    """按会话 ID 保存 LineageSession，空闲超时或数量超限时淘汰最久未使用的会话"""
+
+    def __init__(self, ttl: float = SESSION_TTL, max_count: int = SESSION_MAX_COUNT):
+        self.ttl = ttl
+        self.max_count = max_count
+        self._sessions: 'collections.OrderedDict[str, LineageSession]' = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: Optional[str] = None) -> LineageSession:
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, s in self._sessions.items() if now - s.last_access > self.ttl]:
+                del self._sessions[sid]
+            session = self._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = LineageSession()
+                self._sessions[session.id] = session
+                while len(self._sessions) > self.max_count:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session.id)
+            session.last_access = now
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+# 进程级共享会话存储
+session_store = LineageSessionStore()
+
+
+def analyze_sql_lineage_incremental(data: Dict) -> Tuple[Dict, int]:
+    """
+    会话式增量血缘分析接口。
+
+    请求体JSON格式:
+    {
+        "session_id": "会话ID",  # 可选，不传或已过期时创建新会话
+        "sql_query": "SQL查询语句",
+        "filter_ctes": true/false,
+        "lineage_level": "table"/"column"/"both",
+        "dialect": "ansi",  # 可选
+        "use_metadata": true/false,  # 可选，默认true，配置了 LINEAGE_METADATA_CATALOG 时使用元数据目录
+        "delta": true/false,  # 可选，默认false，为true时只返回相对上次结果的增量
+        "format": "json"/"compact"  # 可选，非增量响应的格式，见 wire_format.encode_compact
+    }
+    """
+    if not data or 'sql_query' not in data:
+        return {'error': 'Missing required parameter: sql_query'}, 400
+    rejected = check_sql_limits(data['sql_query'])
+    if rejected is not None:
+        return rejected
+    response_format = data.get('format', 'json')
+    if response_format not in RESPONSE_FORMATS:
+        return {'error': f'Unsupported format: {response_format}'}, 400
+    lineage_level = data.get('lineage_level', 'column')
+    if lineage_level not in LINEAGE_LEVELS:
+        return {'error': f'Unsupported lineage_level: {lineage_level}'}, 400
+    try:
+        max_workers = clamp_max_workers(data.get('max_workers'))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    try:
+        session = session_store.get_or_create(data.get('session_id'))
+        with session.lock:
+            previous = session.last_result
+            result, stats = session.update(
+                data['sql_query'],
+                filter_ctes=data.get('filter_ctes', True),
+                lineage_level=lineage_level,
+                dialect=validate_dialect(data.get('dialect') or DEFAULT_DIALECT),
+                parallel=bool(data.get('parallel', False)),
+                max_workers=max_workers,
+                metadata_catalog=CATALOG_PATH if CATALOG_PATH and data.get('use_metadata', True) else None
+            )
+    except UnsupportedDialectError as e:
+        return {'error': str(e)}, 400
+    except Exception as e:
+        logger.exception("Error in analyze_sql_lineage_incremental")
+        return {'error': str(e)}, 500
+
+    response = {'session_id': session.id, 'stats': stats, 'graph_id': graph_store.register(result)}
+    if data.get('delta', False):
+        response['delta'] = diff_lineage_results(previous, result)
+        # 表级视图很小，增量模式下也整体返回
+        if 'table' in result:
+            response['table'] = result['table']
+    elif response_format == 'compact':
+        compact = dict(result, table=encode_compact(result['table'])) if 'table' in result else result
+        response.update(encode_compact(compact))
+    else:
+        response.update(result)
+    return response, 200
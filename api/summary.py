@@ -0,0 +1,192 @@
+"""
+血缘图的多级概要视图：在表级图上把 Middle 表组成的线性链收缩为一个超级节点（chains），
+或按 schema 前缀把表归为一组（schemas），组间的列级边按表对聚合并计数，再对概要图重新分层布局。
+所有级别在首次请求时一起计算并随血缘图缓存，前端切换级别时不需要重新分析，也不需要先渲染全部节点。
+"""
+import collections
+from typing import Callable, Dict, List, Optional, Tuple
+
+from layering import assign_table_layers
+from layout import compute_layered_layout
+from main2 import LAYER_HORIZONTAL_SPACING, NODE_BASE_HEIGHT, NODE_VERTICAL_SPACING, START_X, START_Y
+from reachability import graph_store
+
+SUMMARY_LEVELS = ('chains', 'schemas')
+CHAIN_MIN_LENGTH = 2  # 至少这么多张 Middle 表相连才收缩为链节点
+GROUP_SUFFIX = '.*'  # schema 分组节点名为 '<schema>.*'，不会与表名冲突
+
+
+def _table_edge_counts(edges) -> 'collections.Counter[Tuple[str, str]]':
+    """列级边按 (from_table, to_table) 聚合计数，同表内的边忽略"""
+    return collections.Counter((from_t, to_t) for from_t, _, to_t, _ in edges if from_t != to_t)
+
+
+def find_middle_chains(nodes: List[Dict], table_edges) -> List[List[str]]:
+    """
+    找出 Middle 表组成的极大线性链：链上每张表恰有一个上游表和一个下游表，按上下游顺序返回。
+    全部由此类表组成的环没有起点，不做收缩。
+    """
+    succ: Dict[str, set] = collections.defaultdict(set)
+    pred: Dict[str, set] = collections.defaultdict(set)
+    for from_t, to_t in table_edges:
+        succ[from_t].add(to_t)
+        pred[to_t].add(from_t)
+    linear = {
+        node['name'] for node in nodes
+        if node['type'] == 'Middle' and len(pred[node['name']]) == 1 and len(succ[node['name']]) == 1
+    }
+    chains = []
+    for name in sorted(linear):
+        # 上游也是线性 Middle 表时，name 在该上游开始的链中
+        if next(iter(pred[name])) in linear:
+            continue
+        chain = [name]
+        while True:
+            nxt = next(iter(succ[chain[-1]]))
+            if nxt not in linear:
+                break
+            chain.append(nxt)
+        if len(chain) >= CHAIN_MIN_LENGTH:
+            chains.append(chain)
+    return chains
+
+
+def schema_group(table: str) -> Optional[str]:
+    """表所属的 schema 分组节点名；不含 '.' 的名称（如 CTE）没有 schema，返回 None"""
+    return table.rsplit('.', 1)[0] + GROUP_SUFFIX if '.' in table else None
+
+
+def _summarize(
+        nodes: List[Dict],
+        table_edges: 'collections.Counter[Tuple[str, str]]',
+        group_of: Callable[[str], Optional[str]]
+) -> Dict:
+    """
+    按 group_of 把表归入概要节点（返回 None 的表保持独立），聚合组间的边并重新布局。
+
+    Returns:
+        dict: 折叠格式的 'nodes' 和 'edges'；节点带 members（组内表名）和 field_count，边的 count 为被聚合的列级边数
+    """
+    members: Dict[str, List[Dict]] = collections.defaultdict(list)
+    node_group: Dict[str, str] = {}
+    for node in nodes:
+        group = group_of(node['name']) or node['name']
+        node_group[node['name']] = group
+        members[group].append(node)
+
+    group_edges: 'collections.Counter[Tuple[str, str]]' = collections.Counter()
+    internal_edges: 'collections.Counter[str]' = collections.Counter()
+    for (from_t, to_t), count in table_edges.items():
+        u, v = node_group.get(from_t), node_group.get(to_t)
+        if u is None or v is None:
+            continue
+        if u == v:
+            internal_edges[u] += count
+        else:
+            group_edges[(u, v)] += count
+
+    group_types = {}
+    for group, group_nodes in members.items():
+        types = collections.Counter(node['type'] for node in group_nodes)
+        # 混合类型的组按中间节点着色，各类型的数量见 member_types
+        group_types[group] = next(iter(types)) if len(types) == 1 else 'Middle'
+    groups = set(members)
+    layers, _, _ = assign_table_layers(
+        groups,
+        group_edges,
+        {g for g in groups if group_types[g] == 'Origin'},
+        {g for g in groups if group_types[g] == 'RS'}
+    )
+    positions, _ = compute_layered_layout(
+        layers,
+        group_edges,
+        {g: NODE_BASE_HEIGHT for g in groups},
+        sort_key=lambda g: (-len(members[g]), g),
+        start_x=START_X,
+        start_y=START_Y,
+        layer_spacing=LAYER_HORIZONTAL_SPACING,
+        node_spacing=NODE_VERTICAL_SPACING
+    )
+
+    type_order = {"Origin": 0, "Middle": 1, "RS": 2}
+    summary_nodes = []
+    for group in sorted(groups):
+        group_nodes = members[group]
+        left, top = positions[group]
+        summary_nodes.append({
+            'name': group,
+            'type': group_types[group],
+            'fields': [],
+            # 折叠字段的结果中节点只有 field_count，fields 为空
+            'field_count': sum(node.get('field_count', len(node['fields'])) for node in group_nodes),
+            'collapsed': True,
+            'members': [node['name'] for node in group_nodes],
+            'member_types': dict(collections.Counter(node['type'] for node in group_nodes)),
+            'internal_edge_count': internal_edges[group],
+            'left': left,
+            'top': top
+        })
+    summary_nodes.sort(key=lambda n: (type_order.get(n['type'], 99), n['left'], n['top']))
+    return {
+        'nodes': summary_nodes,
+        'edges': [
+            {'from': {'field': '', 'name': u}, 'to': {'field': '', 'name': v}, 'count': count}
+            for (u, v), count in sorted(group_edges.items())
+        ]
+    }
+
+
+def summarize_lineage_graph(nodes: List[Dict], edges) -> Dict[str, Dict]:
+    """
+    计算全部概要级别。
+
+    Args:
+        nodes: 血缘结果的节点（需带 name/type/fields）
+        edges: 列级边 (from_table, from_field, to_table, to_field)
+
+    Returns:
+        dict: 级别 -> {'nodes', 'edges', 'stats'}；chains 中链节点名为 '<首表>..<末表>'，schemas 中分组节点名为 '<schema>.*'
+    """
+    table_edges = _table_edge_counts(edges)
+    chain_of = {}
+    for chain in find_middle_chains(nodes, table_edges):
+        name = f'{chain[0]}..{chain[-1]}'
+        for table in chain:
+            chain_of[table] = name
+    summaries = {
+        'chains': _summarize(nodes, table_edges, chain_of.get),
+        'schemas': _summarize(nodes, table_edges, schema_group)
+    }
+    for summary in summaries.values():
+        summary['stats'] = {
+            'nodes': len(summary['nodes']),
+            'edges': len(summary['edges']),
+            'source_nodes': len(nodes),
+            'source_edges': len(table_edges)
+        }
+    return summaries
+
+
+def get_graph_summaries(graph_id: str) -> Optional[Dict[str, Dict]]:
+    """取血缘图的全部概要级别，首次请求时计算并随图缓存；图不存在或已过期时返回 None"""
+    graph = graph_store.get_graph(graph_id)
+    if graph is None:
+        return None
+    with graph['lock']:
+        if graph.get('summaries') is None:
+            graph['summaries'] = summarize_lineage_graph(graph['nodes'], graph['edges'])
+        return graph['summaries']
+
+
+def get_graph_summary(graph_id: str, level: Optional[str] = None) -> Tuple[Dict, int]:
+    """
+    概要视图查询：level 为空时返回全部级别，否则只返回指定级别。
+    """
+    if level is not None and level not in SUMMARY_LEVELS:
+        return {'error': f'Unsupported summary level: {level}, expected one of {list(SUMMARY_LEVELS)}'}, 400
+    summaries = get_graph_summaries(graph_id)
+    if summaries is None:
+        return {'error': 'Lineage graph not found or expired, please re-run the analysis'}, 404
+    if level is None:
+        return {'graph_id': graph_id, 'levels': summaries}, 200
+    return {'graph_id': graph_id, 'level': level, **summaries[level]}, 200
@@ -1,6 +1,13 @@
-from typing import Dict, List, Set, Union
-from sqllineage.runner import LineageRunner
-import traceback
+from typing import Dict, List, Optional, Set, Tuple, Union
+from lineage_cache import split_statements
+from parser_context import DEFAULT_DIALECT
+from parallel_parse import get_statement_lineages
+from fast_table_lineage import scan_table_lineage
+from layering import assign_table_layers
+from layout import compute_layered_layout
+from metrics import count, get_logger, stage
+
+logger = get_logger(__name__)
 
 # --- 布局常量 ---
 NODE_BASE_HEIGHT = 60  # 节点基础高度
@@ -8,10 +15,17 @@ NODE_VERTICAL_SPACING = 20  # 同一列中节点之间的垂直间距
 LAYER_HORIZONTAL_SPACING = 850  # 不同列之间节点的水平间距
 START_X = 20  # 起始 X 坐标
 START_Y = 20  # 起始 Y 坐标
+TABLE_TIERS = ('auto', 'full')  # auto: 先用轻量扫描，无法可靠判断的语句回退到完整解析器；full: 全部使用完整解析器
 
 def get_table_lineage_json(
         sql_query: str,
-        filter_ctes: bool = True
+        filter_ctes: bool = True,
+        dialect: str = DEFAULT_DIALECT,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        table_tier: str = 'auto',
+        metadata_catalog: Optional[str] = None
 ) -> Dict[str, List[Dict]]:
     """
     解析 SQL 查询，使用 sqllineage 生成表级血缘关系数据。
@@ -19,15 +33,86 @@ def get_table_lineage_json(
     Args:
         sql_query (str): 要解析的 SQL 查询字符串
         filter_ctes (bool): 是否过滤 CTE（只显示物理表）
+        dialect (str): SQL 方言，默认 ansi
+        parallel (bool): 是否使用共享进程池并行解析语句
+        max_workers (int): 并行解析的工作进程数
+        chunk_size (int): 每次派发给工作进程的语句数
+        table_tier (str): 'auto' 或 'full'
+        metadata_catalog (str): 元数据目录文件路径，仅对交给完整解析器的语句生效
     
     Returns:
-        dict: 包含 'edges' 和 'nodes' 列表的字典
+        dict: 包含 'edges'、'nodes' 列表以及每条语句处理层级 'statement_tiers'（'fast'/'full'）的字典
     """
     try:
+        if table_tier not in TABLE_TIERS:
+            raise ValueError(f'Unsupported table_tier: {table_tier}')
         # 分割多个SQL语句
-        statements = sql_query.strip().split(';')
-        statements = [stmt.strip() for stmt in statements if stmt.strip()]
-        
+        statements = split_statements(sql_query)
+        count('statements', len(statements))
+        entries, tiers = get_table_statement_lineages(
+            statements, dialect=dialect, parallel=parallel, max_workers=max_workers,
+            chunk_size=chunk_size, table_tier=table_tier, metadata_catalog=metadata_catalog
+        )
+
+        result = build_table_lineage_json_from_entries(entries, filter_ctes=filter_ctes)
+        result['statement_tiers'] = tiers
+        return result
+    except Exception:
+        logger.exception("Error in get_table_lineage_json")
+        raise
+
+
+def get_table_statement_lineages(
+        statements: List[str],
+        dialect: str = DEFAULT_DIALECT,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        table_tier: str = 'auto',
+        metadata_catalog: Optional[str] = None
+) -> Tuple[List[Dict], List[str]]:
+    """
+    获取逐语句的表级血缘记录：简单语句先用轻量扫描，只有无法可靠判断的语句才交给完整解析器。
+
+    Returns:
+        tuple: (按语句顺序排列的血缘记录, 每条语句的处理层级 'fast'/'full')
+    """
+    entries: List[Optional[Dict]] = [None] * len(statements)
+    tiers = ['full'] * len(statements)
+    if table_tier == 'auto':
+        with stage('fast_scan'):
+            for i, stmt in enumerate(statements):
+                entries[i] = scan_table_lineage(stmt, dialect)
+                if entries[i] is not None:
+                    tiers[i] = 'fast'
+    fallback = [i for i, entry in enumerate(entries) if entry is None]
+
+    # 表级只需要表信息，命中缓存时跳过解析
+    full_entries = get_statement_lineages(
+        [statements[i] for i in fallback], dialect=dialect, with_columns=False,
+        parallel=parallel, max_workers=max_workers, chunk_size=chunk_size,
+        metadata_catalog=metadata_catalog
+    )
+    for i, entry in zip(fallback, full_entries):
+        entries[i] = entry
+    return entries, tiers
+
+
+def build_table_lineage_json_from_entries(
+        entries: List[Dict],
+        filter_ctes: bool = True
+) -> Dict[str, List[Dict]]:
+    """
+    根据已提取的逐语句血缘记录生成表级血缘关系数据。
+    
+    Args:
+        entries (list): 按语句顺序排列的血缘记录（只需要表信息）
+        filter_ctes (bool): 是否过滤 CTE（只显示物理表）
+    
+    Returns:
+        dict: 包含 'edges' 和 'nodes' 列表的字典
+    """
+    try:
         # 存储所有表的信息
         all_source_tables = set()
         all_target_tables = set()
@@ -35,16 +120,11 @@ def get_table_lineage_json(
         edges_set = set()  # 用于存储唯一的边
         
         # 处理每个SQL语句
-        for stmt in statements:
-            if not stmt:
-                continue
-                
-            runner = LineageRunner(sql=stmt, verbose=False)
-            
+        for entry in entries:
             # 收集源表和目标表
-            current_sources = {str(t) for t in runner.source_tables}
-            current_targets = {str(t) for t in runner.target_tables}
-            current_intermediates = {str(t) for t in runner.intermediate_tables}
+            current_sources = set(entry['sources'])
+            current_targets = set(entry['targets'])
+            current_intermediates = set(entry['intermediates'])
             
             # 更新全局集合
             all_source_tables.update(current_sources)
@@ -64,80 +144,113 @@ def get_table_lineage_json(
             all_target_tables.difference_update(tables_as_both)
             all_intermediate_tables.update(tables_as_both)
         
-        # 确定要显示的表集合
-        tables_to_display = set()
-        tables_to_display.update(all_source_tables)
-        tables_to_display.update(all_target_tables)
-        
-        if filter_ctes:
-            # 只添加物理中间表（包含点号的表名）
-            physical_intermediates = {t for t in all_intermediate_tables if '.' in t}
-            tables_to_display.update(physical_intermediates)
-        else:
-            # 添加所有中间表
-            tables_to_display.update(all_intermediate_tables)
-        
-        # 生成节点列表
-        nodes_list = []
-        current_y = START_Y
-        
-        # 首先添加源表
-        for table_name in sorted(all_source_tables):
-            nodes_list.append({
-                "name": table_name,
-                "type": "Origin",
-                "fields": [],  # 表级血缘不显示字段
-                "left": START_X,
-                "top": current_y
-            })
-            current_y += NODE_BASE_HEIGHT + NODE_VERTICAL_SPACING
-        
-        # 然后添加中间表
-        intermediates_to_show = set()
         if filter_ctes:
+            # 只显示物理中间表（包含点号的表名）
             intermediates_to_show = {t for t in all_intermediate_tables if '.' in t}
         else:
+            # 显示所有中间表
             intermediates_to_show = all_intermediate_tables
-            
-        current_y = START_Y
-        for table_name in sorted(intermediates_to_show):
+        return _render_table_graph(all_source_tables, intermediates_to_show, all_target_tables, edges_set)
+
+    except Exception:
+        logger.exception("Error in build_table_lineage_json_from_entries")
+        raise 
+
+
+def build_table_lineage_json_from_column_result(
+        column_result: Dict[str, List[Dict]],
+        entries: List[Dict],
+        filter_ctes: bool = True
+) -> Dict[str, List[Dict]]:
+    """
+    由列级血缘结果推导表级血缘图（lineage_level 为 'both' 时使用），不再单独解析语句。
+    节点集合和 Origin/Middle/RS 分类沿用列级结果，保证两个视图切换时一致；
+    边为列级边按表对聚合（已投影穿过隐藏的 CTE），再补上语句级的源表到目标表的边（如只出现在 WHERE 中的表）。
+    
+    Args:
+        column_result (dict): build_lineage_json_from_entries 的结果（节点需带类型，字段可已折叠）
+        entries (list): 生成该结果的逐语句血缘记录
+        filter_ctes (bool): 是否过滤 CTE（只显示物理表），须与生成列级结果时一致
+    
+    Returns:
+        dict: 与 build_table_lineage_json_from_entries 相同格式的字典
+    """
+    table_types = {node['name']: node['type'] for node in column_result['nodes']}
+    edges_set = {(edge['from']['name'], edge['to']['name']) for edge in column_result['edges']}
+    statement_sources = set()
+    statement_targets = set()
+    for entry in entries:
+        statement_sources.update(entry['sources'])
+        statement_targets.update(entry['targets'])
+        edges_set.update((source, target) for target in entry['targets'] for source in entry['sources'])
+
+    # 列级结果中没有字段流经的表（既是源表又是目标表）按表级规则作为中间表补充
+    for table in (statement_sources & statement_targets) - set(table_types):
+        if '.' in table or not filter_ctes:
+            table_types[table] = 'Middle'
+
+    tables_by_type = {'Origin': set(), 'Middle': set(), 'RS': set()}
+    for table, table_type in table_types.items():
+        tables_by_type[table_type].add(table)
+    return _render_table_graph(tables_by_type['Origin'], tables_by_type['Middle'], tables_by_type['RS'], edges_set)
+
+
+def _render_table_graph(
+        source_tables: Set[str],
+        intermediate_tables: Set[str],
+        target_tables: Set[str],
+        edges_set: Set[Tuple[str, str]]
+) -> Dict[str, List[Dict]]:
+    """对要显示的表分层、布局，生成节点和两端都可见的边"""
+    tables_to_display = set()
+    tables_to_display.update(source_tables)
+    tables_to_display.update(target_tables)
+    tables_to_display.update(intermediate_tables)
+
+    # 按真实深度分层，层内用交叉消减布局
+    with stage('layering'):
+        table_layers, _, back_edges = assign_table_layers(
+            tables_to_display, edges_set, source_tables, target_tables
+        )
+    with stage('layout'):
+        positions, _ = compute_layered_layout(
+            table_layers,
+            edges_set,
+            {t: NODE_BASE_HEIGHT for t in tables_to_display},
+            sort_key=lambda t: t,
+            start_x=START_X,
+            start_y=START_Y,
+            layer_spacing=LAYER_HORIZONTAL_SPACING,
+            node_spacing=NODE_VERTICAL_SPACING
+        )
+
+    # 生成节点列表：依次为源表、中间表、目标表
+    nodes_list = []
+    for table_type, tables in (('Origin', source_tables), ('Middle', intermediate_tables), ('RS', target_tables)):
+        for table_name in sorted(tables):
+            left, top = positions[table_name]
             nodes_list.append({
                 "name": table_name,
-                "type": "Middle",
-                "fields": [],
-                "left": START_X + LAYER_HORIZONTAL_SPACING,
-                "top": current_y
+                "type": table_type,
+                "fields": [],  # 表级血缘不显示字段
+                "left": left,
+                "top": top
             })
-            current_y += NODE_BASE_HEIGHT + NODE_VERTICAL_SPACING
-        
-        # 最后添加目标表
-        current_y = START_Y
-        for table_name in sorted(all_target_tables):
-            nodes_list.append({
-                "name": table_name,
-                "type": "RS",
-                "fields": [],
-                "left": START_X + LAYER_HORIZONTAL_SPACING * 2,
-                "top": current_y
+
+    # 生成边列表
+    edges_list = []
+    for source, target in sorted(edges_set):
+        # 只添加连接到要显示的表的边
+        if source in tables_to_display and target in tables_to_display:
+            edges_list.append({
+                "from": {"field": "", "name": source},
+                "to": {"field": "", "name": target}
             })
-            current_y += NODE_BASE_HEIGHT + NODE_VERTICAL_SPACING
-        
-        # 生成边列表
-        edges_list = []
-        for source, target in sorted(edges_set):
-            # 只添加连接到要显示的表的边
-            if source in tables_to_display and target in tables_to_display:
-                edges_list.append({
-                    "from": {"field": "", "name": source},
-                    "to": {"field": "", "name": target}
-                })
-        
-        return {
-            "nodes": nodes_list,
-            "edges": edges_list
-        }
-        
-    except Exception as e:
-        print(f"Error in get_table_lineage_json: {str(e)}")
-        traceback.print_exc()
-        raise 
\ No newline at end of file
+
+    result = {
+        "nodes": nodes_list,
+        "edges": edges_list
+    }
+    if back_edges:
+        result["back_edges"] = [list(edge) for edge in back_edges]
+    return result
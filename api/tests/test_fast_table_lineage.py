@@ -0,0 +1,66 @@
+"""轻量表级扫描（fast_table_lineage）与完整解析器的一致性：扫描器要么给出与完整解析器相同的结果，要么回退"""
+import pytest
+
+from fast_table_lineage import scan_table_lineage
+from lineage_cache import extract_statement_lineage
+
+
+def full_tier(stmt, dialect):
+    try:
+        record = extract_statement_lineage(stmt, dialect=dialect, with_columns=False)
+    except Exception:
+        return None
+    return set(record['sources']), set(record['targets'])
+
+
+def fast_tier(stmt, dialect):
+    record = scan_table_lineage(stmt, dialect=dialect)
+    if record is None:
+        return None
+    return set(record['sources']), set(record['targets'])
+
+
+FAST_PATH_CASES = [
+    ('ansi', 'SELECT a FROM db.s'),
+    ('ansi', 'INSERT INTO db.t SELECT a, b FROM db.s s JOIN db.u u ON s.id = u.id'),
+    ('ansi', 'INSERT INTO db.t (a, b) SELECT a, b FROM db.s'),
+    ('ansi', 'INSERT INTO db.t SELECT x.a FROM (SELECT a FROM db.s) x LEFT JOIN db.u ON x.a = db.u.a'),
+    ('ansi', 'WITH c AS (SELECT a FROM db.s) INSERT INTO db.t SELECT a FROM c'),
+    ('ansi', 'CREATE TABLE db.t AS SELECT a FROM db.s, db.u WHERE s.a = u.a'),
+    ('mysql', 'INSERT INTO db.t SELECT a FROM db.s LEFT OUTER JOIN db.u ON s.id = u.id'),
+    ('hive', 'INSERT OVERWRITE TABLE db.t PARTITION (dt = 1) SELECT a FROM db.s'),
+    ('sparksql', 'INSERT INTO db.t SELECT a FROM db.s FULL OUTER JOIN db.u ON s.id = u.id'),
+]
+
+FALLBACK_CASES = [
+    ('ansi', 'SELECT a, (SELECT max(b) FROM db.u) FROM db.s'),
+    ('ansi', 'INSERT INTO db.t SELECT a FROM db.s GROUP BY a HAVING count(*) > (SELECT count(*) FROM db.u)'),
+    ('ansi', 'INSERT INTO db.t SELECT a FROM db.s WHERE a = ANY (SELECT a FROM db.u)'),
+    ('ansi', 'INSERT INTO db.t SELECT a FROM db.s WHERE a IN (SELECT a FROM db.u)'),
+    ('ansi', 'INSERT INTO db.t SELECT a FROM db.s LEFT SEMI JOIN db.u ON s.a = u.a'),
+    ('mysql', 'INSERT INTO db.t SELECT a FROM db.s LEFT SEMI JOIN db.u ON s.a = u.a'),
+    ('ansi', 'INSERT INTO db.t SELECT a FROM db.s NATURAL JOIN db.u'),
+    ('hive', 'INSERT INTO db.t (a, b) SELECT a, b FROM db.s'),
+    ('mysql', 'INSERT INTO db.t SELECT x.a FROM (SELECT a FROM db.s) AS x(a)'),
+    ('mysql', 'INSERT INTO db.t SELECT x.a FROM db.s AS x(a, b)'),
+    ('clickhouse', 'CREATE TABLE db.t AS SELECT a FROM db.s'),
+    ('trino', 'INSERT INTO db.t SELECT a FROM db.s'),
+]
+
+
+@pytest.mark.parametrize('dialect,stmt', FAST_PATH_CASES)
+def test_fast_tier_matches_full_parser(dialect, stmt):
+    fast = fast_tier(stmt, dialect)
+    assert fast is not None
+    assert fast == full_tier(stmt, dialect)
+
+
+@pytest.mark.parametrize('dialect,stmt', FALLBACK_CASES)
+def test_fast_tier_falls_back_when_unsure(dialect, stmt):
+    assert fast_tier(stmt, dialect) is None
+
+
+def test_scalar_subquery_is_not_a_source_in_full_parser():
+    # 完整解析器不把 SELECT 列表中的标量子查询计入源表，扫描器若按 FROM 收集会多出 db.u
+    stmt = 'SELECT a, (SELECT max(b) FROM db.u) FROM db.s'
+    assert full_tier(stmt, 'ansi') == ({'db.s'}, set())
@@ -0,0 +1,34 @@
+"""语句缓存键：只在排版或注释上不同的语句共用缓存键，引号内的内容和方言、选项参与区分"""
+import pytest
+
+from lineage_cache import make_cache_key, normalize_statement
+
+
+@pytest.mark.parametrize('stmt,expected', [
+    ('SELECT  a,\n\tb FROM t', 'SELECT a, b FROM t'),
+    ('  SELECT a FROM t  ', 'SELECT a FROM t'),
+    ('SELECT a -- comment\nFROM t', 'SELECT a FROM t'),
+    ('SELECT a /* multi\nline */ FROM t', 'SELECT a FROM t'),
+    ("SELECT '--  not a comment' FROM t", "SELECT '--  not a comment' FROM t"),
+    ('SELECT "a  /* b */" FROM t', 'SELECT "a  /* b */" FROM t'),
+    ("SELECT 'it''s  --' FROM t", "SELECT 'it''s  --' FROM t"),
+    ('SELECT `a  b` FROM t', 'SELECT `a  b` FROM t'),
+])
+def test_normalize_statement(stmt, expected):
+    assert normalize_statement(stmt) == expected
+
+
+def test_line_comment_does_not_swallow_next_line():
+    assert normalize_statement('SELECT a -- x\nFROM db.s') != normalize_statement('SELECT a -- x FROM db.s')
+
+
+def test_cache_key_ignores_layout_and_comments():
+    base = make_cache_key('INSERT INTO db.t SELECT a FROM db.s')
+    assert make_cache_key('-- daily load\nINSERT INTO db.t\n  SELECT a\n  FROM db.s  /* src */') == base
+
+
+def test_cache_key_distinguishes_literals_dialect_and_options():
+    base = make_cache_key("SELECT a FROM t WHERE b = 'x y'")
+    assert make_cache_key("SELECT a FROM t WHERE b = 'x  y'") != base
+    assert make_cache_key("SELECT a FROM t WHERE b = 'x y'", 'hive') != base
+    assert make_cache_key("SELECT a FROM t WHERE b = 'x y'", columns=False) != base
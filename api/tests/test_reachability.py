@@ -0,0 +1,60 @@
+"""可达性索引与 /api/lineage/query：位图闭包、超过分量上限时的 BFS 回退和参数校验"""
+import pytest
+
+from reachability import ReachabilityIndex, graph_store, query_lineage
+
+# a.x -> b.x -> c.x -> d.x，c.x 与 e.x 成环，f.y 是与其他列无关的分量
+EDGES = [
+    ('db.a', 'x', 'db.b', 'x'),
+    ('db.b', 'x', 'db.c', 'x'),
+    ('db.c', 'x', 'db.d', 'x'),
+    ('db.c', 'x', 'db.e', 'x'),
+    ('db.e', 'x', 'db.c', 'x'),
+    ('db.f', 'y', 'db.g', 'y'),
+]
+
+
+def names(index, nodes):
+    return {'.'.join(index.columns[n]) for n in nodes}
+
+
+@pytest.mark.parametrize('max_components', [10000, 0])
+def test_closure_follows_edge_direction(max_components):
+    index = ReachabilityIndex(EDGES, max_components=max_components)
+    assert (index.descendants is None) == (max_components == 0)
+    starts = index.resolve('db.b', 'x')
+    assert names(index, index.query(starts, 'downstream')) == {'db.b.x', 'db.c.x', 'db.d.x', 'db.e.x'}
+    assert names(index, index.query(starts, 'upstream')) == {'db.a.x', 'db.b.x'}
+    assert names(index, index.query(starts, 'both')) == {'db.a.x', 'db.b.x', 'db.c.x', 'db.d.x', 'db.e.x'}
+    assert names(index, index.query(starts, 'downstream', depth=1)) == {'db.b.x', 'db.c.x'}
+    # 环内的列互为上下游
+    cycle = index.resolve('db.e', 'x')
+    assert names(index, index.query(cycle, 'upstream')) == {'db.a.x', 'db.b.x', 'db.c.x', 'db.e.x'}
+
+
+def test_bitset_and_bfs_agree_on_every_column():
+    full = ReachabilityIndex(EDGES)
+    bfs = ReachabilityIndex(EDGES, max_components=0)
+    for node in range(len(full.columns)):
+        for direction in ('upstream', 'downstream', 'both'):
+            assert full.query([node], direction) == bfs.query([node], direction)
+
+
+def test_query_lineage_endpoint():
+    graph_store.add('test-reachability', EDGES, [])
+    response, status = query_lineage({'graph_id': 'test-reachability', 'table': 'db.d', 'field': 'x',
+                                      'direction': 'upstream'})
+    assert status == 200
+    assert response['tables'] == ['db.a', 'db.b', 'db.c', 'db.d', 'db.e']
+    assert {'from': {'field': 'x', 'name': 'db.c'}, 'to': {'field': 'x', 'name': 'db.d'}} in response['edges']
+
+
+@pytest.mark.parametrize('depth', [True, -1, 1.5, '2'])
+def test_query_lineage_rejects_invalid_depth(depth):
+    _, status = query_lineage({'graph_id': 'test-reachability', 'table': 'db.d', 'depth': depth})
+    assert status == 400
+
+
+def test_query_lineage_unknown_graph():
+    _, status = query_lineage({'graph_id': 'missing', 'table': 'db.d'})
+    assert status == 404
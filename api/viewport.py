@@ -0,0 +1,166 @@
+import bisect
+import collections
+from typing import Dict, List, Tuple
+
+from main2 import FIELD_HEIGHT, NODE_BASE_HEIGHT, NODE_WIDTH
+from reachability import graph_store
+
+
+def collapse_lineage_result(result: Dict) -> Dict:
+    """
+    把血缘结果折叠为只含字段数量的节点：字段列表清空并给出 field_count，
+    列级边按表对聚合为一条边（field 为空字符串），count 为被聚合的列级边数量。
+    """
+    nodes = [
+        {
+            'name': node['name'],
+            'type': node['type'],
+            'fields': [],
+            'field_count': len(node.get('fields', [])),
+            'collapsed': True,
+            'left': node['left'],
+            'top': node['top']
+        }
+        for node in result.get('nodes', [])
+    ]
+    table_edges = collections.Counter(
+        (edge['from']['name'], edge['to']['name']) for edge in result.get('edges', [])
+    )
+    edges = [
+        {'from': {'field': '', 'name': from_t}, 'to': {'field': '', 'name': to_t}, 'count': count}
+        for (from_t, to_t), count in sorted(table_edges.items())
+    ]
+    collapsed = {k: v for k, v in result.items() if k not in ('nodes', 'edges')}
+    collapsed.update({'nodes': nodes, 'edges': edges})
+    return collapsed
+
+
+def _node_height(node: Dict, collapsed: bool) -> int:
+    return NODE_BASE_HEIGHT + (0 if collapsed else len(node.get('fields', []))) * FIELD_HEIGHT
+
+
+def _get_spatial_index(graph: Dict) -> Dict:
+    """
+    按列（left 相同的节点）建立空间索引：同一列内节点自上而下排列互不重叠，
+    按 top 排序后即可二分查找与视口相交的区间。
+    """
+    with graph['lock']:
+        if graph['spatial'] is None:
+            columns: Dict[int, List[Tuple[int, int, int]]] = collections.defaultdict(list)
+            for i, node in enumerate(graph['nodes']):
+                bottom = node['top'] + _node_height(node, graph['collapsed'])
+                columns[node['left']].append((node['top'], bottom, i))
+            for items in columns.values():
+                items.sort()
+            graph['spatial'] = {
+                'lefts': sorted(columns),
+                'columns': {left: items for left, items in columns.items()},
+                'tops': {left: [top for top, _, _ in items] for left, items in columns.items()},
+                'max_height': max(
+                    (bottom - top for items in columns.values() for top, bottom, _ in items), default=0
+                )
+            }
+        return graph['spatial']
+
+
+def _get_table_index(graph: Dict) -> Dict:
+    """
+    按表建立节点和边的索引：表名 -> 节点下标，表名 -> 一端在该表上的列级边下标（升序，即 graph['edges'] 中的顺序）。
+    """
+    with graph['lock']:
+        if graph['tables'] is None:
+            table_edges: Dict[str, List[int]] = collections.defaultdict(list)
+            for i, (from_t, _, to_t, _) in enumerate(graph['edges']):
+                table_edges[from_t].append(i)
+                if to_t != from_t:
+                    table_edges[to_t].append(i)
+            graph['tables'] = {
+                'nodes': {node['name']: i for i, node in enumerate(graph['nodes'])},
+                'edges': dict(table_edges)
+            }
+        return graph['tables']
+
+
+def _missing_graph() -> Tuple[Dict, int]:
+    return {'error': 'Lineage graph not found or expired, please re-run the analysis'}, 404
+
+
+def get_table_fields(graph_id: str, table: str) -> Tuple[Dict, int]:
+    """
+    按需获取一张表的字段和与之相连的列级边，用于展开折叠节点。
+    """
+    graph = graph_store.get_graph(graph_id)
+    if graph is None:
+        return _missing_graph()
+    tables = _get_table_index(graph)
+    node_index = tables['nodes'].get(table)
+    if node_index is None:
+        return {'error': f'Table not found in lineage graph: {table}'}, 404
+
+    node = graph['nodes'][node_index]
+    edges = sorted(set(graph['edges'][i] for i in tables['edges'].get(table, ())))
+    return {
+        'graph_id': graph_id,
+        'name': table,
+        'type': node['type'],
+        'fields': node.get('fields', []),
+        'edges': [
+            {'from': {'field': from_f, 'name': from_t}, 'to': {'field': to_f, 'name': to_t}}
+            for from_t, from_f, to_t, to_f in edges
+        ]
+    }, 200
+
+
+def query_viewport(data: Dict) -> Tuple[Dict, int]:
+    """
+    视口查询：返回与包围盒相交的节点，以及至少一端在视口内的边。
+
+    请求体JSON格式:
+    {
+        "graph_id": "血缘结果中的 graph_id",
+        "bbox": [left, top, right, bottom],  # 画布坐标
+        "include_fields": true/false  # 可选，默认false，为false时节点和边按折叠格式返回
+    }
+    """
+    if not data or not data.get('graph_id') or not isinstance(data.get('bbox'), list) or len(data['bbox']) != 4:
+        return {'error': 'Missing required parameter: graph_id, bbox [left, top, right, bottom]'}, 400
+    try:
+        x0, y0, x1, y1 = (float(v) for v in data['bbox'])
+    except (TypeError, ValueError):
+        return {'error': 'bbox must contain 4 numbers'}, 400
+    graph = graph_store.get_graph(data['graph_id'])
+    if graph is None:
+        return _missing_graph()
+
+    spatial = _get_spatial_index(graph)
+    # 节点横向占 [left, left + NODE_WIDTH]，只检查与视口横向相交的列
+    start = bisect.bisect_left(spatial['lefts'], x0 - NODE_WIDTH)
+    stop = bisect.bisect_right(spatial['lefts'], x1)
+    visible: List[int] = []
+    for left in spatial['lefts'][start:stop]:
+        items = spatial['columns'][left]
+        # 同列节点按 top 有序，从 top >= y0 - 最大节点高度 的位置开始扫描
+        i = bisect.bisect_left(spatial['tops'][left], y0 - spatial['max_height'])
+        while i < len(items) and items[i][0] <= y1:
+            top, bottom, node_index = items[i]
+            if bottom >= y0:
+                visible.append(node_index)
+            i += 1
+
+    visible.sort()
+    # 只取可见表的关联边，不扫描整张图的边；按下标排序保持原来的边顺序
+    table_edges = _get_table_index(graph)['edges']
+    edge_indexes = set()
+    for i in visible:
+        edge_indexes.update(table_edges.get(graph['nodes'][i]['name'], ()))
+    result = {
+        'nodes': [graph['nodes'][i] for i in visible],
+        'edges': [
+            {'from': {'field': from_f, 'name': from_t}, 'to': {'field': to_f, 'name': to_t}}
+            for from_t, from_f, to_t, to_f in (graph['edges'][i] for i in sorted(edge_indexes))
+        ]
+    }
+    if not data.get('include_fields', False):
+        result = collapse_lineage_result(result)
+    result.update({'graph_id': data['graph_id'], 'total_nodes': len(graph['nodes'])})
+    return result, 200
@@ -0,0 +1,145 @@
+import gzip
+import os
+from typing import Dict, List
+
+COMPACT_FORMAT = 'compact-v1'
+RESPONSE_FORMATS = ('json', 'compact')  # 请求体 format 字段允许的取值
+
+# --- 响应压缩配置 (可通过环境变量覆盖) ---
+GZIP_MIN_BYTES = int(os.environ.get('LINEAGE_GZIP_MIN_BYTES', 1024))  # 小于该大小的响应不压缩
+GZIP_LEVEL = int(os.environ.get('LINEAGE_GZIP_LEVEL', 6))  # gzip 压缩级别 1-9
+
+
+class _Interner:
+    """把字符串映射为连续的整数下标，values 保存下标对应的字符串"""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __call__(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = len(self.values)
+            self.index[value] = i
+            self.values.append(value)
+        return i
+
+
+def encode_compact(result: Dict) -> Dict:
+    """
+    把血缘结果编码为紧凑格式：表名、字段名、节点类型分别放入字符串表，
+    节点按列存储为并行数组，边和节点字段用扁平整数数组表示。
+
+    紧凑格式:
+    {
+        "format": "compact-v1",
+        "tables": [表名...], "fields": [字段名...], "types": [节点类型...],
+        "nodes": {
+            "name": [表下标...], "type": [类型下标...], "left": [...], "top": [...],
+            "field_offsets": [0, ...],  # 第 i 个节点的字段为 field_ids[field_offsets[i]:field_offsets[i+1]]
+            "field_ids": [字段下标...]
+        },
+        "edges": [from表, from字段, to表, to字段, ...]  # 每 4 个整数一条边
+    }
+    折叠字段的结果（见 viewport.collapse_lineage_result）另有 nodes.field_count 和 edge_counts 并行数组。
+    结果中除 nodes/edges 以外的键（如 statement_tiers）原样保留。
+    """
+    tables = _Interner()
+    fields = _Interner()
+    types = _Interner()
+    names, type_ids, lefts, tops = [], [], [], []
+    field_offsets = [0]
+    field_ids = []
+    nodes = result.get('nodes', [])
+    for node in nodes:
+        names.append(tables(node['name']))
+        type_ids.append(types(node['type']))
+        lefts.append(node['left'])
+        tops.append(node['top'])
+        field_ids.extend(fields(f['name']) for f in node.get('fields', []))
+        field_offsets.append(len(field_ids))
+
+    edges = []
+    for edge in result.get('edges', []):
+        edges.extend((
+            tables(edge['from']['name']), fields(edge['from']['field']),
+            tables(edge['to']['name']), fields(edge['to']['field'])
+        ))
+
+    compact = {k: v for k, v in result.items() if k not in ('nodes', 'edges')}
+    compact.update({
+        'format': COMPACT_FORMAT,
+        'tables': tables.values,
+        'fields': fields.values,
+        'types': types.values,
+        'nodes': {
+            'name': names,
+            'type': type_ids,
+            'left': lefts,
+            'top': tops,
+            'field_offsets': field_offsets,
+            'field_ids': field_ids
+        },
+        'edges': edges
+    })
+    if any('field_count' in node for node in nodes):
+        compact['nodes']['field_count'] = [node.get('field_count', 0) for node in nodes]
+        compact['edge_counts'] = [edge.get('count', 1) for edge in result.get('edges', [])]
+    return compact
+
+
+def decode_compact(compact: Dict) -> Dict:
+    """encode_compact 的逆过程，还原为 {"nodes": [...], "edges": [...]} 格式"""
+    tables = compact['tables']
+    fields = compact['fields']
+    types = compact['types']
+    columns = compact['nodes']
+    offsets = columns['field_offsets']
+    nodes = [
+        {
+            'name': tables[columns['name'][i]],
+            'type': types[columns['type'][i]],
+            'fields': [{'name': fields[f]} for f in columns['field_ids'][offsets[i]:offsets[i + 1]]],
+            'left': columns['left'][i],
+            'top': columns['top'][i]
+        }
+        for i in range(len(columns['name']))
+    ]
+    if 'field_count' in columns:
+        for node, count in zip(nodes, columns['field_count']):
+            node['field_count'] = count
+            node['collapsed'] = True
+    flat = compact['edges']
+    edges = [
+        {
+            'from': {'field': fields[flat[i + 1]], 'name': tables[flat[i]]},
+            'to': {'field': fields[flat[i + 3]], 'name': tables[flat[i + 2]]}
+        }
+        for i in range(0, len(flat), 4)
+    ]
+    for edge, count in zip(edges, compact.get('edge_counts', ())):
+        edge['count'] = count
+    result = {
+        k: v for k, v in compact.items()
+        if k not in ('format', 'tables', 'fields', 'types', 'nodes', 'edges', 'edge_counts')
+    }
+    result.update({'nodes': nodes, 'edges': edges})
+    return result
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """根据 Accept-Encoding 判断客户端是否接受 gzip（忽略 q=0 的声明）"""
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding.strip().lower() in ('gzip', '*'):
+            q = params.strip()
+            try:
+                return not (q.startswith('q=') and float(q[2:] or 0) == 0)
+            except ValueError:
+                return True
+    return False
+
+
+def gzip_body(body: bytes, level: int = GZIP_LEVEL) -> bytes:
+    return gzip.compress(body, compresslevel=level)
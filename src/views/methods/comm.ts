@@ -12,10 +12,11 @@ const comm = {
             }, this.commConfig)
         })
     },
-    //将端点连线
-    connectEndpoint(from, to) {
+    //将端点连线，isBackEdge 为环上的回边时加上虚线样式
+    connectEndpoint(from, to, isBackEdge = false) {
         this.jsplumbInstance.connect({
-            uuids: [from, to]
+            uuids: [from, to],
+            cssClass: isBackEdge ? 'lineage-back-edge' : ''
         }, this.commConfig);
     },
     //封装拖动，添加辅助对齐线功能
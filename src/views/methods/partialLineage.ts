@@ -0,0 +1,68 @@
+// 流式分析的中间结果：按到达的 statement 记录累积表和边，生成可直接渲染的临时血缘图
+// 临时图只按节点类型分三列摆放，最终的分层布局以 result 记录为准
+const NODE_BASE_HEIGHT = 60
+const FIELD_HEIGHT = 25
+const NODE_VERTICAL_SPACING = 20
+const LAYER_HORIZONTAL_SPACING = 850
+const START_X = 20
+const START_Y = 20
+const TYPE_COLUMNS = { Origin: 0, Middle: 1, RS: 2 }
+
+export function createPartialLineage() {
+    const fields = new Map()  // 表名 -> 字段集合
+    const edges = new Map()  // 去重键 -> 边
+    const hasSource = new Set()
+    const hasTarget = new Set()
+
+    const addTable = (name) => {
+        if (!fields.has(name)) fields.set(name, new Set())
+        return fields.get(name)
+    }
+
+    // 累积一条 statement 记录，返回是否有新的表或边
+    function add(record) {
+        const before = fields.size + edges.size
+        record.sources.forEach(addTable)
+        record.targets.forEach(addTable)
+        record.edges.forEach(edge => {
+            const key = `${edge.from.name}\u0000${edge.from.field}\u0000${edge.to.name}\u0000${edge.to.field}`
+            if (edges.has(key)) return
+            edges.set(key, edge)
+            if (edge.from.field) addTable(edge.from.name).add(edge.from.field)
+            else addTable(edge.from.name)
+            if (edge.to.field) addTable(edge.to.name).add(edge.to.field)
+            else addTable(edge.to.name)
+            hasTarget.add(edge.from.name)
+            hasSource.add(edge.to.name)
+        })
+        record.targets.forEach(target => {
+            record.sources.forEach(source => {
+                hasTarget.add(source)
+                hasSource.add(target)
+            })
+        })
+        return fields.size + edges.size > before
+    }
+
+    // 生成 { nodes, edges }：只有下游的表为 Origin，只有上游的表为 RS，其余为 Middle
+    function build() {
+        const columnTops = [START_Y, START_Y, START_Y]
+        const nodes = []
+        Array.from(fields.keys()).sort().forEach(name => {
+            const type = !hasSource.has(name) ? 'Origin' : (!hasTarget.has(name) ? 'RS' : 'Middle')
+            const column = TYPE_COLUMNS[type]
+            const nodeFields = Array.from(fields.get(name)).sort().map(field => ({ name: field }))
+            nodes.push({
+                name,
+                type,
+                fields: nodeFields,
+                left: START_X + column * LAYER_HORIZONTAL_SPACING,
+                top: columnTops[column]
+            })
+            columnTops[column] += NODE_BASE_HEIGHT + nodeFields.length * FIELD_HEIGHT + NODE_VERTICAL_SPACING
+        })
+        return { nodes, edges: Array.from(edges.values()) }
+    }
+
+    return { add, build }
+}
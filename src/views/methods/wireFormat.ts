@@ -0,0 +1,46 @@
+// 血缘结果紧凑格式 (compact-v1) 的解码，对应后端 api/wire_format.py 的 encode_compact
+export const COMPACT_FORMAT = 'compact-v1'
+
+// 把紧凑格式还原为 { nodes, edges }，其余字段原样保留；非紧凑格式直接返回
+export function decodeLineagePayload(data) {
+    if (!data || data.format !== COMPACT_FORMAT) {
+        return data
+    }
+    const { tables, fields, types, nodes: columns, edges: flatEdges, edge_counts: edgeCounts, format, ...rest } = data
+    const offsets = columns.field_offsets
+    const fieldIds = columns.field_ids
+    const nodeCount = columns.name.length
+
+    const nodes = new Array(nodeCount)
+    for (let i = 0; i < nodeCount; i++) {
+        const nodeFields = new Array(offsets[i + 1] - offsets[i])
+        for (let j = offsets[i]; j < offsets[i + 1]; j++) {
+            nodeFields[j - offsets[i]] = { name: fields[fieldIds[j]] }
+        }
+        nodes[i] = {
+            name: tables[columns.name[i]],
+            type: types[columns.type[i]],
+            fields: nodeFields,
+            left: columns.left[i],
+            top: columns.top[i]
+        }
+        // 折叠字段模式：只有字段数量，字段按需加载
+        if (columns.field_count) {
+            nodes[i].field_count = columns.field_count[i]
+            nodes[i].collapsed = true
+        }
+    }
+
+    // 每 4 个整数一条边：from表, from字段, to表, to字段
+    const edges = new Array(flatEdges.length / 4)
+    for (let i = 0, k = 0; i < flatEdges.length; i += 4, k++) {
+        edges[k] = {
+            from: { field: fields[flatEdges[i + 1]], name: tables[flatEdges[i]] },
+            to: { field: fields[flatEdges[i + 3]], name: tables[flatEdges[i + 2]] }
+        }
+        if (edgeCounts) {
+            edges[k].count = edgeCounts[k]
+        }
+    }
+    return { ...rest, nodes, edges }
+}